@@ -0,0 +1,138 @@
+"""
+Benchmark da Validação Anti-Fraude em Lote
+Compara validate_invites_batch com o caminho unitário (consultas por convite)
+
+Uso:
+    # convidados reais de uma competição, com convidadores que nunca os convidaram
+    python benchmark_fraud_validation.py --competition 12 --invites 5000 --sample 300
+
+    # IDs sintéticos (quase todos "novos", mede só o custo das consultas)
+    python benchmark_fraud_validation.py --competition 12 --synthetic --invites 20000
+
+Nenhum dos dois caminhos grava nada: o unitário roda as mesmas consultas de
+leitura do detect_fraud (sem log de fraude nem cache Redis) e a análise de
+histórico; o lote roda sem record. Os pares medidos não estão gravados, então
+nenhum caminho para na verificação de duplicata e todas as consultas são medidas.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from sqlalchemy import text
+
+from src.database.postgresql_optimized import postgresql_optimized, FraudDetectionResult
+from src.bot.services.fraud_detection_service import fraud_detection_service
+
+# Somado ao convidador real para formar pares que não existem na tabela
+UNRECORDED_INVITER_OFFSET = 10 ** 12
+
+async def load_invites(competition_id: int, limit: int):
+    """Convidados reais da competição (histórico real), em pares ainda não gravados"""
+    async with postgresql_optimized.async_session_factory() as session:
+        result = await session.execute(text("""
+            SELECT invited_user_id, inviter_user_id, invite_link_id
+            FROM global_global_unique_invited_users_global_global
+            WHERE competition_id = :competition_id
+            ORDER BY first_join_timestamp DESC
+            LIMIT :limit
+        """), {'competition_id': competition_id, 'limit': limit})
+        return [(row.invited_user_id, row.inviter_user_id + UNRECORDED_INVITER_OFFSET, row.invite_link_id)
+                for row in result]
+
+def synthetic_invites(total: int, inviters: int):
+    return [
+        (10_000_000 + i, random.randint(1, inviters), random.randint(1, inviters))
+        for i in range(total)
+    ]
+
+async def detect_fraud_readonly(invited_user_id: int, inviter_user_id: int, competition_id: int) -> FraudDetectionResult:
+    """Consultas do detect_fraud, na mesma ordem, sem _log_fraud_attempt nem _set_cache"""
+    async with postgresql_optimized.async_session_factory() as session:
+        existing = (await session.execute(text("""
+            SELECT id, join_count FROM global_global_unique_invited_users_global_global
+            WHERE invited_user_id = :invited_user_id AND inviter_user_id = :inviter_user_id
+            AND competition_id = :competition_id
+        """), {'invited_user_id': invited_user_id, 'inviter_user_id': inviter_user_id,
+               'competition_id': competition_id})).fetchone()
+        if existing:
+            return FraudDetectionResult(False, "Usuário já foi convidado anteriormente", 1.0, {})
+        
+        recent_invites = (await session.execute(text("""
+            SELECT COUNT(*) FROM global_global_unique_invited_users_global_global
+            WHERE invited_user_id = :invited_user_id
+            AND first_join_timestamp > NOW() - INTERVAL '1 hour'
+        """), {'invited_user_id': invited_user_id})).scalar()
+        if recent_invites >= 5:
+            return FraudDetectionResult(False, f"Padrão suspeito: {recent_invites} convites em 1 hora", 0.9, {})
+        
+        user_data = (await session.execute(text("""
+            SELECT is_blacklisted FROM users_global_global_optimized WHERE user_id = :user_id
+        """), {'user_id': invited_user_id})).fetchone()
+        if user_data and user_data.is_blacklisted:
+            return FraudDetectionResult(False, "Usuário na blacklist", 1.0, {})
+        
+        return FraudDetectionResult(True, "Convite válido", 1.0, {})
+
+async def validate_single(invite, competition_id: int):
+    """Caminho unitário: consultas do validate_invite, somente leitura"""
+    invited_user_id, inviter_user_id, invite_link_id = invite
+    result = await detect_fraud_readonly(invited_user_id, inviter_user_id, competition_id)
+    if not result.is_valid:
+        return result
+    return await fraud_detection_service._analyze_user_behavior(invited_user_id, inviter_user_id, competition_id, {})
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark da validação anti-fraude em lote")
+    parser.add_argument("--competition", type=int, required=True)
+    parser.add_argument("--invites", type=int, default=5000)
+    parser.add_argument("--sample", type=int, default=200,
+                        help="convites validados pelo caminho unitário (extrapolado para o total)")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--inviters", type=int, default=500)
+    args = parser.parse_args()
+
+    if not await postgresql_optimized.initialize():
+        print("❌ Não foi possível conectar ao PostgreSQL")
+        return
+
+    try:
+        if args.synthetic:
+            invites = synthetic_invites(args.invites, args.inviters)
+        else:
+            invites = await load_invites(args.competition, args.invites)
+        if not invites:
+            print("Nenhum convite encontrado para a competição")
+            return
+
+        sample = random.sample(invites, min(args.sample, len(invites)))
+
+        started = time.monotonic()
+        single_results = [await validate_single(invite, args.competition) for invite in sample]
+        single_elapsed = time.monotonic() - started
+
+        started = time.monotonic()
+        batch_results = await fraud_detection_service.validate_invites_batch(invites, args.competition)
+        batch_elapsed = time.monotonic() - started
+
+        by_invite = dict(zip(invites, batch_results))
+        agree = sum(1 for invite, result in zip(sample, single_results)
+                    if by_invite[invite].is_valid == result.is_valid)
+
+        single_per_invite = single_elapsed / len(sample) * 1000
+        batch_per_invite = batch_elapsed / len(invites) * 1000
+        print(f"Convites: {len(invites):,} (amostra unitária: {len(sample):,})")
+        print(f"Unitário: {single_per_invite:.2f}ms/convite - estimado {single_per_invite * len(invites) / 1000:.1f}s no total")
+        print(f"Lote:     {batch_per_invite:.3f}ms/convite - {batch_elapsed:.2f}s no total")
+        print(f"Ganho: {single_per_invite / batch_per_invite:.0f}x")
+        print(f"Concordância na amostra: {agree}/{len(sample)}")
+        print(f"Bloqueados no lote: {sum(1 for r in batch_results if not r.is_valid):,}")
+    finally:
+        await postgresql_optimized.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Benchmark de Ingestão do Webhook
+Envia updates chat_member sintéticos por HTTP e mede a vazão de ingestão
+
+Uso:
+    # contra o bot rodando em BOT_UPDATE_MODE=webhook
+    python benchmark_webhook.py --updates 20000 --batch 50 --connections 32
+
+    # offline: sobe o WebhookServer no próprio processo com processamento vazio
+    python benchmark_webhook.py --standalone --updates 50000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from src.config.settings import settings
+
+# Os links são criados pelo bot: o creator do update é sempre ele, não o convidador
+BENCHMARK_BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "benchmark_bot"}
+
+def make_chat_member_update(update_id: int, chat_id: int, inviter_id: int, member_id: int) -> dict:
+    """Monta um update chat_member de entrada via link de convite (um link por convidador)"""
+    now = int(time.time())
+    member = {"id": member_id, "is_bot": False, "first_name": f"Membro {member_id}"}
+    return {
+        "update_id": update_id,
+        "chat_member": {
+            "chat": {"id": chat_id, "type": "supergroup", "title": "Benchmark"},
+            "from": member,
+            "date": now,
+            "old_chat_member": {"status": "left", "user": member},
+            "new_chat_member": {"status": "member", "user": member},
+            "invite_link": {
+                "invite_link": f"https://t.me/+bench{inviter_id}",
+                "creator": BENCHMARK_BOT_USER,
+                "creates_join_request": False,
+                "is_primary": False,
+                "is_revoked": False
+            }
+        }
+    }
+
+async def run_benchmark(url: str, secret: str, total: int, batch: int, connections: int, inviters: int):
+    chat_id = int(settings.CHAT_ID) if str(settings.CHAT_ID).lstrip('-').isdigit() else -1001
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+
+    bodies = []
+    for start in range(0, total, batch):
+        updates = [
+            make_chat_member_update(i + 1, chat_id, random.randint(1, inviters), 10_000_000 + i)
+            for i in range(start, min(start + batch, total))
+        ]
+        bodies.append(json.dumps(updates[0] if batch == 1 else updates).encode())
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    status_counts = {}
+    latencies = []
+
+    async def worker(session: aiohttp.ClientSession):
+        while not queue.empty():
+            body = queue.get_nowait()
+            started = time.monotonic()
+            async with session.post(url, data=body, headers=headers) as response:
+                await response.read()
+                status_counts[response.status] = status_counts.get(response.status, 0) + 1
+            latencies.append((time.monotonic() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(worker(session) for _ in range(connections)))
+        elapsed = time.monotonic() - started
+
+        stats = None
+        async with session.get(f"{url}/stats", headers=headers) as response:
+            if response.status == 200:
+                stats = await response.json()
+
+    latencies.sort()
+    print(f"Updates enviados: {total:,} em {len(bodies):,} requisições ({batch} por lote)")
+    print(f"Tempo total: {elapsed:.2f}s - {total / elapsed:,.0f} updates/s")
+    print(f"Latência HTTP: p50 {latencies[len(latencies) // 2]:.1f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f}ms")
+    print(f"Status HTTP: {status_counts}")
+    if stats:
+        print(f"Servidor: {stats}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão do webhook")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.WEB_PORT}{settings.WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=settings.WEBHOOK_SECRET_TOKEN)
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--inviters", type=int, default=500)
+    parser.add_argument("--standalone", action="store_true",
+                        help="sobe um WebhookServer local com processamento vazio")
+    args = parser.parse_args()
+
+    server = None
+    if args.standalone:
+        from src.bot.services.webhook_server import WebhookServer
+
+        async def discard_update(update):
+            return None
+
+        server = WebhookServer(None, discard_update, secret_token=args.secret, listen="127.0.0.1")
+        await server.start()
+
+    try:
+        await run_benchmark(args.url, args.secret, args.updates, args.batch, args.connections, args.inviters)
+    finally:
+        if server:
+            await server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,12 +5,13 @@ Bot Manager Principal - Sistema de Competição Gamificada
 import asyncio
 import logging
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE
-from telegram import Bot
+from telegram import Bot, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ChatMemberHandler, ConversationHandler
 from telegram.error import TelegramError
 
 from src.config.settings import settings
 from src.database.postgresql_models import PostgreSQLManager
+from src.database.postgresql_async import AsyncPostgreSQLManager
 from src.database.models import DatabaseManager
 from src.bot.services.competition_manager import CompetitionManager
 from src.bot.services.invite_manager import InviteManager
@@ -19,6 +20,16 @@ from src.bot.services.ranking_notifier import RankingNotifier
 from src.bot.services.member_tracker import MemberTracker
 from src.bot.services.safe_notifier import SafeNotifier
 from src.bot.services.channel_notifier import ChannelNotifier
+from src.bot.services.join_event_pipeline import JoinEvent, JoinEventPipeline
+from src.bot.services.invite_credit_writer import InviteCreditWriter
+from src.bot.services.webhook_server import WebhookServer
+from src.bot.services.update_processor import KeyedUpdateProcessor
+from src.bot.services.message_scheduler import MessageScheduler
+from src.bot.services.milestone_ledger import MilestoneLedger
+from src.bot.services.active_competition_cache import active_competition_cache
+from src.bot.services.link_registry import link_registry
+from src.bot.services.api_call_meter import MeteredRequest, api_call_meter
+from src.bot.services.burst_detector import burst_detector
 from src.bot.handlers.competition_commands import get_competition_handlers
 from src.bot.handlers.invite_commands import get_invite_handlers
 from src.bot.handlers.user_list_commands import UserListHandlers
@@ -32,11 +43,18 @@ class BotManager:
         self.bot = None
         self.application = None
         self.db_manager = None
+        self.async_db_manager = None
         self.competition_manager = None
         self.invite_manager = None
         self.tracking_monitor = None
         self.ranking_notifier = None
         self.member_tracker = None
+        self.join_pipeline = None
+        self.credit_writer = None
+        self.webhook_server = None
+        self.update_processor = None
+        self.message_scheduler = None
+        self.milestone_ledger = None
         self.is_running = False
         
     async def initialize(self):
@@ -46,14 +64,23 @@ class BotManager:
             try:
                 self.db_manager = PostgreSQLManager()
                 logger.info("✅ Banco de dados PostgreSQL inicializado")
+                
+                # Pool assíncrono (asyncpg) para a gravação em lote dos créditos de convite
+                if settings.DB_ASYNC_ENABLED:
+                    try:
+                        self.async_db_manager = AsyncPostgreSQLManager()
+                        await self.async_db_manager.initialize()
+                    except Exception as e:
+                        logger.warning(f"⚠️ PostgreSQL assíncrono não disponível, usando apenas o síncrono: {e}")
+                        self.async_db_manager = None
             except Exception as e:
                 logger.warning(f"⚠️ PostgreSQL não disponível: {e}")
                 logger.info("🔄 Usando SQLite como fallback...")
                 self.db_manager = DatabaseManager()
                 logger.info("✅ Banco de dados SQLite inicializado")
             
-            # Criar bot
-            self.bot = Bot(token=settings.BOT_TOKEN)
+            # Criar bot (requisições contadas pelo medidor de chamadas à API)
+            self.bot = Bot(token=settings.BOT_TOKEN, request=MeteredRequest())
             
             # Testar conexão
             bot_info = await self.bot.get_me()
@@ -77,16 +104,48 @@ class BotManager:
                 logger.warning(f"⚠️ Verifique se o bot foi adicionado ao canal: {settings.CHAT_ID}")
                 # Não interromper a inicialização por causa do canal
             
-            # Inicializar gerenciadores
-            self.safe_notifier = SafeNotifier(self.bot)
-            self.competition_manager = CompetitionManager(self.db_manager)
-            self.invite_manager = InviteManager(self.db_manager, self.bot)
-            self.tracking_monitor = TrackingMonitor(self.db_manager, self.bot)
+            # Inicializar gerenciadores (todas as notificações saem pelo agendador)
+            self.message_scheduler = MessageScheduler(self.bot)
+            self.safe_notifier = SafeNotifier(self.bot, scheduler=self.message_scheduler)
+            self.milestone_ledger = MilestoneLedger(self.db_manager)
+            self.competition_manager = CompetitionManager(
+                self.db_manager, scheduler=self.message_scheduler, milestone_ledger=self.milestone_ledger,
+                async_db=self.async_db_manager
+            )
+            self.competition_manager.load_leaderboard()
+            self.competition_manager.load_link_registry()
+            self.invite_manager = InviteManager(
+                self.db_manager, self.bot, scheduler=self.message_scheduler, async_db=self.async_db_manager
+            )
+            self.tracking_monitor = TrackingMonitor(self.db_manager, self.bot, scheduler=self.message_scheduler)
             self.member_tracker = MemberTracker(self.db_manager)
-            self.channel_notifier = ChannelNotifier(self.bot)
+            self.channel_notifier = ChannelNotifier(self.bot, scheduler=self.message_scheduler)
+            if settings.NOTIFY_RANKING_UPDATES:
+                self.ranking_notifier = RankingNotifier(
+                    self.db_manager, self.bot,
+                    competition_manager=self.competition_manager,
+                    scheduler=self.message_scheduler,
+                    milestone_ledger=self.milestone_ledger
+                )
+            
+            # Gravação em lote dos créditos de convite (apenas PostgreSQL)
+            if settings.INVITE_CREDIT_BATCHING and hasattr(self.db_manager, 'apply_invite_credits_batch'):
+                self.credit_writer = InviteCreditWriter(self.async_db_manager or self.db_manager)
+            
+            self.join_pipeline = JoinEventPipeline(
+                self.db_manager,
+                self.competition_manager,
+                self.invite_manager,
+                tracking_monitor=self.tracking_monitor,
+                member_tracker=self.member_tracker,
+                ranking_notifier=self.ranking_notifier,
+                credit_writer=self.credit_writer
+            )
             logger.info("✅ Gerenciadores inicializados")    
             # Criar aplicação
-            self.application = Application.builder().bot(self.bot).build()
+            # Updates em paralelo, mantendo a ordem por usuário e por convidador
+            self.update_processor = KeyedUpdateProcessor(settings.UPDATE_MAX_CONCURRENCY)
+            self.application = Application.builder().bot(self.bot).concurrent_updates(self.update_processor).build()
             
             # Registrar handlers
             self._register_handlers()
@@ -147,7 +206,7 @@ class BotManager:
             raise
     
     async def _handle_new_member(self, update, context):
-        """Lida com novos membros do canal"""
+        """Lida com novos membros do canal - apenas enfileira o evento no pipeline"""
         try:
             # Verificar se é um novo membro
             if (update.chat_member.new_chat_member and 
@@ -157,59 +216,16 @@ class BotManager:
                 
                 # Verificar se veio por link de convite
                 if hasattr(update.chat_member, 'invite_link') and update.chat_member.invite_link:
-                    invite_link = update.chat_member.invite_link.invite_link
-                    
-                    # Buscar informações do link
-                    link_stats = self.invite_manager.get_link_stats(invite_link)
+                    event = JoinEvent(
+                        invite_link=update.chat_member.invite_link.invite_link,
+                        member_id=new_member.id,
+                        username=new_member.username,
+                        first_name=new_member.first_name,
+                        last_name=new_member.last_name
+                    )
                     
-                    if link_stats:
-                        user_id = link_stats['user_id']
-                        
-                        # Validar tracking antes de processar
-                        if self.tracking_monitor:
-                            validation = self.tracking_monitor.validate_invite_tracking(user_id, invite_link)
-                            
-                            if not all([validation['link_exists'], validation['user_exists'], validation['competition_active']]):
-                                logger.warning(f"Validação de tracking falhou para usuário {user_id}: {validation}")
-                                
-                                # Tentar correção automática
-                                if not validation['participant_exists'] and validation['competition_active']:
-                                    # Adicionar como participante se necessário
-                                    active_comp = self.competition_manager.get_active_competition()
-                                    if active_comp:
-                                        self.competition_manager.add_participant(active_comp.id, user_id)
-                        
-                        # Atualizar uso do link
-                        await self.invite_manager.update_invite_link_usage(invite_link)
-                        
-                        # Rastrear novo membro com dados reais
-                        if self.member_tracker:
-                            await self.member_tracker.track_new_member(update, invite_link)
-                        
-                        # Registrar na competição se ativa
-                        success = self.competition_manager.record_invite(user_id, invite_link)
-                        
-                        if success:
-                            # Verificar se há competição ativa para notificações de ranking
-                            active_competition = self.competition_manager.get_active_competition()
-                            if active_competition and self.ranking_notifier:
-                                try:
-                                    # Verificar mudanças no ranking após o novo convite
-                                    await self.ranking_notifier.check_and_notify_ranking_changes(active_competition.id)
-                                    
-                                    # Verificar marcos da competição
-                                    ranking = self.db_manager.get_competition_ranking(active_competition.id, limit=100)
-                                    total_invites = sum(user.get('invites_count', 0) for user in ranking) if ranking else 0
-                                    await self.ranking_notifier.notify_competition_milestone(active_competition.id, total_invites)
-                                    
-                                except Exception as e:
-                                    logger.error(f"Erro ao processar notificações de ranking: {e}")
-                            
-                            logger.info(f"✅ Novo membro processado: {new_member.first_name} (ID: {new_member.id}) via usuário {user_id}")
-                        else:
-                            logger.error(f"❌ Falha ao registrar convite para usuário {user_id}")
-                    else:
-                        logger.warning(f"Link não encontrado ou inválido: {invite_link}")
+                    # Processamento pesado acontece nos workers do pipeline
+                    await self.join_pipeline.submit(event)
                 else:
                     logger.info(f"Novo membro sem link de convite: {new_member.first_name} (ID: {new_member.id})")
                 
@@ -246,6 +262,9 @@ class BotManager:
             # Tarefa para notificações de ranking
             asyncio.create_task(self._ranking_notifications_task())
             
+            # Tarefa de reconciliação incremental dos pontos
+            asyncio.create_task(self._points_reconciliation_task())
+            
             # Tarefa para monitoramento de saúde do tracking
             asyncio.create_task(self._tracking_health_task())
             
@@ -316,6 +335,41 @@ class BotManager:
                 logger.error(f"Erro na tarefa de notificações de ranking: {e}")
                 await asyncio.sleep(3600)  # Esperar 1 hora em caso de erro
     
+    async def _points_reconciliation_task(self):
+        """Reconcilia pontos dos participantes com os usos reais dos links"""
+        while True:
+            try:
+                await asyncio.sleep(settings.POINTS_RECONCILE_INTERVAL)
+                
+                if self.competition_manager:
+                    active_competition = self.competition_manager.get_active_competition()
+                    
+                    if active_competition:
+                        # Usos dos links conferidos com os membros rastreados (sem chamadas ao Telegram)
+                        if settings.LINK_USAGE_RECONCILE_ENABLED and self.invite_manager:
+                            await self.invite_manager.reconcile_link_usage()
+                        
+                        points_sync = self.competition_manager.points_sync
+                        report = await asyncio.get_event_loop().run_in_executor(
+                            None, points_sync.reconcile_competition_points, active_competition.id
+                        )
+                        logger.info(f"Reconciliação de pontos: {report}")
+                        
+                        # Pontos corrigidos no banco: recarregar o leaderboard em memória
+                        if report and report.get('corrected'):
+                            await asyncio.get_event_loop().run_in_executor(
+                                None, self.competition_manager.load_leaderboard, active_competition.id
+                            )
+                        
+                        # Totais mantidos na competição conferidos com os participantes
+                        await asyncio.get_event_loop().run_in_executor(
+                            None, self.competition_manager.reconcile_competition_totals, active_competition.id
+                        )
+                
+            except Exception as e:
+                logger.error(f"Erro na tarefa de reconciliação de pontos: {e}")
+                await asyncio.sleep(300)  # Esperar 5 minutos em caso de erro
+    
     async def _tracking_health_task(self):
         """Tarefa para monitoramento de saúde do tracking"""
         while True:
@@ -386,9 +440,18 @@ class BotManager:
             # Iniciar aplicação
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling(
-                allowed_updates=['message', 'chat_member', 'my_chat_member']
-            )
+            await self.message_scheduler.start()
+            if self.credit_writer:
+                await self.credit_writer.start()
+            await self.join_pipeline.start()
+            # Pré-filtro de convites únicos montado em segundo plano (as entradas não esperam)
+            postgresql_global_unique.start_invite_filter()
+            
+            allowed_updates = ['message', 'chat_member', 'my_chat_member']
+            if settings.BOT_UPDATE_MODE == 'webhook':
+                await self._start_webhook(allowed_updates)
+            else:
+                await self.application.updater.start_polling(allowed_updates=allowed_updates)
             
             self.is_running = True
             logger.info("✅ Bot iniciado e rodando!")
@@ -405,6 +468,27 @@ class BotManager:
             await self.stop()
             raise
     
+    async def _start_webhook(self, allowed_updates):
+        """Sobe o servidor de webhook e registra a URL no Telegram"""
+        # A concorrência e a ordem ficam com o processador da aplicação
+        self.webhook_server = WebhookServer(self.application.bot, self._dispatch_update, max_concurrency=0)
+        await self.webhook_server.start()
+        
+        if settings.WEBHOOK_URL:
+            await self.application.bot.set_webhook(
+                url=settings.WEBHOOK_URL.rstrip('/') + settings.WEBHOOK_PATH,
+                secret_token=settings.WEBHOOK_SECRET_TOKEN or None,
+                allowed_updates=allowed_updates,
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"✅ Webhook registrado: {settings.WEBHOOK_URL}")
+        else:
+            logger.warning("⚠️ WEBHOOK_URL não configurada - webhook não registrado no Telegram")
+    
+    async def _dispatch_update(self, update: Update):
+        """Processa um update recebido pelo webhook pelo mesmo caminho do polling"""
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+    
     async def stop(self):
         """Para o bot"""
         try:
@@ -412,8 +496,24 @@ class BotManager:
             
             self.is_running = False
             
-            if self.application:
+            if self.application and self.application.updater.running:
                 await self.application.updater.stop()
+            if self.webhook_server:
+                await self.webhook_server.stop()
+            
+            # Drenar eventos pendentes antes de encerrar a aplicação
+            if self.join_pipeline:
+                await self.join_pipeline.stop()
+            if self.credit_writer:
+                await self.credit_writer.stop()
+            if self.ranking_notifier:
+                await self.ranking_notifier.stop()
+            if self.async_db_manager:
+                await self.async_db_manager.close()
+            if self.message_scheduler:
+                await self.message_scheduler.stop()
+            
+            if self.application:
                 await self.application.stop()
                 await self.application.shutdown()
             
@@ -428,9 +528,25 @@ class BotManager:
             'is_running': self.is_running,
             'bot_initialized': self.bot is not None,
             'db_initialized': self.db_manager is not None,
+            'async_db': self.async_db_manager.get_stats() if self.async_db_manager else None,
             'competition_manager_initialized': self.competition_manager is not None,
             'invite_manager_initialized': self.invite_manager is not None,
             'application_initialized': self.application is not None,
+            'join_pipeline': self.join_pipeline.get_stats() if self.join_pipeline else None,
+            'invite_credit_writer': self.credit_writer.get_stats() if self.credit_writer else None,
+            'webhook': self.webhook_server.get_stats() if self.webhook_server else None,
+            'update_processor': self.update_processor.get_stats() if self.update_processor else None,
+            'message_scheduler': self.message_scheduler.get_stats() if self.message_scheduler else None,
+            'ranking_notifier': self.ranking_notifier.get_stats() if self.ranking_notifier else None,
+            'milestone_ledger': self.milestone_ledger.get_stats() if self.milestone_ledger else None,
+            'active_competition_cache': active_competition_cache.get_stats(),
+            'link_registry': link_registry.get_stats(),
+            'link_revocation': self.invite_manager.link_revoker.get_stats() if self.invite_manager else None,
+            'telegram_api_calls': api_call_meter.get_stats(),
+            'burst_detector': burst_detector.get_stats(),
+            'unique_invite_filter': postgresql_global_unique.get_invite_filter_stats(),
+            'update_queue_depth': self.application.update_queue.qsize() if self.application else None,
+            'leaderboard': self.competition_manager.leaderboard.get_stats() if self.competition_manager and self.competition_manager.leaderboard else None,
         }
 
 # Instância global do bot manager
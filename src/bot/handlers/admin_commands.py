@@ -42,14 +42,16 @@ class AdminHandlers:
             # Validar e corrigir estado do sistema
             validation_report = self.state_validator.validate_and_fix_competitions_global_global()
             
-            # Obter saúde do sistema
-            health = self.state_validator.get_system_health()
+            # Obter saúde do sistema (recalculada se a validação corrigiu algo)
+            if validation_report['fixes_applied']:
+                self.performance_optimizer.db_optimizer.invalidate_competition_cache()
+            health = self.performance_optimizer.get_cached_system_health(self.state_validator)
             
             # Obter estatísticas de performance
             perf_stats = self.performance_optimizer.get_performance_stats()
             
             # Buscar competição ativa (após validação)
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             # Montar mensagem de status
             status_msg = "📊 **STATUS ADMINISTRATIVO DO SISTEMA**\n\n"
@@ -109,7 +111,7 @@ class AdminHandlers:
             validation_report = self.state_validator.validate_and_fix_competitions_global_global()
             
             # Buscar competição ativa após validação
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 msg = "🔴 **Nenhuma competição ativa encontrada.**\n\n"
@@ -170,7 +172,6 @@ class AdminHandlers:
             
             # Limpar cache
             self.performance_optimizer.cache.clear()
-            self.performance_optimizer.db_optimizer.cache.clear()
             
             # Otimizar banco após reset
             self.performance_optimizer.db_optimizer.optimize_database()
@@ -9,6 +9,7 @@ from telegram.error import TelegramError
 from src.config.settings import settings
 from src.database.models import DatabaseManager
 from src.bot.services.competition_manager import CompetitionManager
+from src.bot.services.message_scheduler import MessagePriority
 from src.bot.services.auto_registration import AutoRegistrationService
 from src.bot.services.competition_reset_manager import CompetitionResetManager
 from src.bot.utils.datetime_helper import calculate_time_remaining, format_time_remaining
@@ -57,7 +58,7 @@ class CompetitionHandlers:
             return
             
         try:
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 await update.message.reply_text(
@@ -89,7 +90,7 @@ class CompetitionHandlers:
             user = update.effective_user
             
             # Criar/atualizar usuário no banco
-            db_user = self.db.create_user(
+            db_user = await self.comp_manager.create_user_async(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -136,7 +137,7 @@ class CompetitionHandlers:
             return
             
         try:
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 await update.message.reply_text(
@@ -149,7 +150,7 @@ class CompetitionHandlers:
             user = update.effective_user
             
             # Criar/atualizar usuário no banco
-            db_user = self.db.create_user(
+            db_user = await self.comp_manager.create_user_async(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -216,7 +217,7 @@ Use /meulink para gerar novos links de convite.
             return
             
         try:
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 await update.message.reply_text(
@@ -226,7 +227,7 @@ Use /meulink para gerar novos links de convite.
                 )
                 return
             
-            ranking = self.db.get_competition_ranking(active_comp.id, limit=10)
+            ranking = await self.comp_manager.get_competition_ranking_async(active_comp.id, limit=10)
             
             if not ranking:
                 await update.message.reply_text(
@@ -263,7 +264,7 @@ Use /meulink para gerar novos links de convite.
             user = update.effective_user
             
             # Criar/atualizar usuário no banco
-            db_user = self.db.create_user(
+            db_user = await self.comp_manager.create_user_async(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -330,7 +331,7 @@ Use /meulink para gerar novos links de convite.
             return ConversationHandler.END
         
         # Verificar se já existe competição ativa
-        active_comp = self.comp_manager.get_active_competition()
+        active_comp = await self.comp_manager.get_active_competition_async()
         if active_comp:
             await update.message.reply_text(
                 f"⚠️ Já existe uma competição ativa: \"{active_comp.name}\"\n\n"
@@ -438,6 +439,9 @@ Use /meulink para gerar novos links de convite.
                 await update.message.reply_text("⚠️ Competição criada mas houve problemas no reset. Verifique os logs.")
                 return ConversationHandler.END
             
+            # Nova competição ativa: carregar o leaderboard em memória
+            self.comp_manager.load_leaderboard(competition.id)
+            
             # Calcular data de fim com tratamento robusto
             duration_days = context.user_data['competition_duration']
             
@@ -501,10 +505,11 @@ Use /meulink para gerar novos links de convite.
 
 **Boa sorte a todos!** 🍀"""
 
-                await context.bot.send_message(
+                await self.comp_manager.scheduler.send_message(
                     chat_id=settings.CHAT_ID,
-                    VARCHAR=channel_message,
-                    parse_mode='Markdown'
+                    text=channel_message,
+                    parse_mode='Markdown',
+                    priority=MessagePriority.COMPETITION
                 )
                 
             except Exception as e:
@@ -543,7 +548,7 @@ Use /meulink para gerar novos links de convite.
             await update.message.reply_text("❌ Apenas administradores podem finalizar competições.")
             return
         
-        active_comp = self.comp_manager.get_active_competition()
+        active_comp = await self.comp_manager.get_active_competition_async()
         if not active_comp:
             await update.message.reply_text("❌ Não há competição ativa para finalizar.")
             return
@@ -562,11 +567,12 @@ Use /meulink para gerar novos links de convite.
                     from src.config.settings import settings
                     
                     # Obter ranking final
-                    ranking = self.db.get_competition_ranking(active_comp.id, limit=10)
+                    ranking = await self.comp_manager.get_competition_ranking_async(active_comp.id, limit=10)
                     
                     # Calcular estatísticas
-                    total_participants = len(ranking) if ranking else 0
-                    total_invites = sum(user.get('invites_count', 0) for user in ranking) if ranking else 0
+                    totals = await self.comp_manager.get_competition_totals_async(active_comp.id)
+                    total_participants = totals['total_participants']
+                    total_invites = totals['total_invites']
                     
                     # Determinar se a meta foi atingida
                     meta_atingida = "✅ Meta atingida!" if total_invites >= active_comp.target_invites else "❌ Meta não atingida"
@@ -618,10 +624,11 @@ Cada convite fez a diferença para o crescimento da nossa comunidade.
 🔔 **Fiquem atentos para as próximas competições!**
 Novos desafios e prêmios estão chegando! 🚀"""
 
-                    await context.bot.send_message(
+                    await self.comp_manager.scheduler.send_message(
                         chat_id=settings.CHAT_ID,
-                        VARCHAR=channel_message,
-                        parse_mode='Markdown'
+                        text=channel_message,
+                        parse_mode='Markdown',
+                        priority=MessagePriority.COMPETITION
                     )
                     
                 except Exception as e:
@@ -648,7 +655,7 @@ Novos desafios e prêmios estão chegando! 🚀"""
         
         try:
             # Versão simplificada que sempre funciona
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 await update.message.reply_text(
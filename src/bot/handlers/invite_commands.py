@@ -60,7 +60,7 @@ class InviteHandlers:
             user = update.effective_user
             
             # Criar/atualizar usuário no banco
-            self.db.create_user(
+            await self.comp_manager.create_user_async(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -68,7 +68,7 @@ class InviteHandlers:
             )
             
             # Verificar se há competição ativa
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if active_comp:
                 # Calcular tempo restante - versão simplificada
@@ -149,7 +149,7 @@ Aguarde o próximo desafio! 🚀
             user = update.effective_user
             
             # Verificar se há competição ativa primeiro
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             if not active_comp:
                 await update.message.reply_text(
@@ -159,7 +159,7 @@ Aguarde o próximo desafio! 🚀
                 return
             
             # Criar/atualizar usuário no banco
-            db_user = self.db.create_user(
+            db_user = await self.comp_manager.create_user_async(
                 user_id=user.id,
                 username=user.username,
                 first_name=user.first_name,
@@ -218,7 +218,7 @@ Aguarde o próximo desafio! 🚀
                 return
             
             # Adicionar usuário à competição
-            self.comp_manager.add_participant(active_comp.id, user.id)
+            await self.comp_manager.add_participant_async(active_comp.id, user.id)
             
             # Calcular tempo restante - versão simplificada
             try:
@@ -330,7 +330,7 @@ Boa sorte na competição! 🍀"""
             user = update.effective_user
             
             # Buscar usuário no banco
-            db_user = self.db.get_user(user.id)
+            db_user = await self.comp_manager.get_user_async(user.id)
             if not db_user:
                 await update.message.reply_text(
                     "📊 **Você ainda não gerou nenhum link de convite.**\n\n"
@@ -361,7 +361,7 @@ Boa sorte na competição! 🍀"""
             active_links = sum(1 for link in links if link['uses'] < link['max_uses'])
             
             # Verificar competição ativa
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             message = f"""
 📊 **SUAS ESTATÍSTICAS DE CONVITES**
@@ -418,7 +418,7 @@ Boa sorte na competição! 🍀"""
             return
             
         try:
-            active_comp = self.comp_manager.get_active_competition()
+            active_comp = await self.comp_manager.get_active_competition_async()
             
             message = f"""
 🤖 **AJUDA - BOT DE RANKING DE CONVITES**
@@ -31,7 +31,7 @@ class RankingHandler:
             
             # Buscar competição ativa
             try:
-                active_comp = self.competition_manager.get_active_competition()
+                active_comp = await self.competition_manager.get_active_competition_async()
             except Exception as e:
                 logger.error(f"Erro ao buscar competição ativa: {e}")
                 active_comp = None
@@ -51,7 +51,7 @@ class RankingHandler:
             
             # Obter ranking atual
             try:
-                ranking = self.competition_manager.get_competition_ranking(active_comp.id, limit=10)
+                ranking = await self.competition_manager.get_competition_ranking_async(active_comp.id, limit=10)
             except Exception as e:
                 logger.error(f"Erro ao buscar ranking da competição {active_comp.id}: {e}")
                 ranking = []
@@ -76,11 +76,12 @@ class RankingHandler:
             
             msg = f"🏆 *RANKING - {comp_name}*\n\n"
             msg += f"🎯 *Meta:* {target_invites:,} convites\n"
-            msg += f"👥 *Participantes:* {len(ranking)}\n\n"
+            totals = await self.competition_manager.get_competition_totals_async(active_comp.id)
+            msg += f"👥 *Participantes:* {totals['total_participants']:,}\n\n"
             
-            # Calcular total de convites
+            # Total de convites mantido na competição
             try:
-                total_invites = sum(p.get('invites_count', 0) for p in ranking)
+                total_invites = totals['total_invites']
                 msg += f"📊 *Total de Convites:* {total_invites:,}\n\n"
             except Exception as e:
                 logger.error(f"Erro ao calcular total de convites: {e}")
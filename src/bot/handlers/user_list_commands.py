@@ -56,9 +56,9 @@ class UserListHandlers:
             user_id = update.effective_user.id
             
             # Auto-registro na competição ativa
-            active_comp = self.competition_manager.get_active_competition()
+            active_comp = await self.competition_manager.get_active_competition_async()
             if active_comp:
-                self.competition_manager.add_participant(active_comp.id, user_id)
+                await self.competition_manager.add_participant_async(active_comp.id, user_id)
                 competition_id = active_comp.id
             else:
                 competition_id = None
@@ -0,0 +1,120 @@
+"""
+Cache da Competição Ativa
+Snapshot único por processo da competição ativa, invalidado por eventos
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class ActiveCompetitionCache:
+    """
+    Guarda o resultado de get_active_competition() (inclusive "nenhuma").
+
+    - Carregado uma vez e servido da memória até uma invalidação
+      (criar/iniciar/finalizar/resetar competição) ou até o TTL de segurança,
+      que cobre alterações feitas fora do processo
+    - Cada invalidação incrementa `version`; um carregamento que começou
+      numa versão anterior não é gravado, então um SELECT lento nunca
+      sobrescreve o estado novo com o antigo
+    - Misses concorrentes fazem um único SELECT (os demais esperam o lock)
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else settings.ACTIVE_COMPETITION_CACHE_TTL
+        self.version = 0
+        self.lock = threading.Lock()
+        self.async_lock: Optional[asyncio.Lock] = None
+
+        self._competition = None
+        self._loaded_version: Optional[int] = None
+        self._loaded_at = 0.0
+
+        self.metrics = {
+            "hits": 0,
+            "loads": 0,
+            "invalidations": 0,
+            "ttl_expirations": 0,
+            "discarded_loads": 0
+        }
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_version != self.version:
+            return False
+        if time.monotonic() - self._loaded_at >= self.ttl:
+            self.metrics["ttl_expirations"] += 1
+            self._loaded_version = None
+            return False
+        return True
+
+    def _store(self, version: int, competition):
+        if version == self.version:
+            self._competition = competition
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+        else:
+            self.metrics["discarded_loads"] += 1
+
+    def get(self, loader: Callable[[], Any]):
+        """Competição ativa do snapshot; chama loader apenas quando necessário"""
+        if self._is_fresh():
+            self.metrics["hits"] += 1
+            return self._competition
+
+        with self.lock:
+            # Outra thread pode ter carregado enquanto esperávamos o lock
+            if self._is_fresh():
+                self.metrics["hits"] += 1
+                return self._competition
+
+            version = self.version
+            competition = loader()
+            self.metrics["loads"] += 1
+            self._store(version, competition)
+            return competition
+
+    async def get_async(self, loader: Callable[[], Awaitable[Any]]):
+        """Versão assíncrona de get(): misses concorrentes no event loop fazem um único SELECT"""
+        if self._is_fresh():
+            self.metrics["hits"] += 1
+            return self._competition
+
+        if self.async_lock is None:
+            self.async_lock = asyncio.Lock()
+        async with self.async_lock:
+            if self._is_fresh():
+                self.metrics["hits"] += 1
+                return self._competition
+
+            version = self.version
+            competition = await loader()
+            self.metrics["loads"] += 1
+            self._store(version, competition)
+            return competition
+
+    def invalidate(self, reason: str = ""):
+        """Descarta o snapshot; a próxima leitura consulta o banco"""
+        self.version += 1
+        self.metrics["invalidations"] += 1
+        self._loaded_version = None
+        logger.debug(f"Cache da competição ativa invalidado (v{self.version}): {reason}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Versão atual, idade do snapshot e contadores"""
+        cached = self._loaded_version == self.version
+        competition = self._competition if cached else None
+        return {
+            "version": self.version,
+            "cached": cached,
+            "competition_id": competition.id if competition else None,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if cached else None,
+            "ttl_seconds": self.ttl,
+            **self.metrics
+        }
+
+active_competition_cache = ActiveCompetitionCache()
@@ -0,0 +1,58 @@
+"""
+Medidor de Chamadas à API do Telegram
+Conta requisições por escopo (ex.: processamento de uma entrada) e por método
+"""
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+_current_scope: ContextVar[Optional[str]] = ContextVar('telegram_api_scope', default=None)
+
+class ApiCallMeter:
+    """
+    Contadores de chamadas à API agrupados por escopo.
+
+    O escopo é uma ContextVar: vale para o código aguardado dentro do
+    `with scope(...)` e para tarefas criadas ali, sem precisar repassar
+    nada pelas funções intermediárias. Chamadas fora de escopo contam
+    como "unscoped".
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    @contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        token = _current_scope.set(name)
+        try:
+            yield
+        finally:
+            _current_scope.reset(token)
+
+    def record(self, endpoint: str):
+        self.calls[_current_scope.get() or "unscoped"][endpoint] += 1
+
+    def total(self, scope: str) -> int:
+        return sum(self.calls[scope].values()) if scope in self.calls else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Chamadas por escopo e por método"""
+        return {
+            scope: {"total": sum(endpoints.values()), "methods": dict(endpoints)}
+            for scope, endpoints in self.calls.items()
+        }
+
+api_call_meter = ApiCallMeter()
+
+class MeteredRequest(HTTPXRequest):
+    """HTTPXRequest que registra cada chamada no medidor antes de enviá-la"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_call_meter.record(url.rsplit('/', 1)[-1])
+        return await super().do_request(url, method, *args, **kwargs)
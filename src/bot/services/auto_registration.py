@@ -6,6 +6,7 @@ Serviço de Auto-Registro - Garante que usuários sejam automaticamente registra
 import logging
 from typing import Optional
 from src.database.models import DatabaseManager
+from src.bot.services.active_competition_cache import active_competition_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +20,7 @@ class AutoRegistrationService:
         """Garante que o usuário esteja registrado na competição ativa"""
         try:
             # Verificar se há competição ativa
-            active_competition = self.db.get_active_competition()
+            active_competition = active_competition_cache.get(self.db.get_active_competition)
             if not active_competition:
                 logger.warning("Nenhuma competição ativa encontrada")
                 return False
@@ -48,7 +49,7 @@ class AutoRegistrationService:
     def sync_user_invites_to_competition(self, user_id: int) -> bool:
         """Sincroniza convites do usuário com a competição ativa"""
         try:
-            active_competition = self.db.get_active_competition()
+            active_competition = active_competition_cache.get(self.db.get_active_competition)
             if not active_competition:
                 return False
             
@@ -87,7 +88,7 @@ class AutoRegistrationService:
     def fix_all_users_global_global_registration(self) -> int:
         """Corrige registro de todos os usuários com links ativos"""
         try:
-            active_competition = self.db.get_active_competition()
+            active_competition = active_competition_cache.get(self.db.get_active_competition)
             if not active_competition:
                 logger.warning("Nenhuma competição ativa para correção")
                 return 0
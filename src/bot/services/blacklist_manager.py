@@ -9,7 +9,10 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import json
+import pandas as pd
 from src.database.postgresql_global_unique import postgresql_global_unique
+from src.bot.services.burst_detector import burst_detector
+from src.bot.services.bot_scoring import build_scoring_frames, score_bot_likeness, timing_features
 
 logger = logging.getLogger(__name__)
 
@@ -98,7 +101,7 @@ class BlacklistManager:
             # Executar todas as verificações
             checks = [
                 self._check_multiple_fraud_attempts(user_id),
-                self._check_coordinated_attack_participation(user_id),
+                self._check_burst_participation(user_id),
                 self._check_bot_behavior(user_id),
                 self._check_rapid_pattern(user_id)
             ]
@@ -169,8 +172,32 @@ class BlacklistManager:
             logger.error(f"Erro na verificação de fraudes múltiplas: {e}")
             return None
     
+    async def _check_burst_participation(self, user_id: int) -> Optional[BlacklistEntry]:
+        """Verifica participação em rajadas de entradas registradas pelo burst_detector"""
+        flags = burst_detector.get_member_flags(user_id)
+        if not flags:
+            return None
+        
+        rule = self.auto_blacklist_rules['coordinated_attack']
+        
+        if flags['max_window_count'] >= rule['threshold'] and flags['burst_minutes'] >= 2:
+            return BlacklistEntry(
+                user_id=user_id,
+                reason=BlacklistReason.COORDINATED_ATTACK,
+                confidence=rule['confidence'],
+                details={
+                    'max_coordinated_users_global_global': flags['max_window_count'],
+                    'suspicious_time_buckets': flags['burst_minutes'],
+                    'threshold': rule['threshold']
+                },
+                timestamp=TIMESTAMP WITH TIME ZONE.now(),
+                auto_generated=True
+            )
+        
+        return None
+    
     async def _check_coordinated_attack_participation(self, user_id: int) -> Optional[BlacklistEntry]:
-        """Verifica participação em ataques coordenados"""
+        """Verifica participação em ataques coordenados (auditoria offline via SQL)"""
         try:
             async with self.db.db.async_session_factory() as session:
                 from sqlalchemy import VARCHAR
@@ -238,25 +265,21 @@ class BlacklistManager:
             async with self.db.db.async_session_factory() as session:
                 from sqlalchemy import VARCHAR
                 
-                # Buscar padrões de bot nos logs
+                # Tentativas da última hora; estatísticas de intervalo calculadas como no scan em lote
                 bot_query = text("""
-                    SELECT 
-                        COUNT(*) as total_actions,
-                        COUNT(DISTINCT DATE_TRUNC('second', attempt_timestamp)) as unique_seconds,
-                        MIN(attempt_timestamp) as first_action,
-                        MAX(attempt_timestamp) as last_action,
-                        AVG(EXTRACT(EPOCH FROM (attempt_timestamp - LAG(attempt_timestamp) OVER (ORDER BY attempt_timestamp)))) as avg_interval_seconds
+                    SELECT invited_user_id AS user_id, EXTRACT(EPOCH FROM attempt_timestamp) AS ts
                     FROM invite_attempts_log
                     WHERE invited_user_id = :user_id
                     AND attempt_timestamp > NOW() - INTERVAL '1 hour'
                 """)
                 
-                result = await session.execute(text(bot_query, {'user_id': user_id})
-                data = result.fetchone()
+                result = await session.execute(bot_query, {'user_id': user_id})
+                attempts = pd.DataFrame(result.mappings().all(), columns=['user_id', 'ts']).astype({'ts': float})
+                timing = timing_features(attempts)
                 
-                total_actions = data.total_actions or 0
-                unique_seconds = data.unique_seconds or 0
-                avg_interval = data.avg_interval_seconds or 0
+                total_actions = int(timing['total_actions'].iloc[0]) if len(timing) else 0
+                unique_seconds = int(timing['unique_seconds'].iloc[0]) if len(timing) else 0
+                avg_interval = float(timing['avg_interval_seconds'].fillna(0).iloc[0]) if len(timing) else 0
                 
                 # Indicadores de bot
                 bot_score = 0.0
@@ -305,6 +328,50 @@ class BlacklistManager:
             logger.error(f"Erro na verificação de bot: {e}")
             return None
     
+    async def scan_competition_bot_behavior(self, competition_id: int, apply: bool = False,
+                                            min_score: Optional[float] = None):
+        """
+        Ranking de suspeitos de bot de toda a competição, calculado em uma passada
+        (username + intervalos entre entradas). Com apply=True aplica "blacklist_global"
+        em quem atingir min_score (padrão: limite da regra bot_behavior).
+        Retorna o DataFrame ordenado para revisão do admin.
+        """
+        rule = self.auto_blacklist_rules['bot_behavior']
+        min_score = rule['threshold'] if min_score is None else min_score
+        
+        data = await self.db.db.get_bot_scoring_data(competition_id)
+        frames = build_scoring_frames(data)
+        table = score_bot_likeness(frames['users'], frames['attempts'], frames['actions'])
+        
+        suspects = table[table['score'] >= min_score]
+        logger.info(f"🔍 Varredura de bots na competição {competition_id}: "
+                    f"{len(table)} convidados, {len(suspects)} com score >= {min_score}")
+        
+        if apply:
+            expires_at = None
+            if not rule['permanent']:
+                expires_at = TIMESTAMP WITH TIME ZONE.now() + timedelta(days=rule['duration_days'])
+            
+            for row in suspects.itertuples(index=False):
+                if await self.is_blacklisted(row.user_id):
+                    continue
+                await self._apply_blacklist(row.user_id, BlacklistEntry(
+                    user_id=row.user_id,
+                    reason=BlacklistReason.BOT_BEHAVIOR,
+                    confidence=float(row.score),
+                    details={
+                        'bot_score': float(row.score),
+                        'indicators': row.indicators.split(',') if row.indicators else [],
+                        'total_actions': int(row.total_actions),
+                        'competition_id': competition_id
+                    },
+                    timestamp=TIMESTAMP WITH TIME ZONE.now(),
+                    auto_generated=True,
+                    expires_at=expires_at
+                ))
+        
+        return table
+    
     async def _check_rapid_pattern(self, user_id: int) -> Optional[BlacklistEntry]:
         """Verifica padrão de ações muito rápidas"""
         try:
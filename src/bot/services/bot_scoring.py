@@ -0,0 +1,178 @@
+"""
+Pontuação de Comportamento de Bot em Lote
+Calcula, para todos os convidados de uma competição, indicadores de username e de
+intervalo entre entradas como operações de coluna e gera um ranking de suspeitos
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Mesmos critérios das verificações unitárias do FraudDetectionService
+SEQUENTIAL_USERNAME_PATTERN = r'[a-zA-Z]+\d+'
+BOT_USERNAME_KEYWORDS = ['bot', 'auto', 'test', 'fake', 'spam', 'temp']
+
+RAPID_JOIN_LEAVE_SECONDS = 300
+TIMING_WINDOW_SECONDS = 3600  # mesma janela de _check_bot_behavior (última hora)
+USERNAME_CLUSTER_MIN = 5  # usernames com o mesmo prefixo (user1, user2, ...) na competição
+
+# Indicadores calculados por janela de TIMING_WINDOW_SECONDS (vale a pior janela do usuário)
+TIMING_INDICATORS = ['artificial_timing', 'high_frequency', 'regular_timing', 'same_second_actions']
+
+# Peso de cada indicador; o score é a soma limitada a 1.0
+INDICATOR_WEIGHTS = {
+    'sequential_username': 0.2,
+    'bot_like_username': 0.2,
+    'similar_usernames': 0.2,
+    'artificial_timing': 0.3,
+    'high_frequency': 0.3,
+    'regular_timing': 0.4,
+    'same_second_actions': 0.3,
+    'rapid_join_leave': 0.3
+}
+
+def username_features(users: pd.DataFrame) -> pd.DataFrame:
+    """Indicadores de username por usuário (colunas de entrada: user_id, username)"""
+    usernames = users['username'].fillna('').astype(str)
+    prefix = usernames.str.replace(r'\d+$', '', regex=True).str.lower()
+    has_digits = usernames.str.len() > prefix.str.len()
+    cluster_size = prefix.groupby(prefix).transform('size').where(has_digits & prefix.ne(''), 0)
+
+    return pd.DataFrame({
+        'user_id': users['user_id'].to_numpy(),
+        'sequential_username': usernames.str.fullmatch(SEQUENTIAL_USERNAME_PATTERN).to_numpy(),
+        'bot_like_username': usernames.str.lower().str.contains('|'.join(BOT_USERNAME_KEYWORDS), regex=True).to_numpy(),
+        'username_cluster_size': cluster_size.to_numpy(dtype=np.int64)
+    })
+
+def timing_features(attempts: pd.DataFrame, window_seconds: Optional[int] = None) -> pd.DataFrame:
+    """
+    Estatísticas de intervalo entre entradas por usuário (colunas: user_id, ts em epoch):
+    total, segundos distintos, média, variância e coeficiente de variação dos intervalos.
+    Com window_seconds, uma linha por usuário e janela fixa (window_start em epoch),
+    sem intervalos entre janelas diferentes
+    """
+    columns = ['user_id', 'total_actions', 'unique_seconds', 'intervals',
+               'avg_interval_seconds', 'interval_variance', 'interval_cv']
+    if attempts.empty:
+        return pd.DataFrame(columns=columns + (['window_start'] if window_seconds else []))
+
+    keys = ['user_id']
+    frame = pd.DataFrame({'user_id': attempts['user_id'], 'ts': attempts['ts']})
+    if window_seconds:
+        frame['window_start'] = (np.floor(frame['ts'] / window_seconds) * window_seconds).astype(np.int64)
+        keys.append('window_start')
+
+    frame = frame.sort_values(keys + ['ts'], kind='stable')
+    same_group = np.logical_and.reduce([frame[key].eq(frame[key].shift()) for key in keys])
+    frame['interval'] = frame['ts'].diff().where(same_group)
+    frame['interval_sq'] = frame['interval'] ** 2
+    frame['second'] = np.floor(frame['ts']).astype(np.int64)
+
+    stats = frame.groupby(keys, sort=False).agg(
+        total_actions=('second', 'size'),
+        unique_seconds=('second', 'nunique'),
+        intervals=('interval', 'count'),
+        avg_interval_seconds=('interval', 'mean'),
+        mean_sq=('interval_sq', 'mean')
+    )
+    stats['interval_variance'] = (stats['mean_sq'] - stats['avg_interval_seconds'] ** 2).clip(lower=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['interval_cv'] = np.sqrt(stats['interval_variance']) / stats['avg_interval_seconds']
+    return stats.drop(columns='mean_sq').reset_index()
+
+def timing_flags(timing: pd.DataFrame) -> pd.DataFrame:
+    """Indicadores de timing de cada linha de timing_features (mesmos limites da verificação unitária)"""
+    total = timing['total_actions'].astype(float)
+    unique_ratio = timing['unique_seconds'] / total.where(total > 0)
+    return pd.DataFrame({
+        'artificial_timing': (timing['intervals'] >= 2) & (timing['interval_variance'] < 10),
+        'high_frequency': timing['total_actions'] > 20,
+        'regular_timing': timing['avg_interval_seconds'].between(1, 5),
+        'same_second_actions': unique_ratio < 0.5
+    }, index=timing.index).fillna(False)
+
+def peak_window_timing(attempts: pd.DataFrame, window_seconds: int = TIMING_WINDOW_SECONDS) -> pd.DataFrame:
+    """
+    Por usuário, a janela com maior pontuação de timing (empate: mais tentativas):
+    estatísticas e indicadores dessa janela
+    """
+    timing = timing_features(attempts, window_seconds)
+    if timing.empty:
+        return pd.DataFrame(columns=list(timing.columns) + TIMING_INDICATORS)
+
+    flags = timing_flags(timing)
+    weights = pd.Series(INDICATOR_WEIGHTS)[TIMING_INDICATORS].to_numpy()
+    timing = pd.concat([timing, flags], axis=1)
+    timing['timing_score'] = flags.to_numpy(dtype=np.float64) @ weights
+
+    peak = timing.sort_values(['user_id', 'timing_score', 'total_actions'],
+                              ascending=[True, False, False], kind='stable')
+    return peak.drop_duplicates('user_id').drop(columns='timing_score').reset_index(drop=True)
+
+def join_leave_features(actions: pd.DataFrame) -> pd.DataFrame:
+    """Pares entrada -> saída em menos de 5 minutos por usuário (colunas: user_id, action_type, ts)"""
+    if actions.empty:
+        return pd.DataFrame(columns=['user_id', 'rapid_join_leave_pairs'])
+
+    actions = actions.sort_values(['user_id', 'ts'], kind='stable')
+    next_same_user = actions['user_id'].eq(actions['user_id'].shift(-1))
+    rapid = (
+        next_same_user
+        & actions['action_type'].eq('join')
+        & actions['action_type'].shift(-1).eq('leave')
+        & (actions['ts'].shift(-1) - actions['ts'] < RAPID_JOIN_LEAVE_SECONDS)
+    )
+    return (rapid.groupby(actions['user_id']).sum()
+            .rename('rapid_join_leave_pairs').reset_index())
+
+def score_bot_likeness(users: pd.DataFrame, attempts: Optional[pd.DataFrame] = None,
+                       actions: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Tabela de suspeitos ordenada por score (maior primeiro).
+
+    users: user_id, username (e opcionalmente inviter_user_id)
+    attempts: user_id, ts - tentativas de entrada (intervalos)
+    actions: user_id, action_type, ts - entradas/saídas (ciclos rápidos)
+
+    Os indicadores de timing (e total_actions) vêm da pior janela de uma hora
+    do usuário, como na verificação unitária, e não da competição inteira.
+    """
+    attempts = attempts if attempts is not None else pd.DataFrame(columns=['user_id', 'ts'])
+    actions = actions if actions is not None else pd.DataFrame(columns=['user_id', 'action_type', 'ts'])
+
+    table = users.drop_duplicates('user_id').reset_index(drop=True)
+    table = table.merge(username_features(table), on='user_id', how='left')
+    table = table.merge(peak_window_timing(attempts), on='user_id', how='left')
+    table = table.merge(join_leave_features(actions), on='user_id', how='left')
+
+    counts = ['total_actions', 'unique_seconds', 'intervals', 'rapid_join_leave_pairs']
+    table[counts] = table[counts].fillna(0).astype(np.int64)
+
+    flags = pd.DataFrame({
+        'sequential_username': table['sequential_username'].fillna(False).astype(bool),
+        'bot_like_username': table['bot_like_username'].fillna(False).astype(bool),
+        'similar_usernames': table['username_cluster_size'].fillna(0) >= USERNAME_CLUSTER_MIN,
+        **{name: table[name].fillna(False).astype(bool) for name in TIMING_INDICATORS},
+        'rapid_join_leave': table['rapid_join_leave_pairs'] >= 2
+    })[list(INDICATOR_WEIGHTS)]
+    table = table.drop(columns=TIMING_INDICATORS)
+
+    weights = pd.Series(INDICATOR_WEIGHTS)[flags.columns]
+    table['score'] = (flags.to_numpy(dtype=np.float64) @ weights.to_numpy()).clip(0, 1).round(2)
+    table['indicators'] = flags.dot(flags.columns + ',').str.rstrip(',')
+
+    table = table.sort_values(['score', 'total_actions'], ascending=False, kind='stable').reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
+
+def build_scoring_frames(data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, pd.DataFrame]:
+    """DataFrames a partir das linhas de PostgreSQLOptimized.get_bot_scoring_data"""
+    return {
+        'users': pd.DataFrame(data.get('users') or [], columns=['user_id', 'username', 'inviter_user_id']),
+        'attempts': pd.DataFrame(data.get('attempts') or [], columns=['user_id', 'ts']).astype({'ts': float}),
+        'actions': pd.DataFrame(data.get('actions') or [], columns=['user_id', 'action_type', 'ts']).astype({'ts': float})
+    }
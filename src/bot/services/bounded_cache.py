@@ -0,0 +1,239 @@
+"""
+Cache em Memória Limitado
+TTL + LRU com limite de entradas e de bytes, carregamento single-flight
+e estatísticas por namespace
+"""
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = "default"
+_MISSING = object()
+
+def estimate_size(value: Any) -> int:
+    """Tamanho aproximado em bytes (objeto mais um nível de itens em coleções)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += sum(sys.getsizeof(v) for v in vars(value).values())
+    return size
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value: Any, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+class BoundedCache:
+    """
+    Cache TTL + LRU.
+
+    - Limite de entradas (max_entries) e de bytes estimados (max_bytes);
+      acima deles as entradas menos usadas recentemente são descartadas
+    - Entradas expiradas saem na leitura, na evicção ou em cleanup()
+    - get_or_load / get_or_load_async: vários misses simultâneos da mesma
+      chave executam o loader uma única vez (single-flight)
+    - Chaves agrupadas em namespaces, invalidáveis de uma vez
+    - None é um valor válido (ex.: "nenhuma competição ativa")
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None, default_ttl: float = None,
+                 name: str = "cache"):
+        self.max_entries = max_entries or settings.CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or settings.CACHE_MAX_BYTES
+        self.default_ttl = default_ttl if default_ttl is not None else settings.CACHE_DEFAULT_TTL
+        self.name = name
+
+        self.entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+        self.sync_flights: Dict[Tuple[str, Hashable], threading.Event] = {}
+        self.async_flights: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self.namespace_stats: Dict[str, Dict[str, int]] = {}
+
+    def _stat(self, namespace: str, counter: str, amount: int = 1):
+        stats = self.namespace_stats.get(namespace)
+        if stats is None:
+            stats = self.namespace_stats[namespace] = {
+                "hits": 0, "misses": 0, "loads": 0, "coalesced": 0,
+                "evictions": 0, "expirations": 0, "rejected": 0
+            }
+        stats[counter] += amount
+
+    def _remove(self, full_key: Tuple[str, Hashable]) -> _Entry:
+        entry = self.entries.pop(full_key)
+        self.total_bytes -= entry.size
+        return entry
+
+    def _lookup(self, full_key: Tuple[str, Hashable]) -> Any:
+        entry = self.entries.get(full_key)
+        if entry is None:
+            return _MISSING
+        if entry.expires_at <= time.monotonic():
+            self._remove(full_key)
+            self._stat(full_key[0], "expirations")
+            return _MISSING
+        self.entries.move_to_end(full_key)
+        return entry.value
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            full_key, entry = next(iter(self.entries.items()))
+            self._remove(full_key)
+            self._stat(full_key[0], "expirations" if entry.expires_at <= now else "evictions")
+
+    def get(self, key: Hashable, namespace: str = DEFAULT_NAMESPACE, default: Any = None) -> Any:
+        """Busca item no cache"""
+        with self.lock:
+            value = self._lookup((namespace, key))
+            if value is _MISSING:
+                self._stat(namespace, "misses")
+                return default
+            self._stat(namespace, "hits")
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None,
+            namespace: str = DEFAULT_NAMESPACE) -> bool:
+        """Armazena item no cache; False se o item sozinho excede max_bytes"""
+        size = estimate_size(value)
+        full_key = (namespace, key)
+        with self.lock:
+            if full_key in self.entries:
+                self._remove(full_key)
+            if size > self.max_bytes:
+                self._stat(namespace, "rejected")
+                return False
+
+            expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+            self.entries[full_key] = _Entry(value, expires_at, size)
+            self.total_bytes += size
+            self._evict()
+            return True
+
+    def delete(self, key: Hashable, namespace: str = DEFAULT_NAMESPACE) -> None:
+        """Remove item do cache"""
+        with self.lock:
+            if (namespace, key) in self.entries:
+                self._remove((namespace, key))
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Remove todas as chaves de um namespace"""
+        with self.lock:
+            keys = [full_key for full_key in self.entries if full_key[0] == namespace]
+            for full_key in keys:
+                self._remove(full_key)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Limpa todo o cache"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def cleanup(self) -> int:
+        """Remove itens expirados"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [full_key for full_key, entry in self.entries.items() if entry.expires_at <= now]
+            for full_key in expired:
+                self._remove(full_key)
+                self._stat(full_key[0], "expirations")
+            return len(expired)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    namespace: str = DEFAULT_NAMESPACE) -> Any:
+        """Versão síncrona: threads concorrentes esperam o carregamento em andamento"""
+        full_key = (namespace, key)
+        while True:
+            with self.lock:
+                value = self._lookup(full_key)
+                if value is not _MISSING:
+                    self._stat(namespace, "hits")
+                    return value
+
+                flight = self.sync_flights.get(full_key)
+                if flight is None:
+                    flight = self.sync_flights[full_key] = threading.Event()
+                    self._stat(namespace, "misses")
+                    break
+                self._stat(namespace, "coalesced")
+            # Outra thread está carregando; se ela falhar, esta assume na próxima volta
+            flight.wait()
+
+        try:
+            value = loader()
+            self._stat(namespace, "loads")
+            self.set(key, value, ttl, namespace)
+            return value
+        finally:
+            with self.lock:
+                self.sync_flights.pop(full_key, None)
+            flight.set()
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Union[Any, Awaitable[Any]]],
+                                ttl: Optional[float] = None, namespace: str = DEFAULT_NAMESPACE) -> Any:
+        """Versão assíncrona: misses concorrentes aguardam o mesmo Future"""
+        full_key = (namespace, key)
+        with self.lock:
+            value = self._lookup(full_key)
+            if value is not _MISSING:
+                self._stat(namespace, "hits")
+                return value
+
+        flight = self.async_flights.get(full_key)
+        if flight is not None:
+            self._stat(namespace, "coalesced")
+            return await asyncio.shield(flight)
+
+        self._stat(namespace, "misses")
+        flight = self.async_flights[full_key] = asyncio.get_running_loop().create_future()
+        try:
+            value = loader()
+            if inspect.isawaitable(value):
+                value = await value
+            self._stat(namespace, "loads")
+            self.set(key, value, ttl, namespace)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # evita o aviso de exceção não recuperada sem esperas
+            raise
+        finally:
+            self.async_flights.pop(full_key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ocupação e contadores por namespace"""
+        with self.lock:
+            totals = {"hits": 0, "misses": 0}
+            for stats in self.namespace_stats.values():
+                totals["hits"] += stats["hits"]
+                totals["misses"] += stats["misses"]
+            lookups = totals["hits"] + totals["misses"]
+            return {
+                "name": self.name,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate_percent": round(totals["hits"] / lookups * 100, 2) if lookups else 0.0,
+                "namespaces": {namespace: dict(stats) for namespace, stats in self.namespace_stats.items()}
+            }
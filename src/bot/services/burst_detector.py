@@ -0,0 +1,251 @@
+"""
+Detector de Rajadas de Entradas
+Janelas deslizantes em memória por convidador, por link e global, atualizadas
+em O(1) a cada entrada (substitui os GROUP BY por minuto no caminho da entrada)
+"""
+import logging
+import time
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class SecondRing:
+    """
+    Contador de janela deslizante: anel de buckets de 1 segundo.
+
+    Avançar o relógio zera apenas os buckets que saíram da janela, então o
+    custo é O(1) amortizado por evento; o total da janela é mantido à parte.
+    """
+
+    __slots__ = ('counts', 'head', 'total')
+
+    def __init__(self, window: int):
+        self.counts = array('I', bytes(4 * window))
+        self.head: Optional[int] = None
+        self.total = 0
+
+    def _advance(self, second: int):
+        if self.head is None:
+            self.head = second
+            return
+        gap = second - self.head
+        if gap <= 0:
+            return
+        window = len(self.counts)
+        if gap >= window:
+            self.counts = array('I', bytes(4 * window))
+            self.total = 0
+        else:
+            for s in range(self.head + 1, second + 1):
+                index = s % window
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.head = second
+
+    def add(self, second: int, amount: int = 1) -> int:
+        """Soma `amount` no segundo dado e retorna o total da janela"""
+        self._advance(second)
+        # Eventos atrasados ainda dentro da janela entram no bucket deles
+        if second > self.head - len(self.counts):
+            self.counts[second % len(self.counts)] += amount
+            self.total += amount
+        return self.total
+
+    def count(self, second: int) -> int:
+        """Total da janela terminada no segundo dado"""
+        self._advance(second)
+        return self.total
+
+@dataclass
+class BurstAlert:
+    """Alerta de rajada de entradas"""
+    scope: str  # inviter, link ou global
+    key: Any
+    count: int
+    threshold: int
+    window_seconds: int
+    timestamp: datetime
+
+class BurstDetector:
+    """
+    Detector de rajadas sobre o fluxo de entradas.
+
+    - Um SecondRing por convidador, por link e um global; cada entrada
+      atualiza três anéis e compara com os limites configurados
+    - Ao passar do limite gera um BurstAlert (no máximo um por chave a cada
+      `cooldown` segundos)
+    - Membros que entram durante uma rajada ficam marcados (maior contagem
+      vista e minutos distintos) para consulta O(1) pela blacklist
+    - Chaves sem entradas há mais de uma janela são descartadas
+
+    As consultas SQL por minuto continuam disponíveis para auditoria offline.
+    """
+
+    def __init__(self, window_seconds: int = None, inviter_threshold: int = None,
+                 link_threshold: int = None, global_threshold: int = None,
+                 cooldown: float = None, max_keys: int = None, member_retention: float = None):
+        self.window = window_seconds or settings.BURST_WINDOW_SECONDS
+        self.thresholds = {
+            "inviter": inviter_threshold or settings.BURST_INVITER_THRESHOLD,
+            "link": link_threshold or settings.BURST_LINK_THRESHOLD,
+            "global": global_threshold or settings.BURST_GLOBAL_THRESHOLD
+        }
+        self.cooldown = cooldown if cooldown is not None else settings.BURST_ALERT_COOLDOWN
+        self.max_keys = max_keys or settings.BURST_MAX_KEYS
+        self.member_retention = member_retention if member_retention is not None else settings.BURST_MEMBER_RETENTION
+
+        # Anéis por chave, em ordem de última entrada (as mais antigas no começo)
+        self.rings: Dict[str, "OrderedDict[Hashable, SecondRing]"] = {
+            "inviter": OrderedDict(),
+            "link": OrderedDict()
+        }
+        self.global_ring = SecondRing(self.window)
+        self.last_alert: Dict[tuple, float] = {}
+        self.alerts: Deque[BurstAlert] = deque(maxlen=settings.FRAUD_MAX_ALERTS)
+
+        # member_id -> [maior contagem na janela, último minuto marcado, minutos distintos, visto em]
+        self.flagged_members: "OrderedDict[int, List[float]]" = OrderedDict()
+
+        self.metrics = {
+            "events": 0,
+            "alerts": 0,
+            "suppressed_alerts": 0,
+            "flagged_members": 0,
+            "keys_expired": 0
+        }
+
+    def _ring(self, scope: str, key: Hashable, second: int) -> SecondRing:
+        rings = self.rings[scope]
+        ring = rings.get(key)
+        if ring is None:
+            ring = rings[key] = SecondRing(self.window)
+        else:
+            rings.move_to_end(key)
+
+        # Descarta chaves ociosas (só olha o começo da ordem) e limita o total
+        while rings:
+            oldest_key, oldest = next(iter(rings.items()))
+            if oldest is ring or (oldest.head is not None and second - oldest.head < self.window
+                                  and len(rings) <= self.max_keys):
+                break
+            rings.popitem(last=False)
+            self.metrics["keys_expired"] += 1
+        return ring
+
+    def _alert(self, scope: str, key: Any, count: int, now: float) -> Optional[BurstAlert]:
+        last = self.last_alert.get((scope, key))
+        if last is not None and now - last < self.cooldown:
+            self.metrics["suppressed_alerts"] += 1
+            return None
+
+        self.last_alert[(scope, key)] = now
+        if len(self.last_alert) > self.max_keys:
+            self.last_alert = {k: t for k, t in self.last_alert.items() if now - t < self.cooldown}
+
+        alert = BurstAlert(scope, key, count, self.thresholds[scope], self.window, datetime.now())
+        self.alerts.append(alert)
+        self.metrics["alerts"] += 1
+        logger.warning(f"🚨 Rajada de entradas ({scope} {key}): {count} em {self.window}s "
+                       f"(limite {self.thresholds[scope]})")
+        return alert
+
+    def _flag_member(self, member_id: int, count: int, now: float):
+        minute = int(now // 60)
+        flags = self.flagged_members.get(member_id)
+        if flags is None:
+            self.flagged_members[member_id] = [count, minute, 1, now]
+            self.metrics["flagged_members"] += 1
+        else:
+            self.flagged_members.move_to_end(member_id)
+            flags[0] = max(flags[0], count)
+            if flags[1] != minute:
+                flags[1] = minute
+                flags[2] += 1
+            flags[3] = now
+
+        while self.flagged_members:
+            _, oldest = next(iter(self.flagged_members.items()))
+            if now - oldest[3] < self.member_retention and len(self.flagged_members) <= self.max_keys:
+                break
+            self.flagged_members.popitem(last=False)
+
+    def record(self, inviter_id: Optional[int], link_id: Optional[Hashable], member_id: Optional[int] = None,
+               amount: int = 1, now: Optional[float] = None) -> List[BurstAlert]:
+        """Registra uma entrada e retorna os alertas novos que ela disparou"""
+        now = time.time() if now is None else now
+        second = int(now)
+        self.metrics["events"] += 1
+
+        counts = {"global": self.global_ring.add(second, amount)}
+        if inviter_id is not None:
+            counts["inviter"] = self._ring("inviter", inviter_id, second).add(second, amount)
+        if link_id is not None:
+            counts["link"] = self._ring("link", link_id, second).add(second, amount)
+
+        keys = {"global": "all", "inviter": inviter_id, "link": link_id}
+        alerts = []
+        bursting = 0
+        for scope, count in counts.items():
+            if count >= self.thresholds[scope]:
+                bursting = max(bursting, count)
+                alert = self._alert(scope, keys[scope], count, now)
+                if alert:
+                    alerts.append(alert)
+
+        if bursting and member_id is not None:
+            self._flag_member(member_id, bursting, now)
+        return alerts
+
+    def current(self, scope: str, key: Hashable = None, now: Optional[float] = None) -> int:
+        """Entradas na janela atual para um convidador, link ou global (não registra evento)"""
+        second = int(time.time() if now is None else now)
+        ring = self.global_ring if scope == "global" else self.rings[scope].get(key)
+        if ring is None or ring.head is None:
+            return 0
+        if second - ring.head >= self.window:
+            return 0
+        return ring.count(second)
+
+    def is_bursting(self, inviter_id: Optional[int] = None, link_id: Optional[Hashable] = None,
+                    now: Optional[float] = None) -> Dict[str, int]:
+        """Escopos acima do limite neste momento, com a contagem de cada um"""
+        result = {}
+        for scope, key in (("inviter", inviter_id), ("link", link_id), ("global", None)):
+            if scope != "global" and key is None:
+                continue
+            count = self.current(scope, key, now)
+            if count >= self.thresholds[scope]:
+                result[scope] = count
+        return result
+
+    def get_member_flags(self, member_id: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Participação do membro em rajadas dentro da retenção"""
+        flags = self.flagged_members.get(member_id)
+        now = time.time() if now is None else now
+        if flags is None or now - flags[3] >= self.member_retention:
+            return None
+        return {"max_window_count": int(flags[0]), "burst_minutes": int(flags[2])}
+
+    def get_recent_alerts(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Alertas mais recentes primeiro"""
+        return [asdict(alert) for alert in list(self.alerts)[-limit:][::-1]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tamanho dos anéis, limites e contadores"""
+        return {
+            "window_seconds": self.window,
+            "thresholds": dict(self.thresholds),
+            "tracked_inviters": len(self.rings["inviter"]),
+            "tracked_links": len(self.rings["link"]),
+            "global_window_count": self.current("global"),
+            "flagged_members_tracked": len(self.flagged_members),
+            **self.metrics
+        }
+
+burst_detector = BurstDetector()
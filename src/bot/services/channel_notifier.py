@@ -10,14 +10,16 @@ from telegram import Bot
 from telegram.error import TelegramError
 
 from src.config.settings import settings
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
 
 logger = logging.getLogger(__name__)
 
 class ChannelNotifier:
     """Gerenciador de notificações automáticas para o canal"""
     
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, scheduler: MessageScheduler):
         self.bot = bot
+        self.scheduler = scheduler
         self.channel_id = settings.CHAT_ID
     
     async def notify_competition_start(self, competition_data: Dict[str, Any]) -> bool:
@@ -48,10 +50,11 @@ class ChannelNotifier:
             msg += f"4️⃣ Acompanhe sua posição com /ranking\n\n"
             msg += f"🏅 *Boa sorte a todos os participantes!*"
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=msg,
-                parse_mode='Markdown'
+                text=msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
             )
             
             logger.info(f"✅ Notificação de início de competição enviada: {name}")
@@ -65,12 +68,18 @@ class ChannelNotifier:
             return False
     
     async def notify_competition_end(self, competition_data: Dict[str, Any], 
-                                   final_ranking: List[Dict[str, Any]]) -> bool:
-        """Notifica finalização de competição com ranking final"""
+                                   final_ranking: List[Dict[str, Any]],
+                                   stats: Dict[str, Any] = None) -> bool:
+        """
+        Notifica finalização de competição com ranking final.
+        final_ranking vem de get_competition_ranking (top-N); os totais da
+        competição inteira podem ser passados em stats.
+        """
         try:
             name = competition_data.get('name', 'Competição')
-            total_participants = len(final_ranking)
-            total_invites = sum(p.get('invites_count', 0) for p in final_ranking)
+            stats = stats or {}
+            total_participants = stats.get('total_participants', len(final_ranking))
+            total_invites = stats.get('total_invites', sum(p.get('invites_count', 0) for p in final_ranking))
             
             msg = f"🏁 *COMPETIÇÃO FINALIZADA!*\n\n"
             msg += f"🏆 *Competição:* {name}\n"
@@ -101,10 +110,11 @@ class ChannelNotifier:
             msg += f"\n🎉 *Parabéns a todos os participantes!*\n"
             msg += f"🔥 *Aguardem a próxima competição!*"
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=msg,
-                parse_mode='Markdown'
+                text=msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
             )
             
             logger.info(f"✅ Notificação de fim de competição enviada: {name}")
@@ -156,10 +166,12 @@ class ChannelNotifier:
             msg += f"\n💪 *Continue convidando e suba no ranking!*\n"
             msg += f"📱 *Use /ranking para ver o ranking completo*"
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=msg,
-                parse_mode='Markdown'
+                text=msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING,
+                coalesce_key='ranking_update'
             )
             
             logger.info(f"✅ Notificação de ranking enviada: {competition_name}")
@@ -203,10 +215,11 @@ class ChannelNotifier:
             else:
                 return False
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=msg,
-                parse_mode='Markdown'
+                text=msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING
             )
             
             logger.info(f"✅ Notificação de marco enviada: {milestone_type} - {value}")
@@ -246,10 +259,12 @@ class ChannelNotifier:
             
             msg += f"🔥 *Continue participando e convidando!*"
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=msg,
-                parse_mode='Markdown'
+                text=msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING,
+                coalesce_key='daily_stats'
             )
             
             logger.info(f"✅ Estatísticas diárias enviadas: {competition_name}")
@@ -267,11 +282,16 @@ class ChannelNotifier:
         try:
             test_msg = "🤖 *Teste de conexão do bot*\n\nSistema funcionando normalmente!"
             
-            await self.bot.send_message(
+            sent = await self.scheduler.send_message(
                 chat_id=self.channel_id,
-                VARCHAR=test_msg,
-                parse_mode='Markdown'
+                text=test_msg,
+                parse_mode='Markdown',
+                priority=MessagePriority.ADMIN_ALERT,
+                wait=True
             )
+            if not sent:
+                logger.error("❌ Erro no teste de conexão: mensagem não enviada")
+                return False
             
             logger.info("✅ Teste de conexão com canal bem-sucedido")
             return True
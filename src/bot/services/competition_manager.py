@@ -12,23 +12,78 @@ from src.config.settings import settings
 from src.database.models import DatabaseManager, Competition, CompetitionStatus, CompetitionParticipant
 from src.bot.utils.datetime_helper import safe_datetime_conversion
 from src.bot.services.points_sync_manager import PointsSyncManager
+from src.bot.services.leaderboard import Leaderboard
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
+from src.bot.services.milestone_ledger import MilestoneLedger
+from src.bot.services.active_competition_cache import active_competition_cache
+from src.bot.services.link_registry import link_registry
 import logging
 
 logger = logging.getLogger(__name__)
 
 class CompetitionManager:
-    def __init__(self, db_manager: DatabaseManager, bot: Bot = None):
+    USER_MILESTONES = (1000, 2000, 3000, 4000)
+    
+    def __init__(self, db_manager: DatabaseManager, bot: Bot = None, *, scheduler: MessageScheduler,
+                 milestone_ledger: MilestoneLedger = None, async_db=None):
         self.db = db_manager
+        # AsyncPostgreSQLManager (opcional): os métodos *_async consultam por ele sem bloquear o loop
+        self.async_db = async_db
         self.bot = bot
+        self.scheduler = scheduler
+        self.milestone_ledger = milestone_ledger or MilestoneLedger(db_manager)
         self.points_sync = PointsSyncManager(db_manager)
         self.timezone = settings.timezone
+        self.leaderboard: Optional[Leaderboard] = None
         
+    def load_leaderboard(self, competition_id: int = None) -> Optional[Leaderboard]:
+        """Carrega (ou recarrega) o leaderboard em memória da competição ativa"""
+        try:
+            if competition_id is None:
+                active_comp = self.get_active_competition()
+                if not active_comp:
+                    self.leaderboard = None
+                    return None
+                competition_id = active_comp.id
+            
+            leaderboard = Leaderboard(competition_id)
+            leaderboard.load(self.db.get_competition_scores(competition_id))
+            self.leaderboard = leaderboard
+            return leaderboard
+            
+        except Exception as e:
+            logger.error(f"Erro ao carregar leaderboard da competição {competition_id}: {e}")
+            self.leaderboard = None
+            return None
+    
+    def load_link_registry(self, competition_id: int = None) -> int:
+        """Pré-carrega o registro de links com os links ativos da competição ativa"""
+        try:
+            if competition_id is None:
+                active_comp = self.get_active_competition()
+                if not active_comp:
+                    return 0
+                competition_id = active_comp.id
+            
+            return link_registry.preload(self.db.get_registry_invite_links(competition_id))
+            
+        except Exception as e:
+            logger.error(f"Erro ao carregar registro de links da competição {competition_id}: {e}")
+            return 0
+    
+    def _leaderboard_for(self, competition_id: int) -> Optional[Leaderboard]:
+        """Retorna o leaderboard em memória se for da competição informada"""
+        leaderboard = self.leaderboard
+        if leaderboard and leaderboard.competition_id == competition_id:
+            return leaderboard
+        return None
+    
     def create_competition(self, name: str, description: str = None, 
                           duration_days: int = None, target_invites: int = None,
                           admin_user_id: int = None) -> Competition:
         """Cria uma nova competição com configurações personalizadas"""
         try:
-            # Verificar se já existe competição ativa
+            # Verificar se já existe competição ativa (direto no banco, sem snapshot)
             active_comp = self.db.get_active_competition()
             if active_comp:
                 raise ValueError("Já existe uma competição ativa. Finalize-a antes de criar uma nova.")
@@ -55,6 +110,7 @@ class CompetitionManager:
                 duration_days=duration_days,
                 target_invites=target_invites
             )
+            active_competition_cache.invalidate("create_competition")
             
             logger.info(f"Competição criada: {name} (ID: {competition.id})")
             return competition
@@ -69,9 +125,12 @@ class CompetitionManager:
             # Versão simplificada que sempre funciona
             from src.database.models import CompetitionStatus
             success = self.db.update_competition_status(competition_id, CompetitionStatus.ACTIVE)
+            active_competition_cache.invalidate("start_competition")
             
             if success:
                 logger.info(f"Competição iniciada: ID {competition_id}")
+                self.load_leaderboard(competition_id)
+                self.load_link_registry(competition_id)
             
             return success
             
@@ -91,9 +150,13 @@ class CompetitionManager:
                 competition_id, 
                 CompetitionStatus.FINISHED
             )
+            active_competition_cache.invalidate("finish_competition")
             
             if success:
                 logger.info(f"Competição finalizada: ID {competition_id}, Motivo: {reason}")
+                if self._leaderboard_for(competition_id):
+                    self.leaderboard = None
+                self.milestone_ledger.forget(competition_id)
             
             return success
             
@@ -112,17 +175,52 @@ class CompetitionManager:
             return None
     
     def get_active_competition(self) -> Optional[Competition]:
-        """Busca a competição ativa atual"""
-        return self.db.get_active_competition()
+        """Busca a competição ativa atual (snapshot em memória)"""
+        return active_competition_cache.get(self.db.get_active_competition)
+    
+    async def get_active_competition_async(self) -> Optional[Competition]:
+        """get_active_competition() lendo pelo gerenciador assíncrono quando disponível"""
+        if self.async_db is None:
+            return self.get_active_competition()
+        return await active_competition_cache.get_async(self.async_db.get_active_competition)
     
     def add_participant(self, competition_id: int, user_id: int) -> bool:
         """Adiciona um participante à competição"""
         try:
-            competition = self.get_competition(competition_id)
-            if not competition or competition.status != CompetitionStatus.ACTIVE:
+            # A competição ativa vem do snapshot; só outras consultam o banco
+            competition = self.get_active_competition()
+            if not competition or competition.id != competition_id:
+                competition = self.get_competition(competition_id)
+            if not self._is_active(competition):
                 return False
             
             self.db.add_competition_participant(competition_id, user_id)
+            leaderboard = self._leaderboard_for(competition_id)
+            if leaderboard:
+                leaderboard.add_participant(user_id)
+            logger.info(f"Participante {user_id} adicionado à competição {competition_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao adicionar participante {user_id} à competição {competition_id}: {e}")
+            return False
+    
+    async def add_participant_async(self, competition_id: int, user_id: int) -> bool:
+        """add_participant() gravando pelo gerenciador assíncrono quando disponível"""
+        if self.async_db is None:
+            return self.add_participant(competition_id, user_id)
+        try:
+            competition = await self.get_active_competition_async()
+            if not competition or competition.id != competition_id:
+                competition = self.get_competition(competition_id)
+            if not self._is_active(competition):
+                return False
+            
+            if not await self.async_db.add_participant(competition_id, user_id):
+                return False
+            leaderboard = self._leaderboard_for(competition_id)
+            if leaderboard:
+                leaderboard.add_participant(user_id)
             logger.info(f"Participante {user_id} adicionado à competição {competition_id}")
             return True
             
@@ -130,11 +228,31 @@ class CompetitionManager:
             logger.error(f"Erro ao adicionar participante {user_id} à competição {competition_id}: {e}")
             return False
     
+    async def get_user_async(self, user_id: int):
+        """Busca o usuário pelo gerenciador assíncrono quando disponível"""
+        if self.async_db is None:
+            return self.db.get_user(user_id)
+        return await self.async_db.get_user(user_id)
+    
+    async def create_user_async(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+        """Busca ou cria o usuário pelo gerenciador assíncrono quando disponível"""
+        if self.async_db is None:
+            return self.db.create_user(user_id=user_id, username=username, first_name=first_name, last_name=last_name)
+        return await self.async_db.create_user(user_id, username=username, first_name=first_name, last_name=last_name)
+    
+    @staticmethod
+    def _is_active(competition: Optional[Competition]) -> bool:
+        """Status vem do banco como texto ('active'); aceita também o Enum"""
+        if not competition:
+            return False
+        status = getattr(competition.status, 'value', competition.status)
+        return status == CompetitionStatus.ACTIVE.value
+    
     def record_invite(self, user_id: int, invite_link: str) -> bool:
         """Registra um convite na competição ativa com sincronização automática"""
         try:
             active_comp = self.get_active_competition()
-            if not active_comp or active_comp.status != CompetitionStatus.ACTIVE:
+            if not self._is_active(active_comp):
                 return False
             
             # Adicionar participante se não existir
@@ -145,17 +263,7 @@ class CompetitionManager:
             
             if success:
                 logger.info(f"✅ Convite registrado e sincronizado: usuário {user_id}")
-                
-                # Buscar pontos atualizados para verificar marcos
-                stats = self.db.get_user_competition_stats(active_comp.id, user_id)
-                current_invites = stats['invites_count'] if stats else 0
-                
-                # Verificar marcos e notificações
-                asyncio.create_task(self._check_milestones(active_comp, user_id, current_invites))
-                
-                # Verificar se atingiu a meta
-                if current_invites >= active_comp.target_invites:
-                    asyncio.create_task(self._handle_target_reached(active_comp, user_id))
+                self.on_invite_recorded(active_comp, user_id)
             else:
                 # Fallback para método antigo se sincronização falhar
                 logger.warning(f"⚠️ Sincronização falhou, usando método tradicional para usuário {user_id}")
@@ -170,6 +278,9 @@ class CompetitionManager:
                 
                 if success:
                     logger.info(f"Convite registrado (método tradicional): usuário {user_id}, total {new_invites}")
+                    leaderboard = self._leaderboard_for(active_comp.id)
+                    if leaderboard:
+                        leaderboard.set_score(user_id, new_invites)
             
             return success
             
@@ -177,6 +288,84 @@ class CompetitionManager:
             logger.error(f"Erro ao registrar convite para usuário {user_id}: {e}")
             return False
     
+    def prepare_invite_credit(self, user_id: int) -> Optional[Competition]:
+        """
+        Prepara o crédito de um convite para o escritor em lote:
+        retorna a competição ativa (garantindo o participante) ou None
+        """
+        try:
+            active_comp = self.get_active_competition()
+            if not self._is_active(active_comp):
+                logger.warning(f"Nenhuma competição ativa para creditar o convite do usuário {user_id}")
+                return None
+            
+            if not self.add_participant(active_comp.id, user_id):
+                logger.error(f"Participante {user_id} não registrado na competição {active_comp.id}")
+                return None
+            return active_comp
+            
+        except Exception as e:
+            logger.error(f"Erro ao preparar crédito de convite para usuário {user_id}: {e}")
+            return None
+    
+    async def prepare_invite_credit_async(self, user_id: int) -> Optional[Competition]:
+        """prepare_invite_credit() pelo gerenciador assíncrono"""
+        try:
+            active_comp = await self.get_active_competition_async()
+            if not self._is_active(active_comp):
+                logger.warning(f"Nenhuma competição ativa para creditar o convite do usuário {user_id}")
+                return None
+            
+            if not await self.add_participant_async(active_comp.id, user_id):
+                logger.error(f"Participante {user_id} não registrado na competição {active_comp.id}")
+                return None
+            return active_comp
+            
+        except Exception as e:
+            logger.error(f"Erro ao preparar crédito de convite para usuário {user_id}: {e}")
+            return None
+    
+    def on_invite_recorded(self, competition: Competition, user_id: int):
+        """Verifica marcos e meta depois que o convite foi gravado"""
+        # Pontos atualizados pelo leaderboard em memória (banco como fallback)
+        leaderboard = self._leaderboard_for(competition.id)
+        if leaderboard:
+            previous_invites, current_invites = leaderboard.increment(user_id)
+        else:
+            stats = self.db.get_user_competition_stats(competition.id, user_id)
+            current_invites = stats['invites_count'] if stats else 0
+            previous_invites = current_invites - 1
+        
+        # Verificar marcos e notificações
+        asyncio.create_task(self._check_milestones(competition, user_id, previous_invites, current_invites))
+        
+        # Verificar se atingiu a meta
+        if current_invites >= competition.target_invites:
+            asyncio.create_task(self._handle_target_reached(competition, user_id))
+    
+    def get_competition_totals(self, competition_id: int) -> Dict[str, int]:
+        """Participantes e convites da competição (leaderboard em memória; totais mantidos no banco como fallback)"""
+        leaderboard = self._leaderboard_for(competition_id)
+        if leaderboard:
+            return {'total_participants': len(leaderboard), 'total_invites': leaderboard.total_score}
+        return self.db.get_competition_totals(competition_id)
+    
+    async def get_competition_totals_async(self, competition_id: int) -> Dict[str, int]:
+        """get_competition_totals() com o fallback de banco pelo gerenciador assíncrono"""
+        leaderboard = self._leaderboard_for(competition_id)
+        if leaderboard:
+            return {'total_participants': len(leaderboard), 'total_invites': leaderboard.total_score}
+        if self.async_db is None:
+            return self.db.get_competition_totals(competition_id)
+        return await self.async_db.get_competition_totals(competition_id)
+    
+    def reconcile_competition_totals(self, competition_id: int) -> Optional[int]:
+        """Corrige os totais mantidos na competição a partir da tabela de participantes"""
+        corrected = self.db.reconcile_competition_totals(competition_id)
+        if corrected:
+            logger.warning(f"⚠️ Totais da competição {competition_id} divergiam e foram recalculados")
+        return corrected
+    
     def get_competition_status(self, competition_id: int) -> Dict[str, Any]:
         """Busca status completo da competição"""
         try:
@@ -185,7 +374,7 @@ class CompetitionManager:
                 return {}
             
             stats = self.db.get_competition_stats(competition_id)
-            ranking = self.db.get_competition_ranking(competition_id, limit=3)
+            ranking = self.get_competition_ranking(competition_id, limit=3)
             
             # Calcular tempo restante - versão robusta
             from src.bot.utils.datetime_helper import calculate_time_remaining
@@ -212,7 +401,10 @@ class CompetitionManager:
             if not competition:
                 return {}
             
-            user_stats = self.db.get_user_competition_stats(competition_id, user_id)
+            leaderboard = self._leaderboard_for(competition_id)
+            user_stats = leaderboard.participant_stats(user_id) if leaderboard else None
+            if user_stats is None:
+                user_stats = self.db.get_user_competition_stats(competition_id, user_id)
             if not user_stats:
                 return {'is_participant': False}
             
@@ -262,7 +454,7 @@ class CompetitionManager:
             
             # Verificar se alguém atingiu a meta
             try:
-                ranking = self.db.get_competition_ranking(active_comp.id, limit=1)
+                ranking = self.get_competition_ranking(active_comp.id, limit=1)
                 if ranking and ranking[0]['invites_count'] >= active_comp.target_invites:
                     self.finish_competition(active_comp.id, "meta_atingida")
                     return True
@@ -300,10 +492,11 @@ class CompetitionManager:
 Boa sorte a todos! 🍀
             """.strip()
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.announcement_channel,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
             )
             
         except TelegramError as e:
@@ -315,7 +508,7 @@ Boa sorte a todos! 🍀
             if not settings.NOTIFY_COMPETITION_END:
                 return
             
-            ranking = self.db.get_competition_ranking(competition.id, limit=10)
+            ranking = await self.get_competition_ranking_async(competition.id, limit=10)
             stats = self.db.get_competition_stats(competition.id)
             
             reason_text = {
@@ -352,51 +545,58 @@ Boa sorte a todos! 🍀
 Próxima competição em breve! 🚀
             """.strip()
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.announcement_channel,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
             )
             
         except TelegramError as e:
             logger.error(f"Erro ao enviar notificação de fim: {e}")
     
-    async def _check_milestones(self, competition: Competition, user_id: int, invites_count: int):
-        """Verifica marcos atingidos"""
+    async def _check_milestones(self, competition: Competition, user_id: int, previous_invites: int, invites_count: int):
+        """Verifica marcos cruzados entre a pontuação anterior e a atual"""
         try:
             if not settings.NOTIFY_MILESTONE_REACHED:
                 return
             
-            milestones = [1000, 2000, 3000, 4000]
+            # Marcos pulados em incrementos em lote também contam; só o maior é anunciado
+            claimed = self.milestone_ledger.claim_crossed(
+                competition.id, user_id, self.USER_MILESTONES, invites_count, old=previous_invites
+            )
+            if not claimed:
+                return
             
-            for milestone in milestones:
-                if invites_count == milestone:
-                    user = self.db.get_user(user_id)
-                    username = user.username or user.first_name or f"Usuário {user_id}"
-                    
-                    message = f"""
+            milestone = claimed[-1]
+            user = await self.get_user_async(user_id)
+            username = user.username or user.first_name or f"Usuário {user_id}"
+            
+            message = f"""
 🎯 **MARCO ATINGIDO!**
 
 🏅 **{username}** alcançou **{milestone:,} convites**!
 
 Parabéns pelo excelente desempenho! 👏
 Continue assim para chegar aos {competition.target_invites:,}! 🚀
-                    """.strip()
-                    
-                    await self.bot.send_message(
-                        chat_id=settings.announcement_channel,
-                        VARCHAR=message,
-                        parse_mode='Markdown'
-                    )
-                    break
+            """.strip()
+            
+            await self.scheduler.send_message(
+                chat_id=settings.announcement_channel,
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING
+            )
                     
         except TelegramError as e:
             logger.error(f"Erro ao enviar notificação de marco: {e}")
+        except Exception as e:
+            logger.error(f"Erro ao verificar marcos do usuário {user_id}: {e}")
     
     async def _handle_target_reached(self, competition: Competition, user_id: int):
         """Lida com meta atingida"""
         try:
-            user = self.db.get_user(user_id)
+            user = await self.get_user_async(user_id)
             username = user.username or user.first_name or f"Usuário {user_id}"
             
             message = f"""
@@ -408,10 +608,11 @@ A competição "{competition.name}" será finalizada em breve.
 Aguardem o ranking final! 🏁
             """.strip()
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.announcement_channel,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
             )
             
             # Finalizar competição
@@ -420,37 +621,21 @@ Aguardem o ranking final! 🏁
         except TelegramError as e:
             logger.error(f"Erro ao lidar com meta atingida: {e}")
 
-    def get_competition_ranking(self, competition_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Obtém o ranking da competição"""
+    def get_competition_ranking(self, competition_id: int, limit: int = 10,
+                                after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Obtém o ranking da competição (leaderboard em memória ou uma única consulta).
+        after: cursor (invites_count, user_id) da última linha da página anterior
+        """
         try:
             logger.info(f"Buscando ranking da competição {competition_id} (limit: {limit})")
             
-            # Buscar participantes da competição ordenados por convites
-            participants = self.db.get_competition_participants_global_global(competition_id)
+            # Todas as páginas saem da mesma fonte para o cursor não pular nem repetir empates
+            leaderboard = self._leaderboard_for(competition_id)
+            if leaderboard:
+                return leaderboard.top(limit, after=after)
             
-            if not participants:
-                logger.info(f"Nenhum participante encontrado para competição {competition_id}")
-                return []
-            
-            # Converter para formato de ranking
-            ranking = []
-            for participant in participants[:limit]:
-                try:
-                    user = self.db.get_user(participant.user_id)
-                    # Usar first_name ao invés de name (que não existe)
-                    user_name = getattr(user, 'first_name', None) or getattr(user, 'username', None) or f"Usuário {participant.user_id}"
-                    
-                    ranking_item = {
-                        'user_id': participant.user_id,
-                        'user_name': user_name,
-                        'invites_count': participant.invites_count,
-                        'position': len(ranking) + 1
-                    }
-                    ranking.append(ranking_item)
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao processar participante {participant.user_id}: {e}")
-                    continue
+            ranking = self.db.get_competition_ranking(competition_id, limit=limit, after=after)
             
             logger.info(f"Ranking obtido com {len(ranking)} participantes")
             return ranking
@@ -459,3 +644,20 @@ Aguardem o ranking final! 🏁
             logger.error(f"Erro ao obter ranking da competição {competition_id}: {e}")
             return []
 
+    async def get_competition_ranking_async(self, competition_id: int, limit: int = 10,
+                                            after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """get_competition_ranking() com a consulta pelo gerenciador assíncrono"""
+        if self.async_db is None:
+            return self.get_competition_ranking(competition_id, limit=limit, after=after)
+        try:
+            leaderboard = self._leaderboard_for(competition_id)
+            if leaderboard:
+                return leaderboard.top(limit, after=after)
+            
+            ranking = await self.async_db.get_competition_ranking(competition_id, limit=limit, after=after)
+            logger.info(f"Ranking obtido com {len(ranking)} participantes")
+            return ranking
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter ranking da competição {competition_id}: {e}")
+            return []
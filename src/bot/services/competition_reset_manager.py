@@ -8,6 +8,8 @@ from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE
 
 from src.database.models import DatabaseManager, CompetitionStatus
 from src.bot.services.link_reuse_manager import LinkReuseManager
+from src.bot.services.active_competition_cache import active_competition_cache
+from src.bot.services.link_registry import link_registry
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +70,10 @@ class CompetitionResetManager:
                 'error': str(e),
                 'reset_at': TIMESTAMP WITH TIME ZONE.now().isoformat()
             }
+        finally:
+            # Mesmo um reset parcial pode ter trocado a competição ativa e os links
+            active_competition_cache.invalidate("competition_reset")
+            link_registry.invalidate("competition_reset")
     
     def _finalize_previous_competition(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,294 @@
+"""
+Validação de Convites em Lote
+Pontua milhares de convites de uma vez a partir de dados pré-carregados
+(mesmas regras de FraudDetectionService.validate_invite, em operações de array)
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.database.postgresql_optimized import FraudDetectionResult
+
+logger = logging.getLogger(__name__)
+
+# (invited_user_id, inviter_user_id, invite_link_id)
+InviteTuple = Tuple[int, int, int]
+
+# Códigos de decisão, na ordem de prioridade das verificações do validate_invite
+VALID, DUPLICATE, DUPLICATE_IN_BATCH, SUSPICIOUS_PATTERN, BLACKLISTED, \
+    RAPID_JOIN_LEAVE, HIGH_FREQUENCY, ARTIFICIAL_TIMING = range(8)
+
+@dataclass
+class FraudBatchContext:
+    """Dados pré-carregados para um lote (ver PostgreSQLOptimized.prefetch_fraud_context)"""
+    existing: Dict[Tuple[int, int], Dict[str, Any]] = field(default_factory=dict)
+    recent_invites: Dict[int, int] = field(default_factory=dict)
+    blacklisted: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    # Ações por usuário, ordenadas por (user_id, timestamp DESC); timestamps em epoch
+    action_user_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    action_types: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))
+    action_timestamps: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    # Reauditoria: instante da entrada e convites na hora anterior, por (convidado, convidador)
+    audit_joins: Dict[Tuple[int, int], Tuple[float, int]] = field(default_factory=dict)
+
+    @property
+    def is_audit(self) -> bool:
+        return bool(self.audit_joins)
+
+    @classmethod
+    def from_rows(cls, existing: List[Dict[str, Any]], recent_invites: List[Dict[str, Any]],
+                  blacklisted: List[Dict[str, Any]], actions: List[Dict[str, Any]],
+                  audit_joins: Optional[List[Dict[str, Any]]] = None) -> 'FraudBatchContext':
+        return cls(
+            existing={(row['invited_user_id'], row['inviter_user_id']): row for row in existing},
+            recent_invites={row['invited_user_id']: int(row['recent_invites']) for row in recent_invites},
+            blacklisted={row['user_id']: row for row in blacklisted},
+            action_user_ids=np.fromiter((row['user_id'] for row in actions), dtype=np.int64, count=len(actions)),
+            action_types=np.array([row['action_type'] for row in actions], dtype=object),
+            action_timestamps=np.fromiter((float(row['ts']) for row in actions), dtype=np.float64, count=len(actions)),
+            audit_joins={
+                (row['invited_user_id'], row['inviter_user_id']): (float(row['ts']), int(row['recent_invites']))
+                for row in audit_joins or []
+            }
+        )
+
+def _action_stats(context: FraudBatchContext, users: np.ndarray, now: float,
+                  window_seconds: float = 3600) -> Dict[str, np.ndarray]:
+    """
+    Estatísticas da última hora por usuário do lote, alinhadas a `users`:
+    nº de ações, pares entrada/saída rápidos, nº de intervalos e variância
+    """
+    n = len(users)
+    result = {
+        "actions": np.zeros(n, dtype=np.int64),
+        "join_leave_pairs": np.zeros(n, dtype=np.int64),
+        "intervals": np.zeros(n, dtype=np.int64),
+        "variance": np.full(n, np.inf)
+    }
+
+    recent = context.action_timestamps > now - window_seconds
+    user_ids = context.action_user_ids[recent]
+    if not len(user_ids):
+        return result
+    types = context.action_types[recent]
+    timestamps = context.action_timestamps[recent]
+
+    unique_users, group, counts = np.unique(user_ids, return_inverse=True, return_counts=True)
+    groups = len(unique_users)
+
+    # Pares consecutivos do mesmo usuário (ordem DESC, como no histórico do validate_invite)
+    same_user = user_ids[:-1] == user_ids[1:]
+    deltas = timestamps[1:] - timestamps[:-1]
+    pair_group = group[:-1]
+
+    rapid = same_user & (types[:-1] == 'join') & (types[1:] == 'leave') & (deltas < 300)
+    pairs = np.bincount(pair_group[rapid], minlength=groups)
+
+    interval_count = np.bincount(pair_group[same_user], minlength=groups)
+    interval_sum = np.bincount(pair_group[same_user], weights=deltas[same_user], minlength=groups)
+    interval_sq = np.bincount(pair_group[same_user], weights=deltas[same_user] ** 2, minlength=groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = interval_sum / interval_count
+        variance = np.where(interval_count > 0, interval_sq / interval_count - mean ** 2, np.inf)
+
+    # Alinha as estatísticas por usuário às posições do lote
+    position = np.searchsorted(unique_users, users)
+    position = np.clip(position, 0, groups - 1)
+    found = unique_users[position] == users
+
+    result["actions"][found] = counts[position[found]]
+    result["join_leave_pairs"][found] = pairs[position[found]]
+    result["intervals"][found] = interval_count[position[found]]
+    result["variance"][found] = np.maximum(variance[position[found]], 0.0)
+    return result
+
+def _action_stats_at(context: FraudBatchContext, users: np.ndarray, now: np.ndarray,
+                     window_seconds: float = 3600, max_actions: int = 50) -> Dict[str, np.ndarray]:
+    """
+    Como _action_stats, mas cada posição do lote tem o seu próprio instante
+    (reauditoria): janela (now - window, now], até max_actions ações mais recentes
+    """
+    n = len(users)
+    result = {
+        "actions": np.zeros(n, dtype=np.int64),
+        "join_leave_pairs": np.zeros(n, dtype=np.int64),
+        "intervals": np.zeros(n, dtype=np.int64),
+        "variance": np.full(n, np.inf)
+    }
+
+    user_ids = context.action_user_ids
+    if not len(user_ids):
+        return result
+    types = context.action_types
+    timestamps = context.action_timestamps
+
+    # Somas acumuladas sobre pares consecutivos: qualquer trecho de um usuário sai em O(1)
+    deltas = timestamps[1:] - timestamps[:-1]
+    rapid = (user_ids[:-1] == user_ids[1:]) & (types[:-1] == 'join') & (types[1:] == 'leave') & (deltas < 300)
+    rapid_sum = np.concatenate(([0], np.cumsum(rapid)))
+    delta_sum = np.concatenate(([0.0], np.cumsum(deltas)))
+    delta_sq_sum = np.concatenate(([0.0], np.cumsum(deltas ** 2)))
+
+    starts = np.searchsorted(user_ids, users, side='left')
+    ends = np.searchsorted(user_ids, users, side='right')
+    for i in np.flatnonzero(ends > starts):
+        # Ações do usuário estão em ordem DESC de tempo; -ts fica crescente
+        reversed_ts = -timestamps[starts[i]:ends[i]]
+        first = starts[i] + np.searchsorted(reversed_ts, -now[i], side='left')
+        last = starts[i] + np.searchsorted(reversed_ts, -(now[i] - window_seconds), side='left')
+        last = min(last, first + max_actions)
+        count = last - first
+        if count <= 0:
+            continue
+
+        result["actions"][i] = count
+        if count > 1:
+            intervals = count - 1
+            mean = (delta_sum[last - 1] - delta_sum[first]) / intervals
+            result["join_leave_pairs"][i] = rapid_sum[last - 1] - rapid_sum[first]
+            result["intervals"][i] = intervals
+            result["variance"][i] = max((delta_sq_sum[last - 1] - delta_sq_sum[first]) / intervals - mean ** 2, 0.0)
+    return result
+
+def score_invites_batch(invites: Sequence[InviteTuple], context: FraudBatchContext, config: Dict[str, Any],
+                        burst_check: Optional[Callable[[int, int], Dict[str, int]]] = None,
+                        bot_check: Optional[Callable[[int], Optional[FraudDetectionResult]]] = None,
+                        now: Optional[float] = None) -> List[FraudDetectionResult]:
+    """
+    Resultado por convite, na ordem de entrada.
+
+    As verificações do banco e do histórico são calculadas como máscaras sobre
+    o lote inteiro e combinadas por prioridade; burst_check e bot_check cobrem
+    as verificações em memória (rajadas e metadados do usuário).
+    Um mesmo par (convidado, convidador) repetido no lote vale só na primeira vez.
+
+    Em reauditoria (context.audit_joins) cada convite é avaliado no instante da
+    própria entrada, sem contar a própria linha como convite repetido.
+    """
+    if not invites:
+        return []
+
+    now = time.time() if now is None else now
+    invited = np.fromiter((invite[0] for invite in invites), dtype=np.int64, count=len(invites))
+    inviters = np.fromiter((invite[1] for invite in invites), dtype=np.int64, count=len(invites))
+
+    duplicate = np.fromiter(((int(a), int(b)) in context.existing for a, b in zip(invited, inviters)),
+                            dtype=bool, count=len(invites))
+    _, first_index = np.unique(np.stack([invited, inviters], axis=1), axis=0, return_index=True)
+    duplicate_in_batch = np.ones(len(invites), dtype=bool)
+    duplicate_in_batch[first_index] = False
+
+    blacklisted = np.fromiter((int(u) in context.blacklisted for u in invited), dtype=bool, count=len(invites))
+
+    if context.is_audit:
+        joins = [context.audit_joins.get((int(a), int(b)), (now, 0)) for a, b in zip(invited, inviters)]
+        join_times = np.fromiter((join[0] for join in joins), dtype=np.float64, count=len(invites))
+        recent_invites = np.fromiter((join[1] for join in joins), dtype=np.int64, count=len(invites))
+        stats = _action_stats_at(context, invited, join_times)
+    else:
+        recent_invites = np.fromiter((context.recent_invites.get(int(u), 0) for u in invited),
+                                     dtype=np.int64, count=len(invites))
+        stats = _action_stats(context, invited, now)
+
+    codes = np.select(
+        [
+            duplicate,
+            duplicate_in_batch,
+            recent_invites >= 5,
+            blacklisted,
+            stats["join_leave_pairs"] >= 2,
+            stats["actions"] >= config['suspicious_join_threshold'],
+            (stats["actions"] >= 3) & (stats["intervals"] >= 2) & (stats["variance"] < 25)
+        ],
+        [DUPLICATE, DUPLICATE_IN_BATCH, SUSPICIOUS_PATTERN, BLACKLISTED,
+         RAPID_JOIN_LEAVE, HIGH_FREQUENCY, ARTIFICIAL_TIMING],
+        default=VALID
+    )
+
+    results = []
+    for i, (invited_user_id, inviter_user_id, invite_link_id) in enumerate(invites):
+        code = int(codes[i])
+        result = None
+
+        if code == DUPLICATE:
+            existing = context.existing[(invited_user_id, inviter_user_id)]
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason=f"Usuário já foi convidado anteriormente (tentativa #{existing['join_count'] + 1})",
+                confidence=1.0,
+                metadata={
+                    'existing_id': existing['id'],
+                    'previous_joins': existing['join_count'],
+                    'previous_leaves': existing['leave_count'],
+                    'fraud_flags': existing.get('fraud_flags')
+                }
+            )
+        elif code == DUPLICATE_IN_BATCH:
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason="Usuário já convidado por este convidador no mesmo lote",
+                confidence=1.0,
+                metadata={'duplicate_in_batch': True}
+            )
+        elif code == SUSPICIOUS_PATTERN:
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason=f"Padrão suspeito: {recent_invites[i]} convites em 1 hora",
+                confidence=0.9,
+                metadata={'recent_invites': int(recent_invites[i])}
+            )
+        elif code == BLACKLISTED:
+            entry = context.blacklisted[invited_user_id]
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason=f"Usuário na blacklist: {entry.get('blacklist_reason')}",
+                confidence=1.0,
+                metadata={'fraud_score': float(entry.get('fraud_score') or 0)}
+            )
+        elif code == RAPID_JOIN_LEAVE:
+            pairs = int(stats["join_leave_pairs"][i])
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason=f"Padrão de entrada/saída rápida detectado: {pairs} ciclos",
+                confidence=0.95,
+                metadata={'join_leave_pairs': pairs}
+            )
+        elif code == HIGH_FREQUENCY:
+            actions = int(stats["actions"][i])
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason=f"Frequência suspeita: {actions} ações em 1 hora",
+                confidence=0.9,
+                metadata={'recent_actions_count': actions}
+            )
+        elif code == ARTIFICIAL_TIMING:
+            result = FraudDetectionResult(
+                is_valid=False,
+                reason="Timing artificial detectado (possível bot)",
+                confidence=0.85,
+                metadata={'timing_variance': float(stats["variance"][i])}
+            )
+        else:
+            # Verificações em memória, só para quem passou nas de banco/histórico
+            bursting = burst_check(inviter_user_id, invite_link_id) if burst_check else {}
+            if bursting:
+                result = FraudDetectionResult(
+                    is_valid=False,
+                    reason=f"Ataque coordenado detectado: rajada de entradas {bursting}",
+                    confidence=0.9,
+                    metadata={'burst_counts': bursting}
+                )
+            elif bot_check:
+                result = bot_check(invited_user_id)
+
+        results.append(result or FraudDetectionResult(
+            is_valid=True,
+            reason="Convite válido - todas as verificações passaram",
+            confidence=1.0,
+            metadata={}
+        ))
+
+    return results
@@ -5,13 +5,21 @@ Previne entrada/saída repetida para burlar contagem de convites
 """
 import asyncio
 import logging
+import time
+from collections import deque
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
 import json
 import hashlib
+from src.config.settings import settings
 from src.database.postgresql_optimized import postgresql_optimized, FraudDetectionResult
+from src.bot.services.profile_store import ProfileStore, UserBehaviorProfile
+from src.bot.services.burst_detector import burst_detector
+from src.bot.services.fraud_batch import FraudBatchContext, InviteTuple, score_invites_batch
+from src.bot.services.bot_scoring import BOT_USERNAME_KEYWORDS, SEQUENTIAL_USERNAME_PATTERN
 
 logger = logging.getLogger(__name__)
 
@@ -34,17 +42,6 @@ class FraudAlert:
     timestamp: TIMESTAMP WITH TIME ZONE
     action_taken: str
 
-@dataclass
-class UserBehaviorProfile:
-    """Perfil de comportamento do usuário"""
-    user_id: int
-    join_frequency: float  # Joins por hora
-    leave_frequency: float  # Leaves por hora
-    invite_pattern_score: float  # Score do padrão de convites
-    time_between_actions: List[float]  # Tempo entre ações em segundos
-    suspicious_indicators: List[str]
-    risk_score: float
-
 class FraudDetectionService:
     """
     Serviço avançado de detecção de fraude
@@ -69,11 +66,15 @@ class FraudDetectionService:
             ]
         }
         
-        # Cache de perfis de usuário
-        self.user_profiles: Dict[int, UserBehaviorProfile] = {}
+        # Perfis de usuário (limitados em memória; o excedente vai para o banco)
+        self.user_profiles = ProfileStore(
+            loader=self.db.load_behavior_profile,
+            saver=self.db.save_behavior_profiles
+        )
+        self._profile_task: Optional[asyncio.Task] = None
         
-        # Alertas ativos
-        self.active_alerts: List[FraudAlert] = []
+        # Alertas ativos (apenas os mais recentes)
+        self.active_alerts: Deque[FraudAlert] = deque(maxlen=settings.FRAUD_MAX_ALERTS)
     
     async def validate_invite(self, invited_user_id: int, inviter_user_id: int, 
                             competition_id: int, invite_link_id: int, 
@@ -108,9 +109,9 @@ class FraudDetectionService:
             if not behavior_result.is_valid:
                 return behavior_result
             
-            # 3. DETECÇÃO DE PADRÕES COORDENADOS
-            coordinated_result = await self._detect_coordinated_attack(
-                invited_user_id, inviter_user_id, competition_id
+            # 3. DETECÇÃO DE PADRÕES COORDENADOS (janelas em memória do pipeline de entrada)
+            coordinated_result = await self._check_burst(
+                invited_user_id, inviter_user_id, invite_link_id
             )
             
             if not coordinated_result.is_valid:
@@ -213,9 +214,114 @@ class FraudDetectionService:
             logger.error(f"Erro na análise de comportamento: {e}")
             return FraudDetectionResult(is_valid=True, reason="Erro na análise", confidence=0.5, metadata={})
     
+    def _coordinated_burst(self, inviter_user_id: int, invite_link_id: int) -> Dict[str, int]:
+        """Janelas do convidador/link acima do limite"""
+        bursting = burst_detector.is_bursting(inviter_user_id, invite_link_id)
+        # A janela global sozinha indica movimento alto no grupo, não coordenação do convidador
+        bursting.pop('global', None)
+        return bursting
+    
+    async def _check_burst(self, invited_user_id: int, inviter_user_id: int,
+                           invite_link_id: int) -> FraudDetectionResult:
+        """Detecta ataques coordenados pelas janelas deslizantes do burst_detector (sem consulta)"""
+        bursting = self._coordinated_burst(inviter_user_id, invite_link_id)
+        if not bursting:
+            return FraudDetectionResult(is_valid=True, reason="Sem coordenação detectada", confidence=1.0, metadata={})
+        
+        await self._create_fraud_alert(
+            invited_user_id,
+            FraudType.COORDINATED_ATTACK,
+            0.9,
+            {'burst_counts': bursting, 'window_seconds': burst_detector.window},
+            "Possível ataque coordenado detectado"
+        )
+        
+        return FraudDetectionResult(
+            is_valid=False,
+            reason=f"Ataque coordenado detectado: rajada de entradas {bursting}",
+            confidence=0.9,
+            metadata={'burst_counts': bursting}
+        )
+    
+    async def validate_invites_batch(self, invites: List[InviteTuple], competition_id: int,
+                                     metadata: Optional[Dict[int, Dict[str, Any]]] = None,
+                                     record: bool = False, audit: bool = False,
+                                     until: Optional[datetime] = None) -> List[FraudDetectionResult]:
+        """
+        Valida um lote de convites (invited, inviter, invite_link_id) - backlog após
+        indisponibilidade ou reauditoria de competição. Mesmas regras do validate_invite,
+        com o histórico de todos os convidados carregado em poucas consultas por bloco.
+        Com record=True também atualiza perfis e alertas como o caminho unitário.
+        
+        audit=True reaudita convites já gravados: cada um é avaliado no instante da
+        própria entrada (até `until`), a própria linha não conta como duplicata e as
+        rajadas em memória (que refletem o momento atual) não são consultadas.
+        Com record=True, a reauditoria só gera alertas; os perfis não são alterados.
+        """
+        if not invites:
+            return []
+        
+        metadata = metadata or {}
+        started = time.monotonic()
+        invited_ids = list(dict.fromkeys(invite[0] for invite in invites))
+        chunk_size = settings.FRAUD_BATCH_CHUNK_SIZE
+        
+        try:
+            rows = {'existing': [], 'recent_invites': [], 'blacklisted': [], 'actions': [], 'audit_joins': []}
+            for start in range(0, len(invited_ids), chunk_size):
+                chunk_ids = invited_ids[start:start + chunk_size]
+                if audit:
+                    chunk_rows = await self.db.prefetch_fraud_audit_context(chunk_ids, competition_id, until=until)
+                else:
+                    chunk_rows = await self.db.prefetch_fraud_context(chunk_ids, competition_id)
+                for key, values in chunk_rows.items():
+                    rows[key].extend(values)
+            context = FraudBatchContext.from_rows(**rows)
+        except Exception as e:
+            logger.error(f"❌ Erro ao pré-carregar lote de validação: {e}")
+            return [
+                FraudDetectionResult(
+                    is_valid=True,
+                    reason="Erro na validação - convite permitido por segurança",
+                    confidence=0.5,
+                    metadata={'error': str(e)}
+                )
+                for _ in invites
+            ]
+        
+        def bot_check(invited_user_id: int) -> Optional[FraudDetectionResult]:
+            user_metadata = metadata.get(invited_user_id)
+            if not user_metadata:
+                return None
+            result = self._score_bot_behavior(user_metadata)
+            return None if result.is_valid else result
+        
+        results = score_invites_batch(invites, context, self.config,
+                                      burst_check=None if audit else self._coordinated_burst,
+                                      bot_check=bot_check,
+                                      now=until.timestamp() if until else None)
+        
+        if record:
+            for (invited_user_id, _, _), result in zip(invites, results):
+                if result.is_valid:
+                    if audit:
+                        continue
+                    await self._update_user_profile(invited_user_id, 'valid_invite', metadata.get(invited_user_id, {}))
+                elif 'existing_id' in result.metadata or 'duplicate_in_batch' in result.metadata:
+                    await self._create_fraud_alert(invited_user_id, FraudType.DUPLICATE_INVITE, result.confidence,
+                                                   result.metadata, "Convite bloqueado - usuário já convidado")
+                elif 'burst_counts' in result.metadata:
+                    await self._create_fraud_alert(invited_user_id, FraudType.COORDINATED_ATTACK, result.confidence,
+                                                   result.metadata, "Possível ataque coordenado detectado")
+        
+        invalid = sum(1 for result in results if not result.is_valid)
+        logger.info(f"✅ Lote de {len(invites)} convites validado em {time.monotonic() - started:.2f}s "
+                    f"({invalid} bloqueados)")
+        return results
+    
     async def _detect_coordinated_attack(self, invited_user_id: int, inviter_user_id: int, 
                                        competition_id: int) -> FraudDetectionResult:
-        """Detecta ataques coordenados (múltiplos usuários com padrão similar)"""
+        """Detecta ataques coordenados (múltiplos usuários com padrão similar) - auditoria offline via SQL"""
         try:
             # Buscar usuários com padrão similar nas últimas 2 horas
             similar_users_global_global = await self._find_users_global_global_with_similar_pattern(invited_user_id, competition_id)
@@ -244,6 +350,10 @@ class FraudDetectionService:
     
     async def _detect_bot_behavior(self, user_id: int, metadata: Dict[str, Any]) -> FraudDetectionResult:
         """Detecta comportamento de bot"""
+        return self._score_bot_behavior(metadata)
+    
+    def _score_bot_behavior(self, metadata: Dict[str, Any]) -> FraudDetectionResult:
+        """Indicadores de bot a partir dos metadados do usuário (sem consultas)"""
         try:
             bot_indicators = []
             confidence = 0.0
@@ -311,13 +421,11 @@ class FraudDetectionService:
     def _is_sequential_username(self, username: str) -> bool:
         """Verifica se username é sequencial (user1, user2, etc.)"""
         import re
-        pattern = r'^[a-zA-Z]+\d+$'
-        return bool(re.match(pattern, username))
+        return bool(re.fullmatch(SEQUENTIAL_USERNAME_PATTERN, username))
     
     def _is_bot_like_username(self, username: str) -> bool:
         """Verifica se username parece de bot"""
-        bot_keywords = ['bot', 'auto', 'test', 'fake', 'spam', 'temp']
-        return any(keyword in username.lower() for keyword in bot_keywords)
+        return any(keyword in username.lower() for keyword in BOT_USERNAME_KEYWORDS)
     
     async def _get_user_recent_history(self, user_id: int, hours: int = 24) -> List[Dict]:
         """Busca histórico recente do usuário"""
@@ -382,33 +490,51 @@ class FraudDetectionService:
     async def _update_user_profile(self, user_id: int, action: str, metadata: Dict[str, Any]):
         """Atualiza perfil comportamental do usuário"""
         try:
-            if user_id not in self.user_profiles:
-                self.user_profiles[user_id] = UserBehaviorProfile(
-                    user_id=user_id,
-                    join_frequency=0.0,
-                    leave_frequency=0.0,
-                    invite_pattern_score=0.0,
-                    time_between_actions=[],
-                    suspicious_indicators=[],
-                    risk_score=0.0
-                )
-            
-            profile = self.user_profiles[user_id]
+            profile = await self.user_profiles.get(user_id)
             
             # Atualizar baseado na ação
             if action == 'valid_invite':
                 profile.invite_pattern_score += 0.1
             elif action == 'suspicious_activity':
                 profile.risk_score += 0.2
-                profile.suspicious_indicators.append(f"suspicious_{TIMESTAMP WITH TIME ZONE.now().isoformat()}")
+                profile.add_indicator(f"suspicious_{TIMESTAMP WITH TIME ZONE.now().isoformat()}")
             
-            # Manter apenas últimas 10 ações
-            if len(profile.time_between_actions) > 10:
-                profile.time_between_actions = profile.time_between_actions[-10:]
+            # Perfis expirados/excedentes vão para o banco pela tarefa periódica
+            self.start_profile_maintenance()
             
         except Exception as e:
             logger.error(f"Erro ao atualizar perfil: {e}")
     
+    def start_profile_maintenance(self) -> asyncio.Task:
+        """Inicia (uma vez) a tarefa periódica dos perfis comportamentais"""
+        if self._profile_task is None or self._profile_task.done():
+            self._profile_task = asyncio.create_task(self._profile_maintenance_task())
+        return self._profile_task
+    
+    async def stop_profile_maintenance(self):
+        """Para a tarefa periódica e grava o que estiver pendente"""
+        if self._profile_task is not None:
+            self._profile_task.cancel()
+            try:
+                await self._profile_task
+            except asyncio.CancelledError:
+                pass
+            self._profile_task = None
+        await self.user_profiles.flush()
+    
+    async def _profile_maintenance_task(self):
+        """Monta o índice dos perfis gravados e, a cada intervalo, grava os que saíram da memória"""
+        while True:
+            try:
+                if self.user_profiles.index is None:
+                    await self.user_profiles.load_index(self.db.load_behavior_profile_ids)
+                await asyncio.sleep(settings.FRAUD_PROFILE_FLUSH_INTERVAL)
+                await self.user_profiles.maintain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro na manutenção dos perfis: {e}")
+    
     async def _create_fraud_alert(self, user_id: int, fraud_type: FraudType, 
                                 confidence: float, details: Dict[str, Any], action_taken: str):
         """Cria alerta de fraude"""
@@ -424,10 +550,6 @@ class FraudDetectionService:
             
             self.active_alerts.append(alert)
             
-            # Manter apenas últimos 100 alertas
-            if len(self.active_alerts) > 100:
-                self.active_alerts = self.active_alerts[-100:]
-            
             # Log do alerta
             logger.warning(f"🚨 ALERTA DE FRAUDE: {fraud_type.value} - Usuário {user_id} - Confiança: {confidence:.2f}")
             
@@ -529,6 +651,14 @@ class FraudDetectionService:
         """Busca alertas recentes"""
         recent_alerts = sorted(self.active_alerts, key=lambda x: x.timestamp, reverse=True)[:limit]
         return [asdict(alert) for alert in recent_alerts]
+    
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """Uso de memória dos perfis e alertas"""
+        return {
+            'profiles': self.user_profiles.get_stats(),
+            'active_alerts': len(self.active_alerts),
+            'max_alerts': self.active_alerts.maxlen
+        }
 
 # Instância global
 fraud_detection_service = FraudDetectionService()
@@ -0,0 +1,225 @@
+"""
+Escritor em Lote de Créditos de Convite
+Acumula incrementos por (competition_id, user_id, invite_link) e grava em lote
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class InviteCreditWriter:
+    """
+    Write-behind para os contadores de convite.
+
+    Cada crédito retorna um Future que só é resolvido depois que o lote que o
+    contém foi confirmado (commit) no banco: True se durável, False se falhou.
+    O lote é gravado a cada FLUSH_INTERVAL ms ou ao atingir MAX_BATCH_EVENTS;
+    um lote que falha volta para a fila e só é descartado após MAX_RETRIES tentativas.
+    """
+
+    def __init__(self, db_manager, flush_interval_ms: int = None, max_batch_events: int = None,
+                 max_retries: int = None):
+        self.db = db_manager
+        # Gerenciador assíncrono grava direto no event loop; o síncrono usa a thread dedicada
+        self.db_is_async = asyncio.iscoroutinefunction(db_manager.apply_invite_credits_batch)
+        self.flush_interval = (flush_interval_ms or settings.INVITE_CREDIT_FLUSH_INTERVAL_MS) / 1000
+        self.max_batch_events = max_batch_events or settings.INVITE_CREDIT_MAX_BATCH_EVENTS
+        self.max_retries = max_retries or settings.INVITE_CREDIT_MAX_RETRIES
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.pending: Dict[Tuple[int, int, str], int] = defaultdict(int)
+        self.waiters: Dict[Tuple[int, int, str], List[asyncio.Future]] = defaultdict(list)
+        self.attempts: Dict[Tuple[int, int, str], int] = {}
+        self.waiting = 0
+        self.consecutive_failures = 0
+        self.flush_requested: Optional[asyncio.Event] = None
+        self.flush_lock: Optional[asyncio.Lock] = None
+        self.flush_task: Optional[asyncio.Task] = None
+        self.running = False
+
+        # Métricas
+        self.metrics = {
+            "credits_received": 0,
+            "batches_flushed": 0,
+            "batches_failed": 0,
+            "credits_requeued": 0,
+            "credits_dropped": 0,
+            "rows_written": 0,
+            "credits_written": 0,
+            "total_flush_ms": 0.0,
+            "max_flush_ms": 0.0
+        }
+
+    async def start(self):
+        """Inicia o loop de flush periódico"""
+        if self.running:
+            return
+
+        self.flush_requested = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.running = True
+        self.flush_task = asyncio.create_task(self._flush_loop())
+
+        logger.info(f"✅ Escritor de créditos iniciado: flush a cada {self.flush_interval * 1000:.0f}ms ou {self.max_batch_events} eventos")
+
+    async def stop(self):
+        """Para o loop e grava os créditos pendentes"""
+        if not self.running:
+            return
+
+        self.running = False
+        self.flush_requested.set()
+        await asyncio.gather(self.flush_task, return_exceptions=True)
+        await self.flush()
+
+        # O que voltou para a fila na última tentativa não será mais gravado
+        dropped = self._take_pending()[1]
+        for futures in dropped.values():
+            for future in futures:
+                if not future.done():
+                    future.set_result(False)
+        if dropped:
+            logger.error(f"❌ {sum(len(f) for f in dropped.values())} créditos não gravados ao parar o escritor")
+        self.executor.shutdown(wait=False)
+
+        logger.info("✅ Escritor de créditos parado")
+
+    def add_credit(self, competition_id: int, user_id: int, invite_link: str, delta: int = 1) -> asyncio.Future:
+        """
+        Acumula um crédito de convite.
+        Retorna um Future resolvido com True quando o crédito estiver gravado.
+        """
+        future = asyncio.get_event_loop().create_future()
+
+        if not self.running:
+            logger.error(f"Escritor de créditos parado - crédito descartado para usuário {user_id}")
+            future.set_result(False)
+            return future
+
+        if competition_id is None:
+            logger.error(f"Crédito sem competição recusado para usuário {user_id}")
+            future.set_result(False)
+            return future
+
+        key = (competition_id, user_id, invite_link)
+        self.pending[key] += delta
+        self.waiters[key].append(future)
+        self.waiting += 1
+        self.metrics["credits_received"] += 1
+
+        if self.waiting >= self.max_batch_events and not self.consecutive_failures:
+            self.flush_requested.set()
+
+        return future
+
+    def _take_pending(self):
+        pending, self.pending = self.pending, defaultdict(int)
+        waiters, self.waiters = self.waiters, defaultdict(list)
+        self.waiting = 0
+        return pending, waiters
+
+    async def _flush_loop(self):
+        while self.running:
+            # Após falhas, espera em backoff exponencial antes de tentar de novo
+            interval = self.flush_interval * min(2 ** self.consecutive_failures, 32)
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.flush_requested.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erro no loop de flush de créditos: {e}")
+
+    async def flush(self) -> int:
+        """
+        Grava o lote pendente em uma única transação; retorna o número de créditos.
+        Se a gravação falhar, os créditos voltam para a fila com os Futures pendentes.
+        """
+        async with self.flush_lock:
+            if not self.waiting:
+                return 0
+
+            pending, waiters = self._take_pending()
+            count = sum(len(futures) for futures in waiters.values())
+            credits = [
+                (competition_id, user_id, invite_link, delta)
+                for (competition_id, user_id, invite_link), delta in pending.items()
+            ]
+
+            started = time.monotonic()
+            try:
+                if self.db_is_async:
+                    success = await self.db.apply_invite_credits_batch(credits)
+                else:
+                    success = await asyncio.get_event_loop().run_in_executor(
+                        self.executor, self.db.apply_invite_credits_batch, credits
+                    )
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote de créditos: {e}")
+                success = False
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.metrics["total_flush_ms"] += elapsed_ms
+            self.metrics["max_flush_ms"] = max(self.metrics["max_flush_ms"], elapsed_ms)
+
+            if success:
+                self.consecutive_failures = 0
+                self.metrics["batches_flushed"] += 1
+                self.metrics["rows_written"] += len(credits)
+                self.metrics["credits_written"] += count
+                logger.debug(f"Lote de créditos gravado: {count} convites em {len(credits)} linhas ({elapsed_ms:.1f}ms)")
+                for key, futures in waiters.items():
+                    self.attempts.pop(key, None)
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(True)
+                return count
+
+            self.consecutive_failures += 1
+            self.metrics["batches_failed"] += 1
+            requeued = dropped = 0
+            for key, delta in pending.items():
+                attempts = self.attempts.get(key, 0) + 1
+                if attempts < self.max_retries:
+                    # Falha transitória: volta para a fila e entra no próximo lote
+                    self.attempts[key] = attempts
+                    self.pending[key] += delta
+                    self.waiters[key] = waiters[key] + self.waiters.get(key, [])
+                    self.waiting += len(waiters[key])
+                    requeued += len(waiters[key])
+                else:
+                    self.attempts.pop(key, None)
+                    dropped += len(waiters[key])
+                    for future in waiters[key]:
+                        if not future.done():
+                            future.set_result(False)
+
+            self.metrics["credits_requeued"] += requeued
+            self.metrics["credits_dropped"] += dropped
+            logger.error(f"❌ Falha ao gravar lote de {count} créditos de convite: "
+                         f"{requeued} de volta à fila, {dropped} descartados após {self.max_retries} tentativas")
+
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do escritor em lote"""
+        batches = self.metrics["batches_flushed"] + self.metrics["batches_failed"]
+        return {
+            "running": self.running,
+            "pending_credits": self.waiting,
+            "pending_rows": len(self.pending),
+            **self.metrics,
+            "avg_credits_per_batch": round(self.metrics["credits_written"] / self.metrics["batches_flushed"], 2)
+                if self.metrics["batches_flushed"] else 0.0,
+            "avg_flush_ms": round(self.metrics["total_flush_ms"] / batches, 2) if batches else 0.0
+        }
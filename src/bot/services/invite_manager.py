@@ -10,15 +10,20 @@ from telegram.error import TelegramError
 
 from src.config.settings import settings
 from src.database.models import DatabaseManager, InviteLink
+from src.bot.services.link_registry import LinkInfo, link_registry
+from src.bot.services.link_revocation import ExpiredLinkRevoker
+from src.bot.services.message_scheduler import MessageScheduler
 import logging
 
 logger = logging.getLogger(__name__)
 
 class InviteManager:
-    def __init__(self, db_manager: DatabaseManager, bot: Bot):
+    def __init__(self, db_manager: DatabaseManager, bot: Bot, scheduler: MessageScheduler, async_db=None):
         self.db = db_manager
+        self.async_db = async_db  # AsyncPostgreSQLManager opcional para gravar sem bloquear o loop
         self.bot = bot
         self.chat_id = settings.CHAT_ID
+        self.link_revoker = ExpiredLinkRevoker(db_manager, bot, self.chat_id, scheduler)
         
     async def create_invite_link(self, user_id: int, name: str = None, 
                                max_uses: int = None, expire_days: int = None,
@@ -45,7 +50,7 @@ class InviteManager:
             )
             
             # Salvar no banco de dados
-            invite_link = self.db.create_invite_link(
+            link_fields = dict(
                 user_id=user_id,
                 invite_link=telegram_link.invite_link,
                 name=name,
@@ -53,6 +58,13 @@ class InviteManager:
                 expire_date=expire_date,
                 competition_id=competition_id
             )
+            if self.async_db:
+                invite_link = await self.async_db.create_invite_link(**link_fields)
+            else:
+                invite_link = self.db.create_invite_link(**link_fields)
+            link_registry.register(
+                telegram_link.invite_link, invite_link.id, user_id, competition_id, max_uses=max_uses
+            )
             
             logger.info(f"Link de convite criado: {telegram_link.invite_link} para usuário {user_id}")
             return invite_link
@@ -84,6 +96,7 @@ class InviteManager:
                 success = cursor.rowcount > 0
             
             if success:
+                link_registry.deactivate(invite_link)
                 logger.info(f"Link de convite revogado: {invite_link}")
             
             return success
@@ -95,39 +108,17 @@ class InviteManager:
             logger.error(f"Erro ao revogar link: {e}")
             return False
     
-    async def update_invite_link_usage(self, invite_link: str) -> bool:
-        """Atualiza o uso de um link de convite"""
+    async def update_invite_link_usage(self, invite_link: str, new_member_count: int = 1) -> bool:
+        """
+        Soma ao link os membros que entraram. A contagem vem do próprio
+        ChatMemberUpdated; nenhuma chamada à API do Telegram por entrada.
+        """
         try:
-            # Buscar informações atualizadas do Telegram
-            telegram_link = await self.bot.get_chat(self.chat_id)
-            
-            # Buscar link no banco
-            with self.db.get_connection() as conn:
-                link_data = session.execute(text(text("""
-                    SELECT * FROM invite_links_global_global_global WHERE invite_link = ? AND is_active = 1
-                """, (invite_link,)).fetchone()
-                
-                if not link_data:
-                    return False
-                
-                # Simular atualização de uso (em produção, isso seria feito via webhook)
-                new_uses = link_data['uses'] + 1
-                
-                # Atualizar no banco
-                session.execute(text(text("""
-                    UPDATE invite_links_global_global_global 
-                    SET uses = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE invite_link = ?
-                """, (new_uses, invite_link))
-                
-                # Atualizar total do usuário
-                session.execute(text(text("""
-                    UPDATE users_global_global_global 
-                    SET total_invites = total_invites + 1, updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = ?
-                """, (link_data['user_id'],))
-                
-                conn.commit()
+            new_uses = await asyncio.get_running_loop().run_in_executor(
+                None, self.db.increment_invite_link_uses, invite_link, new_member_count
+            )
+            if new_uses is None:
+                return False
             
             logger.info(f"Uso do link atualizado: {invite_link} -> {new_uses} usos")
             return True
@@ -136,6 +127,20 @@ class InviteManager:
             logger.error(f"Erro ao atualizar uso do link: {e}")
             return False
     
+    async def reconcile_link_usage(self) -> int:
+        """Confere em lote o uso dos links com os membros rastreados; retorna links corrigidos"""
+        try:
+            corrected = await asyncio.get_running_loop().run_in_executor(
+                None, self.db.reconcile_invite_link_uses
+            )
+            if corrected:
+                logger.info(f"🔄 Uso de {corrected} links corrigido pela reconciliação")
+            return corrected or 0
+            
+        except Exception as e:
+            logger.error(f"Erro na reconciliação de uso dos links: {e}")
+            return 0
+    
     def get_user_links(self, user_id: int, active_only: bool = True) -> List[Dict[str, Any]]:
         """Busca links de um usuário"""
         try:
@@ -155,6 +160,10 @@ class InviteManager:
             logger.error(f"Erro ao buscar links do usuário {user_id}: {e}")
             return []
     
+    def resolve_link(self, invite_link: str) -> Optional[LinkInfo]:
+        """Dono e competição do link pelo registro em memória (banco só no primeiro acesso)"""
+        return link_registry.resolve(invite_link, self.db.get_invite_link_by_url)
+    
     def get_link_stats(self, invite_link: str) -> Optional[Dict[str, Any]]:
         """Busca estatísticas de um link específico"""
         try:
@@ -173,46 +182,9 @@ class InviteManager:
             return None
     
     async def cleanup_expired_links(self) -> int:
-        """Remove links expirados"""
+        """Revoga e desativa links expirados (em paralelo, respeitando o rate limit)"""
         try:
-            now = TIMESTAMP WITH TIME ZONE.now()
-            count = 0
-            
-            with self.db.get_connection() as conn:
-                # Buscar links expirados
-                expired_links = session.execute(text(text("""
-                    SELECT invite_link FROM invite_links_global_global_global 
-                    WHERE expire_date < ? AND is_active = 1
-                """, (now,)).fetchall()
-                
-                for link_row in expired_links:
-                    invite_link = link_row['invite_link']
-                    
-                    # Revogar no Telegram
-                    try:
-                        await self.bot.revoke_chat_invite_link(
-                            chat_id=self.chat_id,
-                            invite_link=invite_link
-                        )
-                    except TelegramError:
-                        pass  # Link pode já estar inválido
-                    
-                    count += 1
-                
-                # Marcar como inativos no banco
-                if expired_links:
-                    session.execute(text(text("""
-                        UPDATE invite_links_global_global_global 
-                        SET is_active = 0, updated_at = CURRENT_TIMESTAMP
-                        WHERE expire_date < ? AND is_active = 1
-                    """, (now,))
-                    conn.commit()
-            
-            if count > 0:
-                logger.info(f"Links expirados removidos: {count}")
-            
-            return count
-            
+            return await self.link_revoker.run()
         except Exception as e:
             logger.error(f"Erro ao limpar links expirados: {e}")
             return 0
@@ -0,0 +1,394 @@
+"""
+Pipeline Assíncrono de Entrada de Membros
+Desacopla o handler de ChatMember do processamento pesado de cada convite
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config.settings import settings
+from src.bot.services.link_registry import link_registry
+from src.bot.services.api_call_meter import api_call_meter
+from src.bot.services.burst_detector import burst_detector
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class JoinEvent:
+    """Evento compacto de entrada de membro via link de convite"""
+    invite_link: str
+    member_id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    member_count: int = 1  # membros que entraram neste ChatMemberUpdated
+    received_at: float = field(default_factory=time.monotonic)
+    inviter_id: Optional[int] = None
+    link_stats: Optional[Dict[str, Any]] = None
+    competition: Optional[Any] = None
+    credit: Optional[asyncio.Future] = None
+
+class JoinEventPipeline:
+    """
+    Pipeline em estágios para eventos de entrada:
+    resolve -> validate -> write -> notify
+
+    - Filas limitadas em todos os estágios (backpressure até o handler)
+    - Estágio de escrita particionado por inviter_id: eventos do mesmo
+      convidador são processados em ordem por um único worker
+    - Chamadas síncronas ao banco rodam em thread pool para não bloquear o loop
+    - Com InviteCreditWriter, os créditos são gravados em lote e o evento só é
+      confirmado no estágio de notificação, depois do commit do lote
+    - Chamadas à API do Telegram feitas pelos estágios são contadas no
+      escopo "join" (meta: zero por entrada)
+    """
+
+    API_SCOPE = "join"
+
+    STAGES = ('resolve', 'validate', 'write', 'notify')
+
+    def __init__(self, db_manager, competition_manager, invite_manager,
+                 tracking_monitor=None, member_tracker=None, ranking_notifier=None,
+                 credit_writer=None, queue_size: int = None, shards: int = None, executor_workers: int = None):
+        self.db = db_manager
+        self.competition_manager = competition_manager
+        self.invite_manager = invite_manager
+        self.tracking_monitor = tracking_monitor
+        self.member_tracker = member_tracker
+        self.ranking_notifier = ranking_notifier
+        self.credit_writer = credit_writer
+
+        self.queue_size = queue_size or settings.JOIN_PIPELINE_QUEUE_SIZE
+        self.shards = shards or settings.JOIN_PIPELINE_SHARDS
+        self.executor = ThreadPoolExecutor(
+            max_workers=executor_workers or settings.JOIN_PIPELINE_EXECUTOR_WORKERS
+        )
+
+        self.ingest_queue: Optional[asyncio.Queue] = None
+        self.shard_queues: List[asyncio.Queue] = []
+        self.notify_queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.running = False
+
+        # Métricas
+        self.metrics = {
+            "events_submitted": 0,
+            "events_rejected": 0,
+            "events_unresolved": 0,
+            "events_completed": 0,
+            "events_failed": 0,
+            "stages": {stage: self._empty_stage_metrics() for stage in self.STAGES},
+            "end_to_end": self._empty_stage_metrics()
+        }
+
+    @staticmethod
+    def _empty_stage_metrics() -> Dict[str, float]:
+        return {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    async def start(self):
+        """Cria as filas e inicia os workers de cada estágio"""
+        if self.running:
+            return
+
+        self.ingest_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.shard_queues = [
+            asyncio.Queue(maxsize=max(1, self.queue_size // self.shards))
+            for _ in range(self.shards)
+        ]
+        self.notify_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.running = True
+
+        # As tarefas herdam o escopo do medidor: toda chamada à API feita pelos workers conta como "join"
+        with api_call_meter.scope(self.API_SCOPE):
+            # Resolução em um único worker preserva a ordem de chegada até o particionamento
+            self.workers.append(asyncio.create_task(self._resolve_worker()))
+            for shard in range(self.shards):
+                self.workers.append(asyncio.create_task(self._shard_worker(shard)))
+            self.workers.append(asyncio.create_task(self._notify_worker()))
+
+        logger.info(f"✅ Pipeline de entrada iniciado: {self.shards} partições, fila de {self.queue_size}")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Para os workers, drenando as filas até o timeout"""
+        if not self.running:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Pipeline parado com eventos pendentes: {self._queue_depths()}")
+
+        self.running = False
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.executor.shutdown(wait=False)
+
+        logger.info("✅ Pipeline de entrada parado")
+
+    async def _drain(self):
+        await self.ingest_queue.join()
+        for queue in self.shard_queues:
+            await queue.join()
+        await self.notify_queue.join()
+
+    async def submit(self, event: JoinEvent, timeout: float = None) -> bool:
+        """
+        Enfileira um evento de entrada.
+        Aguarda espaço na fila (backpressure); retorna False se o timeout expirar.
+        """
+        if not self.running:
+            logger.error("Pipeline de entrada não está rodando - evento descartado")
+            self.metrics["events_rejected"] += 1
+            return False
+
+        if timeout is None:
+            timeout = settings.JOIN_PIPELINE_SUBMIT_TIMEOUT
+
+        try:
+            await asyncio.wait_for(self.ingest_queue.put(event), timeout=timeout)
+            self.metrics["events_submitted"] += 1
+            return True
+        except asyncio.TimeoutError:
+            self.metrics["events_rejected"] += 1
+            logger.error(f"❌ Fila de entrada cheia - evento rejeitado: membro {event.member_id}")
+            return False
+
+    async def _run_sync(self, func: Callable, *args):
+        """Executa chamada síncrona ao banco em thread pool"""
+        return await asyncio.get_event_loop().run_in_executor(self.executor, func, *args)
+
+    def _record(self, stage: str, started: float, success: bool = True):
+        """Registra latência de um estágio"""
+        elapsed_ms = (time.monotonic() - started) * 1000
+        metrics = self.metrics["stages"][stage] if stage in self.metrics["stages"] else self.metrics[stage]
+        metrics["count"] += 1
+        metrics["total_ms"] += elapsed_ms
+        metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+        if not success:
+            metrics["errors"] += 1
+
+    async def _resolve_worker(self):
+        """Estágio 1: resolve o dono do link e roteia para a partição do convidador"""
+        while self.running:
+            event = await self.ingest_queue.get()
+            started = time.monotonic()
+            try:
+                # Links conhecidos resolvem em memória; só o primeiro acesso vai ao banco
+                link = link_registry.peek(event.invite_link)
+                if link is None:
+                    link = await self._run_sync(self.invite_manager.resolve_link, event.invite_link)
+
+                if not link:
+                    self._record('resolve', started, success=False)
+                    self.metrics["events_unresolved"] += 1
+                    logger.warning(f"Link não encontrado ou inválido: {event.invite_link}")
+                    continue
+
+                event.link_stats = link.to_dict()
+                event.inviter_id = link.owner_id
+
+                # Janelas de rajada atualizadas em memória, sem consulta agregada por entrada
+                burst_detector.record(event.inviter_id, link.link_id, event.member_id, event.member_count)
+                self._record('resolve', started)
+
+                shard = event.inviter_id % self.shards
+                await self.shard_queues[shard].put(event)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record('resolve', started, success=False)
+                self.metrics["events_failed"] += 1
+                logger.error(f"Erro ao resolver link {event.invite_link}: {e}")
+            finally:
+                self.ingest_queue.task_done()
+
+    async def _shard_worker(self, shard: int):
+        """Estágios 2 e 3: valida e grava, em ordem, os eventos de uma partição"""
+        queue = self.shard_queues[shard]
+        while self.running:
+            event = await queue.get()
+            try:
+                await self._validate(event)
+
+                if await self._write(event):
+                    await self.notify_queue.put(event)
+                else:
+                    self.metrics["events_failed"] += 1
+                    self._record('end_to_end', event.received_at, success=False)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["events_failed"] += 1
+                logger.error(f"Erro na partição {shard} para usuário {event.inviter_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _validate(self, event: JoinEvent):
+        """Valida o tracking e corrige participante ausente"""
+        if not self.tracking_monitor:
+            return
+
+        started = time.monotonic()
+        try:
+            user_id = event.inviter_id
+            validation = await self._run_sync(
+                self.tracking_monitor.validate_invite_tracking, user_id, event.invite_link
+            )
+
+            if not all([validation['link_exists'], validation['user_exists'], validation['competition_active']]):
+                logger.warning(f"Validação de tracking falhou para usuário {user_id}: {validation}")
+
+                # Tentar correção automática
+                if not validation['participant_exists'] and validation['competition_active']:
+                    if self.competition_manager.async_db:
+                        active_comp = await self.competition_manager.get_active_competition_async()
+                        if active_comp:
+                            await self.competition_manager.add_participant_async(active_comp.id, user_id)
+                    else:
+                        active_comp = await self._run_sync(self.competition_manager.get_active_competition)
+                        if active_comp:
+                            await self._run_sync(self.competition_manager.add_participant, active_comp.id, user_id)
+
+            self._record('validate', started)
+        except Exception as e:
+            # Validação não bloqueia o registro do convite
+            self._record('validate', started, success=False)
+            logger.error(f"Erro na validação de tracking: {e}")
+
+    async def _write(self, event: JoinEvent) -> bool:
+        """Atualiza uso do link, rastreia o membro e registra o convite"""
+        started = time.monotonic()
+        try:
+            if self.credit_writer:
+                # Crédito acumulado no lote; durabilidade confirmada no estágio de notificação
+                if self.competition_manager.async_db:
+                    event.competition = await self.competition_manager.prepare_invite_credit_async(event.inviter_id)
+                else:
+                    event.competition = await self._run_sync(
+                        self.competition_manager.prepare_invite_credit, event.inviter_id
+                    )
+                if not event.competition:
+                    # Sem competição/participante o crédito não tem onde ser gravado
+                    self._record('write', started, success=False)
+                    logger.error(f"❌ Falha ao registrar convite para usuário {event.inviter_id}: "
+                                 f"competição ou participante não resolvido")
+                    return False
+                event.credit = self.credit_writer.add_credit(
+                    event.competition.id, event.inviter_id, event.invite_link, delta=event.member_count
+                )
+            else:
+                await self.invite_manager.update_invite_link_usage(event.invite_link, event.member_count)
+
+            if self.member_tracker:
+                await self._run_sync(
+                    self.member_tracker.track_invited_user,
+                    event.member_id, event.username, event.first_name,
+                    event.last_name, event.invite_link
+                )
+
+            if self.credit_writer:
+                success = True
+            else:
+                # record_invite agenda tarefas no loop e precisa rodar nele
+                success = self.competition_manager.record_invite(event.inviter_id, event.invite_link)
+
+            self._record('write', started, success=success)
+            if not success:
+                logger.error(f"❌ Falha ao registrar convite para usuário {event.inviter_id}")
+            return success
+
+        except Exception as e:
+            self._record('write', started, success=False)
+            logger.error(f"Erro ao gravar convite do usuário {event.inviter_id}: {e}")
+            return False
+
+    async def _confirm_credit(self, event: JoinEvent) -> bool:
+        """Aguarda o commit do lote que contém o crédito do evento"""
+        if event.credit is None:
+            return True
+
+        if not await event.credit:
+            logger.error(f"❌ Falha ao registrar convite para usuário {event.inviter_id}")
+            return False
+
+        if event.competition:
+            self.competition_manager.on_invite_recorded(event.competition, event.inviter_id)
+        return True
+
+    async def _notify_worker(self):
+        """Estágio 4: notificações de ranking e marcos da competição"""
+        while self.running:
+            event = await self.notify_queue.get()
+            started = time.monotonic()
+            try:
+                if not await self._confirm_credit(event):
+                    self.metrics["events_failed"] += 1
+                    self._record('end_to_end', event.received_at, success=False)
+                    continue
+
+                if self.ranking_notifier:
+                    active_competition = await self._run_sync(self.competition_manager.get_active_competition)
+                    if active_competition:
+                        self.ranking_notifier.mark_dirty(active_competition.id)
+
+                        totals = await self._run_sync(
+                            self.competition_manager.get_competition_totals, active_competition.id
+                        )
+                        total_invites = totals['total_invites']
+                        await self.ranking_notifier.notify_competition_milestone(active_competition.id, total_invites)
+
+                self._record('notify', started)
+                self._record('end_to_end', event.received_at)
+                self.metrics["events_completed"] += 1
+                logger.info(f"✅ Novo membro processado: {event.first_name} (ID: {event.member_id}) via usuário {event.inviter_id}")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record('notify', started, success=False)
+                logger.error(f"Erro ao processar notificações de ranking: {e}")
+            finally:
+                self.notify_queue.task_done()
+
+    def _queue_depths(self) -> Dict[str, Any]:
+        if not self.ingest_queue:
+            return {}
+        return {
+            "ingest": self.ingest_queue.qsize(),
+            "shards": [queue.qsize() for queue in self.shard_queues],
+            "notify": self.notify_queue.qsize()
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas do pipeline com latência média por estágio"""
+        def summarize(metrics: Dict[str, float]) -> Dict[str, float]:
+            count = metrics["count"]
+            return {
+                "count": count,
+                "errors": metrics["errors"],
+                "avg_ms": round(metrics["total_ms"] / count, 2) if count else 0.0,
+                "max_ms": round(metrics["max_ms"], 2)
+            }
+
+        api_calls = api_call_meter.total(self.API_SCOPE)
+        submitted = self.metrics["events_submitted"]
+        return {
+            "running": self.running,
+            "events_submitted": self.metrics["events_submitted"],
+            "events_rejected": self.metrics["events_rejected"],
+            "events_unresolved": self.metrics["events_unresolved"],
+            "events_completed": self.metrics["events_completed"],
+            "events_failed": self.metrics["events_failed"],
+            "telegram_api_calls": api_calls,
+            "telegram_api_calls_per_join": round(api_calls / submitted, 3) if submitted else 0.0,
+            "queue_depths": self._queue_depths(),
+            "stages": {stage: summarize(m) for stage, m in self.metrics["stages"].items()},
+            "end_to_end": summarize(self.metrics["end_to_end"])
+        }
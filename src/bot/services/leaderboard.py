@@ -0,0 +1,234 @@
+"""
+Leaderboard em Memória da Competição Ativa
+Estrutura de estatística de ordem (Fenwick tree sobre buckets de pontuação)
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FenwickTree:
+    """Árvore de Fenwick com contagens por pontuação e crescimento dinâmico"""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+
+    def _grow(self, min_size: int):
+        counts = [self.range_count(i, i) for i in range(1, self.size + 1)]
+        while self.size < min_size:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for index, count in enumerate(counts, 1):
+            if count:
+                self.add(index, count)
+
+    def add(self, index: int, delta: int):
+        """Soma delta na posição (1-based)"""
+        if index > self.size:
+            self._grow(index)
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """Soma das posições 1..index"""
+        index = min(index, self.size)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def range_count(self, low: int, high: int) -> int:
+        return self.prefix(high) - self.prefix(low - 1)
+
+    def find(self, target: int) -> int:
+        """Menor posição cujo prefixo é >= target (target >= 1)"""
+        position = 0
+        step = self.size
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < target:
+                position = nxt
+                target -= self.tree[nxt]
+            step //= 2
+        return position + 1
+
+class Leaderboard:
+    """
+    Ranking em memória de uma competição.
+
+    - increment(user): O(log n)
+    - rank_of(user): O(log n), mesma semântica do banco (1 + quantos têm mais pontos)
+    - top(k): O(b·log n + m·log k), b = pontuações distintas visitadas, m = membros delas
+    Empates são ordenados por user_id, como o keyset do banco.
+    """
+
+    def __init__(self, competition_id: int):
+        self.competition_id = competition_id
+        self.scores: Dict[int, int] = {}
+        self.buckets: Dict[int, Dict[int, None]] = {}
+        self.profiles: Dict[int, Dict[str, Any]] = {}
+        self.last_invite_at: Dict[int, Any] = {}
+        self.tree = FenwickTree()
+        self.total_score = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def load(self, rows: Iterable[Dict[str, Any]]):
+        """Carrega participantes (user_id, invites_count, username, first_name, last_invite_at)"""
+        with self.lock:
+            self.scores.clear()
+            self.buckets.clear()
+            self.profiles.clear()
+            self.last_invite_at.clear()
+            self.tree = FenwickTree()
+            self.total_score = 0
+
+            for row in rows:
+                user_id = row['user_id']
+                self.profiles[user_id] = {
+                    'username': row.get('username'),
+                    'first_name': row.get('first_name')
+                }
+                if row.get('last_invite_at'):
+                    self.last_invite_at[user_id] = row['last_invite_at']
+                self._place(user_id, row.get('invites_count') or 0)
+
+        logger.info(f"✅ Leaderboard da competição {self.competition_id} carregado: {len(self.scores)} participantes")
+
+    def _place(self, user_id: int, score: int):
+        self.scores[user_id] = score
+        self.buckets.setdefault(score, {})[user_id] = None
+        self.tree.add(score + 1, 1)
+        self.total_score += score
+
+    def _remove(self, user_id: int) -> int:
+        score = self.scores.pop(user_id)
+        bucket = self.buckets[score]
+        del bucket[user_id]
+        if not bucket:
+            del self.buckets[score]
+        self.tree.add(score + 1, -1)
+        self.total_score -= score
+        return score
+
+    def add_participant(self, user_id: int, username: str = None, first_name: str = None):
+        """Adiciona participante com 0 pontos (sem efeito se já existir)"""
+        with self.lock:
+            if username or first_name:
+                self.profiles[user_id] = {'username': username, 'first_name': first_name}
+            if user_id not in self.scores:
+                self._place(user_id, 0)
+
+    def set_score(self, user_id: int, score: int):
+        """Define a pontuação absoluta de um participante"""
+        with self.lock:
+            if user_id in self.scores:
+                if self.scores[user_id] == score:
+                    return
+                self._remove(user_id)
+            self._place(user_id, score)
+
+    def increment(self, user_id: int, delta: int = 1) -> Tuple[int, int]:
+        """Incrementa a pontuação; retorna (antiga, nova)"""
+        with self.lock:
+            old_score = self._remove(user_id) if user_id in self.scores else 0
+            new_score = max(0, old_score + delta)
+            self._place(user_id, new_score)
+            self.last_invite_at[user_id] = datetime.now().isoformat()
+            return old_score, new_score
+
+    def score_of(self, user_id: int) -> Optional[int]:
+        return self.scores.get(user_id)
+
+    def rank_of(self, user_id: int) -> Optional[int]:
+        """Posição do usuário (1 + participantes com mais pontos)"""
+        with self.lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return None
+            better = len(self.scores) - self.tree.prefix(score + 1)
+            return better + 1
+
+    def participant_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Estatísticas do participante no formato de get_user_competition_stats"""
+        with self.lock:
+            if user_id not in self.scores:
+                return None
+            return {
+                'invites_count': self.scores[user_id],
+                'position': self.rank_of(user_id),
+                'total_participants': len(self.scores),
+                'last_invite_at': self.last_invite_at.get(user_id)
+            }
+
+    def top(self, k: int, offset: int = 0, after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Retorna as entradas nas posições offset+1..offset+k no formato do ranking,
+        na mesma ordem do banco (invites_count DESC, user_id ASC).
+        after: cursor (invites_count, user_id) da última linha da página anterior
+        """
+        with self.lock:
+            ranking = []
+            if after is not None:
+                after_score, after_user = after
+                remaining = self.tree.prefix(after_score + 1)  # quem tem até after_score pontos
+            else:
+                after_score, after_user = None, None
+                remaining = len(self.scores)
+            to_skip = offset
+
+            while remaining > 0 and len(ranking) < k:
+                # Maior pontuação ainda não visitada
+                score = self.tree.find(remaining) - 1
+                bucket = self.buckets[score]
+                remaining -= len(bucket)
+
+                if score == after_score:
+                    members = [user_id for user_id in bucket if user_id > after_user]
+                elif to_skip >= len(bucket):
+                    to_skip -= len(bucket)
+                    continue
+                else:
+                    members = bucket
+
+                # Empate desfeito por user_id; só ordena o que a página vai usar
+                needed = to_skip + k - len(ranking)
+                chosen = heapq.nsmallest(needed, members)
+                rank = len(self.scores) - self.tree.prefix(score + 1) + 1
+                for user_id in chosen[to_skip:]:
+                    ranking.append(self._entry(user_id, score, rank))
+                to_skip = max(0, to_skip - len(chosen))
+
+            return ranking
+
+    def _entry(self, user_id: int, score: int, rank: int) -> Dict[str, Any]:
+        profile = self.profiles.get(user_id, {})
+        username = profile.get('username')
+        first_name = profile.get('first_name')
+        return {
+            'user_id': user_id,
+            'user_name': first_name or username or f"Usuário {user_id}",
+            'username': username,
+            'first_name': first_name,
+            'invites_count': score,
+            'position': rank
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'competition_id': self.competition_id,
+                'total_participants': len(self.scores),
+                'total_invites': self.total_score,
+                'distinct_scores': len(self.buckets)
+            }
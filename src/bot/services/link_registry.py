@@ -0,0 +1,147 @@
+"""
+Registro de Links de Convite
+Resolve URL do link -> (link, dono, competição) em memória, O(1) por entrada
+"""
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class LinkInfo:
+    """Dados estáveis de um link (usos ficam no banco, mudam a cada entrada)"""
+    link_id: int
+    owner_id: int
+    competition_id: Optional[int]
+    is_active: bool
+    max_uses: int
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'LinkInfo':
+        return cls(
+            link_id=row['id'],
+            owner_id=row['user_id'],
+            competition_id=row.get('competition_id'),
+            is_active=bool(row.get('is_active', True)),
+            max_uses=row.get('max_uses') if row.get('max_uses') is not None else -1
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato de linha (user_id = dono), compatível com os consumidores antigos"""
+        return {
+            'id': self.link_id,
+            'user_id': self.owner_id,
+            'competition_id': self.competition_id,
+            'is_active': self.is_active,
+            'max_uses': self.max_uses
+        }
+
+class LinkRegistry:
+    """
+    Mapa em memória URL -> LinkInfo compartilhado pelo processo.
+
+    - Pré-carregado com os links da competição ativa
+    - Atualizado na criação, revogação e troca de competição dos links;
+      alterações em massa (reset) limpam o mapa
+    - Um miss consulta o banco uma vez pelo loader e guarda o resultado;
+      links desconhecidos não são guardados (podem ter sido criados
+      por outro processo)
+    """
+
+    def __init__(self):
+        self.links: Dict[str, LinkInfo] = {}
+        self.urls_by_id: Dict[int, str] = {}
+        self.lock = threading.Lock()
+
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "not_found": 0,
+            "preloaded": 0,
+            "registered": 0,
+            "deactivated": 0,
+            "invalidations": 0
+        }
+
+    def _store(self, invite_link: str, info: LinkInfo):
+        with self.lock:
+            self.links[invite_link] = info
+            self.urls_by_id[info.link_id] = invite_link
+
+    def preload(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Carrega linhas de invite_links (id, user_id, invite_link, competition_id, is_active, max_uses)"""
+        count = 0
+        for row in rows:
+            self._store(row['invite_link'], LinkInfo.from_row(row))
+            count += 1
+        self.metrics["preloaded"] += count
+        logger.info(f"✅ {count} links de convite carregados no registro")
+        return count
+
+    def peek(self, invite_link: str) -> Optional[LinkInfo]:
+        """LinkInfo já em memória, sem tocar no banco (seguro no event loop)"""
+        info = self.links.get(invite_link)
+        if info is not None:
+            self.metrics["hits"] += 1
+        return info
+
+    def resolve(self, invite_link: str,
+                loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[LinkInfo]:
+        """LinkInfo do link; consulta o banco apenas se ainda não estiver no mapa"""
+        info = self.links.get(invite_link)
+        if info is not None:
+            self.metrics["hits"] += 1
+            return info
+
+        self.metrics["misses"] += 1
+        row = loader(invite_link)
+        if not row:
+            self.metrics["not_found"] += 1
+            return None
+
+        info = LinkInfo.from_row(row)
+        self._store(invite_link, info)
+        return info
+
+    def register(self, invite_link: str, link_id: int, owner_id: int, competition_id: Optional[int],
+                 max_uses: int = -1, is_active: bool = True):
+        """Registra um link recém-criado"""
+        self._store(invite_link, LinkInfo(link_id, owner_id, competition_id, is_active, max_uses))
+        self.metrics["registered"] += 1
+
+    def deactivate(self, invite_link: str):
+        """Marca o link como revogado/expirado"""
+        with self.lock:
+            info = self.links.get(invite_link)
+            if info is not None:
+                self.links[invite_link] = replace(info, is_active=False)
+                self.metrics["deactivated"] += 1
+
+    def move_to_competition(self, link_id: int, competition_id: int):
+        """Atualiza a competição de um link reaproveitado"""
+        with self.lock:
+            invite_link = self.urls_by_id.get(link_id)
+            info = self.links.get(invite_link) if invite_link else None
+            if info is not None:
+                self.links[invite_link] = replace(info, competition_id=competition_id)
+
+    def invalidate(self, reason: str = ""):
+        """Esquece todos os links (após alterações em massa no banco)"""
+        with self.lock:
+            self.links.clear()
+            self.urls_by_id.clear()
+        self.metrics["invalidations"] += 1
+        logger.debug(f"Registro de links invalidado: {reason}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tamanho do mapa e contadores"""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "links": len(self.links),
+            "hit_rate_percent": round(self.metrics["hits"] / lookups * 100, 2) if lookups else 0.0,
+            **self.metrics
+        }
+
+link_registry = LinkRegistry()
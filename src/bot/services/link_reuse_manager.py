@@ -8,6 +8,7 @@ from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
 
 from src.database.models import DatabaseManager, InviteLink
 from src.config.settings import settings
+from src.bot.services.link_registry import link_registry
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +114,7 @@ class LinkReuseManager:
                     WHERE id = ?
                 """, (competition_id, link_id))
                 
+                link_registry.move_to_competition(link_id, competition_id)
                 logger.info(f"Link {link_id} resetado para competição {competition_id}")
                 
         except Exception as e:
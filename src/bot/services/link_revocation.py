@@ -0,0 +1,161 @@
+"""
+Revogação de Links Expirados
+Revoga em paralelo, respeitando o limite do Telegram, e marca cada link assim que confirmado
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from src.config.settings import settings
+from src.bot.services.link_registry import link_registry
+from src.bot.services.message_scheduler import MessageScheduler, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class ExpiredLinkRevoker:
+    """
+    Job de revogação dos links expirados.
+
+    - Lê os links em blocos paginados por id (keyset), sem conexão aberta
+      durante as chamadas ao Telegram
+    - Revoga até `concurrency` links ao mesmo tempo, limitados por um token
+      bucket próprio (`rate` revogações/s) e pelo bucket global do agendador
+      de mensagens, já que o limite do Telegram vale para o bot inteiro;
+      RetryAfter pausa todas as revogações
+    - Cada link é marcado inativo logo após a confirmação. Como a consulta
+      só traz links ainda ativos, um restart no meio retoma de onde parou
+      sem precisar de checkpoint
+    - Só BadRequest indica link já inválido; outros erros do Telegram
+      deixam o link ativo para a próxima execução
+    """
+
+    def __init__(self, db_manager, bot: Bot, chat_id: Any, scheduler: MessageScheduler,
+                 concurrency: int = None, rate: float = None, chunk_size: int = None,
+                 max_retries: int = None):
+        self.db = db_manager
+        self.bot = bot
+        self.chat_id = chat_id
+        self.global_bucket = scheduler.global_bucket
+        self.concurrency = concurrency or settings.LINK_REVOKE_CONCURRENCY
+        self.rate = rate or settings.LINK_REVOKE_RATE
+        self.chunk_size = chunk_size or settings.LINK_REVOKE_CHUNK_SIZE
+        self.max_retries = max_retries if max_retries is not None else settings.LINK_REVOKE_MAX_RETRIES
+
+        self.bucket = TokenBucket(self.rate, self.concurrency)
+        self.paused_until = 0.0
+        self.running = False
+
+        # Métricas (acumuladas entre execuções)
+        self.metrics = {
+            "runs": 0,
+            "scanned": 0,
+            "revoked": 0,
+            "already_invalid": 0,
+            "deactivated": 0,
+            "failed": 0,
+            "retry_after": 0,
+            "network_errors": 0,
+            "last_run_seconds": 0.0
+        }
+
+    async def _run_db(self, func: Callable, *args):
+        """Consultas ao banco fora do event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _acquire(self, lock: asyncio.Lock):
+        """Espera um token do bucket e o fim de uma pausa por flood control"""
+        async with lock:
+            while True:
+                now = time.monotonic()
+                wait = max(self.paused_until - now, self.bucket.delay(now), self.global_bucket.delay(now))
+                if wait <= 0:
+                    self.bucket.consume(now)
+                    self.global_bucket.consume(now)
+                    return
+                await asyncio.sleep(wait)
+
+    async def _revoke(self, row: Dict[str, Any], semaphore: asyncio.Semaphore, lock: asyncio.Lock) -> bool:
+        """Revoga um link e o marca inativo; False se deve ficar para a próxima execução"""
+        invite_link = row['invite_link']
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire(lock)
+                try:
+                    await self.bot.revoke_chat_invite_link(chat_id=self.chat_id, invite_link=invite_link)
+                    self.metrics["revoked"] += 1
+                    break
+                except RetryAfter as e:
+                    retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                    self.metrics["retry_after"] += 1
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                except BadRequest:
+                    # Link já revogado ou inválido no Telegram: basta marcar no banco
+                    # (BadRequest herda de NetworkError, por isso vem antes)
+                    self.metrics["already_invalid"] += 1
+                    break
+                except NetworkError:
+                    self.metrics["network_errors"] += 1
+                    await asyncio.sleep(2 ** attempt)
+                except TelegramError as e:
+                    logger.warning(f"⚠️ Falha ao revogar link {row['id']}: {e}")
+                    self.metrics["failed"] += 1
+                    return False
+            else:
+                self.metrics["failed"] += 1
+                return False
+
+        if not await self._run_db(self.db.deactivate_invite_link, row['id']):
+            self.metrics["failed"] += 1
+            return False
+
+        link_registry.deactivate(invite_link)
+        self.metrics["deactivated"] += 1
+        return True
+
+    async def run(self, now: Optional[datetime] = None) -> int:
+        """Revoga todos os links expirados até `now`; retorna quantos foram desativados"""
+        if self.running:
+            logger.info("Revogação de links expirados já em andamento, ignorando")
+            return 0
+
+        self.running = True
+        self.metrics["runs"] += 1
+        started = time.monotonic()
+        now = now or datetime.now()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        lock = asyncio.Lock()
+        after_id = 0
+        deactivated = 0
+
+        try:
+            while True:
+                rows = await self._run_db(self.db.get_expired_invite_links, now, after_id, self.chunk_size)
+                if not rows:
+                    break
+
+                self.metrics["scanned"] += len(rows)
+                after_id = rows[-1]['id']
+                results = await asyncio.gather(*(self._revoke(row, semaphore, lock) for row in rows))
+                deactivated += sum(results)
+
+                if len(rows) < self.chunk_size:
+                    break
+        finally:
+            self.running = False
+            self.metrics["last_run_seconds"] = round(time.monotonic() - started, 1)
+
+        if deactivated:
+            logger.info(f"✅ {deactivated} links expirados revogados em {self.metrics['last_run_seconds']}s")
+        return deactivated
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas do job de revogação"""
+        return {
+            "running": self.running,
+            **self.metrics
+        }
@@ -10,6 +10,7 @@ from telegram import User, ChatMemberUpdated
 
 from src.database.invited_users_global_global_model import invited_users_global_global_manager
 from src.database.models import DatabaseManager
+from src.bot.services.link_registry import link_registry
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +21,17 @@ class MemberTracker:
     
     async def track_new_member(self, update: ChatMemberUpdated, invite_link: str) -> bool:
         """Rastreia novo membro que entrou pelo link"""
+        new_member = update.new_chat_member.user
+        return self.track_invited_user(
+            new_member.id, new_member.username, new_member.first_name,
+            new_member.last_name, invite_link
+        )
+    
+    def track_invited_user(self, invited_user_id: int, username: Optional[str],
+                           first_name: Optional[str], last_name: Optional[str],
+                           invite_link: str) -> bool:
+        """Rastreia membro convidado a partir dos dados compactos do evento de entrada"""
         try:
-            # Extrair dados do novo membro
-            new_member = update.new_chat_member.user
-            
             # Buscar quem criou o link
             link_info = self.get_link_owner(invite_link)
             if not link_info:
@@ -34,12 +42,14 @@ class MemberTracker:
             competition_id = link_info.get('competition_id')
             
             # Extrair dados do usuário
+            new_member = User(id=invited_user_id, first_name=first_name or "", is_bot=False,
+                              last_name=last_name, username=username)
             user_data = self.extract_user_data(new_member)
             
             # Salvar no banco
             success = self.invited_users_global_global.add_invited_user(
                 inviter_user_id=inviter_user_id,
-                invited_user_id=new_member.id,
+                invited_user_id=invited_user_id,
                 username=user_data['username'],
                 first_name=user_data['first_name'],
                 last_name=user_data['last_name'],
@@ -55,7 +65,7 @@ class MemberTracker:
                 
                 return True
             else:
-                logger.error(f"❌ Falha ao rastrear membro: {new_member.id}")
+                logger.error(f"❌ Falha ao rastrear membro: {invited_user_id}")
                 return False
                 
         except Exception as e:
@@ -63,18 +73,11 @@ class MemberTracker:
             return False
     
     def get_link_owner(self, invite_link: str) -> Optional[Dict[str, Any]]:
-        """Busca o dono do link de convite"""
+        """Busca o dono do link de convite (registro em memória)"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = session.execute(text(text("""
-                    SELECT user_id, competition_id 
-                    FROM invite_links_global_global_global 
-                    WHERE invite_link = ?
-                """, (invite_link,))
-                
-                row = cursor.fetchone()
-                return dict(row) if row else None
-                
+            link = link_registry.resolve(invite_link, self.db.get_invite_link_by_url)
+            return link.to_dict() if link else None
+            
         except Exception as e:
             logger.error(f"❌ Erro ao buscar dono do link: {e}")
             return None
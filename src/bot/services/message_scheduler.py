@@ -0,0 +1,410 @@
+"""
+Agendador Central de Mensagens
+Envia todas as notificações do bot respeitando os limites de flood do Telegram
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class MessagePriority(IntEnum):
+    """Classes de prioridade (menor valor sai primeiro)"""
+    ADMIN_ALERT = 0
+    COMPETITION = 1
+    RANKING = 2
+    MOTIVATIONAL = 3
+
+class TokenBucket:
+    """Token bucket com reposição contínua"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver um token disponível (0 se já houver)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """Sem uso recente: equivalente a um bucket novo"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+@dataclass(order=True)
+class OutboundMessage:
+    sort_key: Tuple[int, int]
+    chat_id: Any = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False, default_factory=dict)
+    coalesce_key: Hashable = field(compare=False, default=None)
+    futures: List[asyncio.Future] = field(compare=False, default_factory=list)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    attempts: int = field(compare=False, default=0)
+    cancelled: bool = field(compare=False, default=False)
+
+    @property
+    def priority(self) -> MessagePriority:
+        return MessagePriority(self.sort_key[0])
+
+class MessageScheduler:
+    """
+    Fila única de saída para o Telegram.
+
+    - Token bucket global e um por chat (grupos/canais têm limite por minuto)
+    - RetryAfter pausa o chat pelo tempo pedido e recoloca a mensagem na fila
+    - Prioridades: alertas de admin saem antes de mensagens motivacionais
+    - Mensagens pendentes duplicadas (mesmo chat e texto, ou mesma
+      coalesce_key) são unificadas; com coalesce_key prevalece o texto mais novo
+    - Um envio por chat por vez, preservando a ordem dentro do chat
+    - Buckets e pausas de chats ociosos são descartados periodicamente
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, bot: Bot, global_rate: float = None, private_chat_rate: float = None,
+                 group_chat_rate_per_minute: float = None, max_queue: int = None,
+                 max_retries: int = None, max_in_flight: int = None):
+        self.bot = bot
+        self.private_chat_rate = private_chat_rate or settings.OUTBOUND_PRIVATE_CHAT_RATE
+        self.group_chat_rate = (group_chat_rate_per_minute or settings.OUTBOUND_GROUP_CHAT_RATE_PER_MINUTE) / 60
+        self.max_queue = max_queue or settings.OUTBOUND_MAX_QUEUE
+        self.max_retries = max_retries if max_retries is not None else settings.OUTBOUND_MAX_RETRIES
+        self.max_in_flight = max_in_flight or settings.OUTBOUND_MAX_IN_FLIGHT
+
+        global_rate = global_rate or settings.OUTBOUND_GLOBAL_RATE
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.chat_queues: Dict[Any, List[OutboundMessage]] = {}
+        self.pending: Dict[Hashable, OutboundMessage] = {}
+        self.paused_until: Dict[Any, float] = {}
+        self.busy_chats = set()
+        self.size = 0
+        self.sequence = itertools.count()
+        self.last_prune = time.monotonic()
+
+        self.wakeup: Optional[asyncio.Event] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.deliveries = set()
+        self.running = False
+
+        # Métricas
+        self.sent_times = deque(maxlen=10000)
+        self.metrics = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "failed": 0,
+            "dropped": 0,
+            "retry_after": 0,
+            "retries": 0,
+            "pruned_chats": 0,
+            "total_latency_ms": 0.0,
+            "max_latency_ms": 0.0
+        }
+
+    async def start(self):
+        """Inicia o despachante"""
+        if self.running:
+            return
+
+        self.wakeup = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.running = True
+        self.dispatcher = asyncio.create_task(self._dispatch_loop())
+
+        logger.info(f"✅ Agendador de mensagens iniciado: {self.global_bucket.rate:.0f} msg/s global")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Envia o que estiver pendente (até drain_timeout) e para"""
+        if not self.running:
+            return
+
+        self.running = False
+        self.wakeup.set()
+        try:
+            await asyncio.wait_for(self.dispatcher, timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            self.dispatcher.cancel()
+            logger.warning(f"⚠️ Agendador parado com {self.size} mensagens pendentes")
+
+        if self.deliveries:
+            await asyncio.wait(self.deliveries, timeout=drain_timeout)
+
+        for queue in self.chat_queues.values():
+            for message in queue:
+                self._resolve(message, False)
+
+        logger.info("✅ Agendador de mensagens parado")
+
+    def enqueue(self, chat_id: Any, text: str, priority: MessagePriority = MessagePriority.RANKING,
+                coalesce_key: Hashable = None, **kwargs) -> asyncio.Future:
+        """
+        Coloca uma mensagem na fila.
+        Retorna um Future resolvido com True quando enviada (False se falhar).
+        """
+        future = asyncio.get_event_loop().create_future()
+
+        if not self.running:
+            # Primeiro uso sem start() explícito
+            asyncio.get_event_loop().create_task(self.start())
+
+        key = ('custom', chat_id, coalesce_key) if coalesce_key is not None else ('text', chat_id, text)
+        existing = self.pending.get(key)
+        if existing:
+            self.metrics["coalesced"] += 1
+            existing.futures.append(future)
+            existing.text = text
+            existing.kwargs = kwargs
+            if priority < existing.priority:
+                # Reinserir com a prioridade mais alta mantendo a ordem de chegada original
+                existing.cancelled = True
+                self._push(OutboundMessage(
+                    (int(priority), existing.sort_key[1]), chat_id, text, kwargs, key,
+                    existing.futures, existing.enqueued_at, existing.attempts
+                ), count=False)
+            return future
+
+        if self.size >= self.max_queue and priority > MessagePriority.ADMIN_ALERT:
+            self.metrics["dropped"] += 1
+            logger.warning(f"⚠️ Fila de mensagens cheia ({self.size}) - mensagem descartada para {chat_id}")
+            future.set_result(False)
+            return future
+
+        self.metrics["enqueued"] += 1
+        self._push(OutboundMessage((int(priority), next(self.sequence)), chat_id, text, kwargs, key, [future]))
+        return future
+
+    async def send_message(self, chat_id: Any, text: str, priority: MessagePriority = MessagePriority.RANKING,
+                           coalesce_key: Hashable = None, wait: bool = False, **kwargs) -> bool:
+        """
+        Envia pela fila. Com wait=False retorna assim que a mensagem é aceita;
+        com wait=True aguarda o envio e retorna o resultado.
+        """
+        future = self.enqueue(chat_id, text, priority=priority, coalesce_key=coalesce_key, **kwargs)
+        if wait or future.done():
+            return await future
+        return True
+
+    def _push(self, message: OutboundMessage, count: bool = True):
+        heapq.heappush(self.chat_queues.setdefault(message.chat_id, []), message)
+        self.pending[message.coalesce_key] = message
+        if count:
+            self.size += 1
+        if self.wakeup:
+            self.wakeup.set()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            bucket = TokenBucket(self.group_chat_rate if is_group else self.private_chat_rate, 1)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _head(self, chat_id: Any) -> Optional[OutboundMessage]:
+        queue = self.chat_queues.get(chat_id)
+        while queue and queue[0].cancelled:
+            heapq.heappop(queue)
+        if not queue:
+            self.chat_queues.pop(chat_id, None)
+            return None
+        return queue[0]
+
+    def _next_ready(self, now: float) -> Tuple[Optional[Any], Optional[float]]:
+        """Chat com a mensagem mais prioritária pronta, ou o tempo até a próxima"""
+        best_chat = None
+        best_key = None
+        wait = None
+
+        for chat_id in list(self.chat_queues):
+            head = self._head(chat_id)
+            if head is None or chat_id in self.busy_chats:
+                continue
+
+            delay = max(self.paused_until.get(chat_id, 0) - now, self._chat_bucket(chat_id).delay(now))
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            if best_key is None or head.sort_key < best_key:
+                best_chat, best_key = chat_id, head.sort_key
+
+        return best_chat, wait
+
+    async def _dispatch_loop(self):
+        while self.running or self.size:
+            try:
+                now = time.monotonic()
+                if now - self.last_prune >= self.PRUNE_INTERVAL:
+                    self._prune_idle(now)
+                chat_id, wait = self._next_ready(now)
+
+                if chat_id is None:
+                    if not self.running and not self.busy_chats:
+                        break
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=wait if wait is not None else 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                global_delay = self.global_bucket.delay(now)
+                if global_delay > 0:
+                    await asyncio.sleep(global_delay)
+                    continue
+
+                await self.slots.acquire()
+
+                # A fila pode ter mudado durante a espera (mensagem unificada/cancelada)
+                if self._head(chat_id) is None or chat_id in self.busy_chats:
+                    self.slots.release()
+                    continue
+
+                message = heapq.heappop(self.chat_queues[chat_id])
+                if self.pending.get(message.coalesce_key) is message:
+                    del self.pending[message.coalesce_key]
+                self.size -= 1
+
+                now = time.monotonic()
+                self.global_bucket.consume(now)
+                self._chat_bucket(chat_id).consume(now)
+                self.busy_chats.add(chat_id)
+
+                task = asyncio.create_task(self._deliver(message))
+                self.deliveries.add(task)
+                task.add_done_callback(self.deliveries.discard)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no despachante de mensagens: {e}")
+                await asyncio.sleep(1)
+
+    def _prune_idle(self, now: float):
+        """Descarta bucket e pausa de chats sem fila, sem envio em curso e já sem efeito"""
+        for chat_id in [chat_id for chat_id, until in self.paused_until.items() if until <= now]:
+            del self.paused_until[chat_id]
+        idle = [
+            chat_id for chat_id, bucket in self.chat_buckets.items()
+            if chat_id not in self.chat_queues and chat_id not in self.busy_chats
+            and chat_id not in self.paused_until and bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+        self.metrics["pruned_chats"] += len(idle)
+        self.last_prune = now
+
+    async def _deliver(self, message: OutboundMessage):
+        try:
+            await self.bot.send_message(chat_id=message.chat_id, text=message.text, **message.kwargs)
+
+            latency_ms = (time.monotonic() - message.enqueued_at) * 1000
+            self.metrics["sent"] += 1
+            self.metrics["total_latency_ms"] += latency_ms
+            self.metrics["max_latency_ms"] = max(self.metrics["max_latency_ms"], latency_ms)
+            self.sent_times.append(time.monotonic())
+            self._resolve(message, True)
+
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+            self.metrics["retry_after"] += 1
+            logger.warning(f"⚠️ Flood control no chat {message.chat_id}: aguardando {retry_after:.0f}s")
+            self.paused_until[message.chat_id] = time.monotonic() + retry_after
+            self._retry(message, count_attempt=False)
+
+        except BadRequest as e:
+            logger.error(f"❌ Mensagem rejeitada pelo Telegram ({message.chat_id}): {e}")
+            self._fail(message)
+
+        except NetworkError as e:
+            if message.attempts < self.max_retries:
+                self.paused_until[message.chat_id] = time.monotonic() + 2 ** message.attempts
+                self._retry(message)
+            else:
+                logger.error(f"❌ Falha de rede ao enviar para {message.chat_id} após {message.attempts} tentativas: {e}")
+                self._fail(message)
+
+        except TelegramError as e:
+            logger.error(f"❌ Erro ao enviar mensagem para {message.chat_id}: {e}")
+            self._fail(message)
+
+        except Exception as e:
+            logger.error(f"❌ Erro inesperado ao enviar mensagem para {message.chat_id}: {e}")
+            self._fail(message)
+
+        finally:
+            self.busy_chats.discard(message.chat_id)
+            self.slots.release()
+            self.wakeup.set()
+
+    def _retry(self, message: OutboundMessage, count_attempt: bool = True):
+        if count_attempt:
+            message.attempts += 1
+            self.metrics["retries"] += 1
+
+        newer = self.pending.get(message.coalesce_key)
+        if newer:
+            # Uma versão mais nova já está na fila: ela leva os futures desta
+            newer.futures.extend(message.futures)
+            return
+
+        self._push(message)
+
+    def _fail(self, message: OutboundMessage):
+        self.metrics["failed"] += 1
+        self._resolve(message, False)
+
+    def _resolve(self, message: OutboundMessage, success: bool):
+        for future in message.futures:
+            if not future.done():
+                future.set_result(success)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Vazão, profundidade da fila e latência de envio"""
+        now = time.monotonic()
+        by_priority = {priority.name: 0 for priority in MessagePriority}
+        for queue in self.chat_queues.values():
+            for message in queue:
+                if not message.cancelled:
+                    by_priority[message.priority.name] += 1
+
+        return {
+            "running": self.running,
+            "queue_depth": self.size,
+            "queue_by_priority": by_priority,
+            "chats_pending": len(self.chat_queues),
+            "chats_paused": sum(1 for until in self.paused_until.values() if until > now),
+            "chats_tracked": len(self.chat_buckets),
+            "in_flight": len(self.busy_chats),
+            "sent_last_minute": sum(1 for sent_at in self.sent_times if now - sent_at <= 60),
+            **self.metrics,
+            "avg_latency_ms": round(self.metrics["total_latency_ms"] / self.metrics["sent"], 2)
+                if self.metrics["sent"] else 0.0
+        }
@@ -0,0 +1,114 @@
+"""
+Livro de Marcos
+Registra marcos já anunciados por competição para não repetir notificações
+"""
+import logging
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = 0  # marcos da competição como um todo (total de convites)
+
+class MilestoneLedger:
+    """
+    Conjunto em memória de (competição, escopo, marco) espelhado em uma
+    tabela com chave única.
+
+    O cruzamento é detectado por faixa: um valor que vai de old para new
+    cruza os marcos em (old, new], encontrados por busca binária. Cada marco
+    só é reivindicado uma vez: o conjunto evita idas ao banco e o INSERT com
+    conflito ignorado garante que, entre restarts ou vários processos,
+    apenas um anuncia.
+    """
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.reached: Set[Tuple[int, int, int]] = set()
+        self.loaded: Set[int] = set()
+        self.levels: Dict[Tuple[int, int], int] = {}  # último valor observado por escopo
+        self.lock = threading.Lock()
+
+        self.metrics = {
+            "checks": 0,
+            "crossings": 0,
+            "claimed": 0,
+            "already_reached": 0
+        }
+
+    def load(self, competition_id: int):
+        """Carrega os marcos já registrados da competição"""
+        rows = self.db.get_reached_milestones(competition_id)
+        with self.lock:
+            for scope, milestone in rows:
+                self.reached.add((competition_id, scope, milestone))
+            self.loaded.add(competition_id)
+        logger.info(f"✅ {len(rows)} marcos carregados da competição {competition_id}")
+
+    @staticmethod
+    def crossed(thresholds: Sequence[int], old: int, new: int) -> List[int]:
+        """Marcos (lista ordenada) no intervalo (old, new]"""
+        if new <= old:
+            return []
+        return list(thresholds[bisect_right(thresholds, old):bisect_right(thresholds, new)])
+
+    def claim(self, competition_id: int, scope: int, milestones: Sequence[int]) -> List[int]:
+        """Reivindica os marcos; retorna apenas os que ainda não tinham sido registrados"""
+        if not milestones:
+            return []
+
+        if competition_id not in self.loaded:
+            self.load(competition_id)
+
+        with self.lock:
+            fresh = [m for m in milestones if (competition_id, scope, m) not in self.reached]
+        self.metrics["already_reached"] += len(milestones) - len(fresh)
+        if not fresh:
+            return []
+
+        claimed = self.db.claim_milestones(competition_id, scope, fresh)
+        if claimed is None:
+            # Falha no banco: não marca nada, a próxima verificação tenta de novo
+            return []
+
+        with self.lock:
+            for milestone in fresh:
+                self.reached.add((competition_id, scope, milestone))
+        self.metrics["already_reached"] += len(fresh) - len(claimed)
+        self.metrics["claimed"] += len(claimed)
+        return sorted(claimed)
+
+    def claim_crossed(self, competition_id: int, scope: int, thresholds: Sequence[int],
+                      new: int, old: Optional[int] = None) -> List[int]:
+        """
+        Reivindica os marcos cruzados ao passar de old para new. Sem old,
+        usa o último valor observado no escopo (ou new - 1 no primeiro).
+        """
+        self.metrics["checks"] += 1
+        key = (competition_id, scope)
+        with self.lock:
+            if old is None:
+                old = self.levels.get(key, new - 1)
+            self.levels[key] = max(self.levels.get(key, new), new)
+
+        crossed = self.crossed(thresholds, old, new)
+        if not crossed:
+            return []
+
+        self.metrics["crossings"] += len(crossed)
+        return self.claim(competition_id, scope, crossed)
+
+    def forget(self, competition_id: int):
+        """Descarta o estado em memória de uma competição encerrada"""
+        with self.lock:
+            self.reached = {key for key in self.reached if key[0] != competition_id}
+            self.levels = {key: value for key, value in self.levels.items() if key[0] != competition_id}
+            self.loaded.discard(competition_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas do livro de marcos"""
+        return {
+            "reached": len(self.reached),
+            **self.metrics
+        }
@@ -357,6 +357,7 @@ class OptimizedQueries:
                                               time_window_minutes: int = 60) -> List[Dict[str, Any]]:
         """
         Detecta indicadores de ataque coordenado
+        Auditoria offline; no caminho da entrada use burst_detector
         """
         try:
             async with self.db.async_session_factory() as session:
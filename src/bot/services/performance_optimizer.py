@@ -12,7 +12,10 @@ from typing import Optional, Dict, Any, List, Tuple
 from collections import defaultdict, deque
 from functools import wraps
 from sqlalchemy import create_engine, VARCHAR
+from src.config.settings import settings
 from src.database.models import DatabaseManager
+from src.bot.services.bounded_cache import BoundedCache
+from src.bot.services.active_competition_cache import active_competition_cache
 
 logger = logging.getLogger(__name__)
 
@@ -51,62 +54,12 @@ class RateLimiter:
         reset_time = oldest_request + self.window_seconds
         return max(0, int(reset_time - time.time()))
 
-class MemoryCache:
-    """Cache em memória com TTL para dados frequentes"""
-    
-    def __init__(self, default_ttl: int = 300):  # 5 minutos
-        self.cache = {}
-        self.ttl = {}
-        self.default_ttl = default_ttl
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Busca item no cache"""
-        if key not in self.cache:
-            return None
-        
-        # Verifica TTL
-        if key in self.ttl and time.time() > self.ttl[key]:
-            self.delete(key)
-            return None
-        
-        return self.cache[key]
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Armazena item no cache"""
-        self.cache[key] = value
-        if ttl is None:
-            ttl = self.default_ttl
-        self.ttl[key] = time.time() + ttl
-    
-    def delete(self, key: str) -> None:
-        """Remove item do cache"""
-        self.cache.pop(key, None)
-        self.ttl.pop(key, None)
-    
-    def clear(self) -> None:
-        """Limpa todo o cache"""
-        self.cache.clear()
-        self.ttl.clear()
-    
-    def cleanup(self) -> int:
-        """Remove itens expirados"""
-        now = time.time()
-        expired_keys = [
-            key for key, expiry in self.ttl.items()
-            if expiry < now
-        ]
-        
-        for key in expired_keys:
-            self.delete(key)
-        
-        return len(expired_keys)
-
 class DatabaseOptimizer:
     """Otimizador de banco de dados para alta performance"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, cache: BoundedCache):
         self.db = db_manager
-        self.cache = MemoryCache()
+        self.cache = cache
         
     def create_indexes(self) -> Dict[str, bool]:
         """Cria índices para otimizar queries"""
@@ -185,46 +138,27 @@ class DatabaseOptimizer:
         return results
     
     def get_cached_active_competition(self):
-        """Busca competição ativa com cache"""
-        cache_key = "active_competition"
-        cached = self.cache.get(cache_key)
-        
-        if cached is not None:
-            return cached
-        
-        # Buscar no banco
-        competition = self.db.get_active_competition()
-        
-        # Cache por 2 minutos
-        self.cache.set(cache_key, competition, ttl=120)
-        
-        return competition
+        """Busca competição ativa pelo snapshot compartilhado do processo"""
+        return active_competition_cache.get(self.db.get_active_competition)
     
     def invalidate_competition_cache(self):
         """Invalida cache de competições"""
-        keys_to_delete = [
-            "active_competition",
-            "competition_stats",
-            "ranking_cache"
-        ]
-        
-        for key in keys_to_delete:
-            self.cache.delete(key)
+        self.cache.invalidate_namespace("competition")
+        active_competition_cache.invalidate("admin")
 
 class PerformanceOptimizer:
     """Otimizador principal de performance"""
     
     def __init__(self, db_manager: DatabaseManager):
-        self.db_optimizer = DatabaseOptimizer(db_manager)
+        # Cache único, compartilhado com o otimizador de banco (invalidação por namespace)
+        self.cache = BoundedCache(name="performance")
+        self.db_optimizer = DatabaseOptimizer(db_manager, self.cache)
         self.rate_limiter = RateLimiter(max_requests=20, window_seconds=60)  # 20 req/min por usuário
-        self.cache = MemoryCache()
         
         # Métricas de performance
         self.metrics = {
             "requests_total": 0,
             "requests_blocked": 0,
-            "cache_hits": 0,
-            "cache_misses": 0,
             "avg_response_time": 0.0
         }
     
@@ -242,6 +176,19 @@ class PerformanceOptimizer:
         
         return allowed, reset_time
     
+    def get_cached_system_health(self, state_validator) -> Dict[str, Any]:
+        """
+        Saúde do sistema (contagens agregadas) com cache curto e single-flight;
+        sai do cache ao finalizar competição e não guarda resultado de erro
+        """
+        health = self.cache.get_or_load(
+            "system_health", state_validator.get_system_health,
+            ttl=settings.SYSTEM_HEALTH_CACHE_TTL, namespace="competition"
+        )
+        if health.get("database_status") == "error":
+            self.cache.delete("system_health", namespace="competition")
+        return health
+    
     def with_performance_monitoring(self, func):
         """Decorator para monitorar performance de funções"""
         @wraps(func)
@@ -273,9 +220,13 @@ class PerformanceOptimizer:
     
     def get_performance_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas de performance"""
-        cache_total = self.metrics["cache_hits"] + self.metrics["cache_misses"]
+        # Contadores vêm dos próprios caches
+        cache_stats = [self.cache.get_stats()]
+        cache_hits = sum(ns["hits"] for stats in cache_stats for ns in stats["namespaces"].values())
+        cache_misses = sum(ns["misses"] for stats in cache_stats for ns in stats["namespaces"].values())
+        cache_total = cache_hits + cache_misses
         cache_hit_rate = (
-            self.metrics["cache_hits"] / cache_total * 100
+            cache_hits / cache_total * 100
             if cache_total > 0 else 0
         )
         
@@ -291,9 +242,10 @@ class PerformanceOptimizer:
                 "block_rate_percent": round(block_rate, 2)
             },
             "cache": {
-                "hits": self.metrics["cache_hits"],
-                "misses": self.metrics["cache_misses"],
-                "hit_rate_percent": round(cache_hit_rate, 2)
+                "hits": cache_hits,
+                "misses": cache_misses,
+                "hit_rate_percent": round(cache_hit_rate, 2),
+                "caches": {stats["name"]: stats for stats in cache_stats}
             },
             "performance": {
                 "avg_response_time_ms": round(self.metrics["avg_response_time"] * 1000, 2)
@@ -336,8 +288,6 @@ class PerformanceOptimizer:
         self.metrics = {
             "requests_total": 0,
             "requests_blocked": 0,
-            "cache_hits": 0,
-            "cache_misses": 0,
             "avg_response_time": 0.0
         }
 
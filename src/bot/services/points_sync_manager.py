@@ -4,9 +4,13 @@ Gerenciador de Sincronização de Pontos
 Responsável por manter pontos da competição sincronizados com usos reais dos links
 """
 import logging
+import time
 from typing import Dict, List, Optional
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE
 
+from src.config.settings import settings
+from src.bot.services.link_registry import link_registry
+
 logger = logging.getLogger(__name__)
 
 class PointsSyncManager:
@@ -14,6 +18,63 @@ class PointsSyncManager:
     
     def __init__(self, db_manager):
         self.db = db_manager
+        self.incremental = settings.POINTS_SYNC_INCREMENTAL
+        self.reconcile_watermarks = {}  # competition_id -> último watermark reconciliado
+    
+    def apply_invite_delta(self, user_id: int, competition_id: int, delta: int = 1) -> bool:
+        """Aplica o delta de um convite nos pontos do participante (modo incremental)"""
+        try:
+            new_count = self.db.increment_participant_invites(competition_id, user_id, delta)
+            
+            if new_count is None:
+                logger.warning(f"⚠️ Usuário {user_id} não encontrado na competição {competition_id}")
+                return False
+            
+            logger.info(f"✅ Pontos incrementados: usuário {user_id} +{delta} = {new_count}")
+            
+            if settings.POINTS_SYNC_MAINTAIN_POSITIONS:
+                self.update_position_after_increment(competition_id, user_id, new_count - delta, new_count)
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao incrementar pontos do usuário {user_id}: {e}")
+            return False
+    
+    def reconcile_competition_points(self, competition_id: int, full: bool = False,
+                                     update_positions: bool = True) -> Dict:
+        """
+        Reconciliação periódica: recalcula SUM(uses) apenas para usuários
+        cujos links mudaram desde o último watermark
+        """
+        started = time.monotonic()
+        since = None if full else self.reconcile_watermarks.get(competition_id)
+        
+        try:
+            result = self.db.reconcile_participant_points(
+                competition_id, since, settings.POINTS_RECONCILE_OVERLAP_SECONDS
+            )
+            if result is None:
+                logger.error(f"❌ Falha na reconciliação de pontos da competição {competition_id}")
+                return {'corrected': 0, 'error': True}
+            
+            corrected, watermark = result
+            self.reconcile_watermarks[competition_id] = watermark
+            
+            if corrected > 0:
+                logger.warning(f"⚠️ Reconciliação corrigiu {corrected} participantes na competição {competition_id}")
+                if update_positions:
+                    self._update_ranking_positions(competition_id)
+            
+            return {
+                'corrected': corrected,
+                'full': since is None,
+                'watermark': watermark,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 2)
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Erro na reconciliação de pontos da competição {competition_id}: {e}")
+            return {'corrected': 0, 'error': True}
         
     def sync_user_points(self, user_id: int, competition_id: int) -> bool:
         """Sincroniza pontos de um usuário específico com seus links"""
@@ -67,63 +128,69 @@ class PointsSyncManager:
     def sync_all_competition_points(self, competition_id: int) -> Dict[str, int]:
         """Sincroniza pontos de todos os participantes da competição"""
         try:
-            synced = 0
-            errors = 0
+            logger.info(f"🔄 Sincronizando participantes da competição {competition_id}")
+            
+            # Recalcular pontos de todos em um único UPDATE baseado em conjunto
+            report = self.reconcile_competition_points(competition_id, full=True, update_positions=False)
+            errors = 1 if report.get('error') else 0
+            
+            # Atualizar posições no ranking
+            ranking = self._update_ranking_positions(competition_id)
+            
+            logger.info(f"✅ Sincronização concluída: {report.get('corrected', 0)} corrigidos, {errors} erros")
+            
+            return {
+                'synced': report.get('corrected', 0),
+                'errors': errors,
+                'positions_updated': ranking['rows_touched'],
+                'elapsed_ms': report.get('elapsed_ms', 0) + ranking['elapsed_ms']
+            }
             
-            # Buscar todos os participantes
-            with self.db.get_connection() as conn:
-                participants = session.execute(text(text("""
-                    SELECT DISTINCT user_id 
-                    FROM competition_participants_global_global_global 
-                    WHERE competition_id = ?
-                """, (competition_id,)).fetchall()
-                
-                logger.info(f"🔄 Sincronizando {len(participants)} participantes da competição {competition_id}")
-                
-                for participant in participants:
-                    user_id = participant['user_id']
-                    
-                    if self.sync_user_points(user_id, competition_id):
-                        synced += 1
-                    else:
-                        errors += 1
-                
-                # Atualizar posições no ranking
-                self._update_ranking_positions(competition_id)
-                
-                logger.info(f"✅ Sincronização concluída: {synced} sucessos, {errors} erros")
-                
-                return {
-                    'synced': synced,
-                    'errors': errors,
-                    'total': len(participants)
-                }
-                
         except Exception as e:
             logger.error(f"❌ Erro na sincronização geral da competição {competition_id}: {e}")
             return {'synced': 0, 'errors': 1, 'total': 0}
     
-    def _update_ranking_positions(self, competition_id: int):
-        """Atualiza posições no ranking após sincronização"""
+    def _update_ranking_positions(self, competition_id: int) -> Dict:
+        """Atualiza posições no ranking após sincronização (RANK() em lote)"""
+        started = time.monotonic()
+        rows_touched = 0
         try:
-            with self.db.get_connection() as conn:
-                # Atualizar posições baseado em invites_count
-                session.execute(text(text("""
-                    UPDATE competition_participants_global_global_global 
-                    SET position = (
-                        SELECT COUNT(*) + 1 
-                        FROM competition_participants_global_global_global cp2 
-                        WHERE cp2.competition_id = competition_participants_global_global.competition_id 
-                        AND cp2.invites_count > competition_participants_global_global.invites_count
-                    )
-                    WHERE competition_id = ?
-                """, (competition_id,))
-                
-                conn.commit()
-                logger.info(f"✅ Posições do ranking atualizadas para competição {competition_id}")
+            rows_touched = self.db.recompute_ranking_positions(competition_id)
+            
+            if rows_touched is None:
+                logger.error(f"❌ Erro ao atualizar posições do ranking da competição {competition_id}")
+                rows_touched = 0
+            else:
+                logger.info(f"✅ Posições do ranking atualizadas para competição {competition_id}: {rows_touched} linhas")
                 
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar posições do ranking: {e}")
+        
+        return {
+            'rows_touched': rows_touched,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 2)
+        }
+    
+    def update_position_after_increment(self, competition_id: int, user_id: int,
+                                        old_score: int, new_score: int) -> Dict:
+        """Ajusta apenas as posições entre a pontuação antiga e a nova do usuário"""
+        started = time.monotonic()
+        rows_touched = 0
+        try:
+            rows_touched = self.db.shift_ranking_positions(competition_id, user_id, old_score, new_score)
+            
+            if rows_touched is None:
+                # Ajuste incremental falhou: recalcular tudo para não deixar posições inconsistentes
+                logger.warning(f"⚠️ Ajuste incremental de posições falhou, recalculando competição {competition_id}")
+                return self._update_ranking_positions(competition_id)
+                
+        except Exception as e:
+            logger.error(f"❌ Erro no ajuste incremental de posições: {e}")
+        
+        return {
+            'rows_touched': rows_touched,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 2)
+        }
     
     def get_sync_report(self, competition_id: int) -> Dict:
         """Gera relatório de sincronização para diagnóstico"""
@@ -189,28 +256,26 @@ class PointsSyncManager:
     def auto_sync_on_new_member(self, user_id: int, invite_link: str) -> bool:
         """Sincronização automática quando novo membro entra"""
         try:
-            # Buscar competition_id do link
-            with self.db.get_connection() as conn:
-                link_info = session.execute(text(text("""
-                    SELECT user_id as inviter_id, competition_id 
-                    FROM invite_links_global_global_global 
-                    WHERE invite_link = ? AND competition_id IS NOT NULL
-                """, (invite_link,)).fetchone()
-                
-                if not link_info:
-                    logger.warning(f"Link não encontrado ou sem competition_id: {invite_link}")
-                    return False
-                
-                inviter_id = link_info['inviter_id']
-                competition_id = link_info['competition_id']
-                
-                # Sincronizar pontos do usuário que fez o convite
+            # Dono e competition_id do link pelo registro em memória
+            link = link_registry.resolve(invite_link, self.db.get_invite_link_by_url)
+            if not link or link.competition_id is None:
+                logger.warning(f"Link não encontrado ou sem competition_id: {invite_link}")
+                return False
+            
+            inviter_id = link.owner_id
+            competition_id = link.competition_id
+            
+            # Sincronizar pontos do usuário que fez o convite
+            if self.incremental:
+                # Delta +1; divergências são corrigidas por reconcile_competition_points
+                success = self.apply_invite_delta(inviter_id, competition_id)
+            else:
                 success = self.sync_user_points(inviter_id, competition_id)
-                
-                if success:
-                    logger.info(f"🔄 Auto-sincronização: usuário {inviter_id} na competição {competition_id}")
-                
-                return success
+            
+            if success:
+                logger.info(f"🔄 Auto-sincronização: usuário {inviter_id} na competição {competition_id}")
+            
+            return success
                 
         except Exception as e:
             logger.error(f"❌ Erro na auto-sincronização: {e}")
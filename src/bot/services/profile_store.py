@@ -0,0 +1,298 @@
+"""
+Armazenamento de Perfis Comportamentais
+Perfis compactos em memória (LRU + TTL); os que saem da memória vão para o banco
+e são recarregados sob demanda
+"""
+import logging
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.config.settings import settings
+from src.database.bloom_filter import ScalableBloomFilter
+
+logger = logging.getLogger(__name__)
+
+class UserBehaviorProfile:
+    """Perfil de comportamento do usuário (registro com __slots__, intervalos em array)"""
+
+    __slots__ = ('user_id', 'join_frequency', 'leave_frequency', 'invite_pattern_score',
+                 'time_between_actions', 'suspicious_indicators', 'risk_score', 'last_seen')
+
+    MAX_INTERVALS = 10
+    MAX_INDICATORS = 10
+
+    def __init__(self, user_id: int, join_frequency: float = 0.0, leave_frequency: float = 0.0,
+                 invite_pattern_score: float = 0.0, time_between_actions: Optional[List[float]] = None,
+                 suspicious_indicators: Optional[List[str]] = None, risk_score: float = 0.0,
+                 last_seen: Optional[float] = None):
+        self.user_id = user_id
+        self.join_frequency = join_frequency  # Joins por hora
+        self.leave_frequency = leave_frequency  # Leaves por hora
+        self.invite_pattern_score = invite_pattern_score  # Score do padrão de convites
+        self.time_between_actions = array('d', (time_between_actions or [])[-self.MAX_INTERVALS:])  # Segundos
+        self.suspicious_indicators = list((suspicious_indicators or [])[-self.MAX_INDICATORS:])
+        self.risk_score = risk_score
+        self.last_seen = last_seen if last_seen is not None else time.time()
+
+    def add_interval(self, seconds: float):
+        """Registra o tempo desde a ação anterior, mantendo apenas os últimos"""
+        self.time_between_actions.append(seconds)
+        if len(self.time_between_actions) > self.MAX_INTERVALS:
+            del self.time_between_actions[0]
+
+    def add_indicator(self, indicator: str):
+        """Registra um indicador suspeito, mantendo apenas os últimos"""
+        self.suspicious_indicators.append(indicator)
+        if len(self.suspicious_indicators) > self.MAX_INDICATORS:
+            del self.suspicious_indicators[0]
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def size(self) -> int:
+        """Tamanho aproximado em bytes"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.time_between_actions)
+                + sys.getsizeof(self.suspicious_indicators)
+                + sum(sys.getsizeof(indicator) for indicator in self.suspicious_indicators))
+
+    def to_row(self) -> Dict[str, Any]:
+        """Formato de linha de user_behavior_profiles_global_global"""
+        return {
+            'user_id': self.user_id,
+            'join_frequency': self.join_frequency,
+            'leave_frequency': self.leave_frequency,
+            'invite_pattern_score': self.invite_pattern_score,
+            'time_between_actions': list(self.time_between_actions),
+            'suspicious_indicators': list(self.suspicious_indicators),
+            'risk_score': self.risk_score,
+            'last_seen': self.last_seen
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'UserBehaviorProfile':
+        return cls(
+            user_id=row['user_id'],
+            join_frequency=float(row.get('join_frequency') or 0.0),
+            leave_frequency=float(row.get('leave_frequency') or 0.0),
+            invite_pattern_score=float(row.get('invite_pattern_score') or 0.0),
+            time_between_actions=[float(x) for x in row.get('time_between_actions') or []],
+            suspicious_indicators=list(row.get('suspicious_indicators') or []),
+            risk_score=float(row.get('risk_score') or 0.0),
+            last_seen=float(row['last_seen']) if row.get('last_seen') is not None else None
+        )
+
+class ProfileStore:
+    """
+    Perfis comportamentais com memória limitada.
+
+    - No máximo `max_entries` perfis em memória; acima disso o menos usado
+      recentemente sai (LRU)
+    - Perfis sem acesso há `ttl` segundos também saem (expire())
+    - Perfis que saem ficam pendentes até flush(), que os grava no banco
+      em lote pelo `saver`; um acesso antes do flush os traz de volta
+      sem consultar o banco
+    - Um miss consulta o banco pelo `loader` antes de criar um perfil novo,
+      então o histórico do perfil não se perde com a evicção
+    - Com o índice carregado (load_index()), um usuário que nunca teve perfil
+      gravado é criado direto, sem o SELECT do loader
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None,
+                 loader: Optional[Callable[[int], Awaitable[Optional[Dict[str, Any]]]]] = None,
+                 saver: Optional[Callable[[List[Dict[str, Any]]], Awaitable[bool]]] = None):
+        self.max_entries = max_entries or settings.FRAUD_PROFILE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else settings.FRAUD_PROFILE_TTL
+        self.loader = loader
+        self.saver = saver
+
+        # Pares (user_id, 0) dos perfis gravados: "não está" dispensa o loader
+        self.index: Optional[ScalableBloomFilter] = None
+        self._index_backlog: Optional[List[int]] = None
+
+        self.profiles: "OrderedDict[int, UserBehaviorProfile]" = OrderedDict()
+        self.pending: "OrderedDict[int, UserBehaviorProfile]" = OrderedDict()
+        self.last_sweep = time.monotonic()
+
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "reloads": 0,
+            "revived": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "spilled": 0,
+            "spill_failures": 0,
+            "dropped": 0,
+            "skipped_loads": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.profiles
+
+    def peek(self, user_id: int) -> Optional[UserBehaviorProfile]:
+        """Perfil em memória, sem alterar a ordem LRU nem consultar o banco"""
+        return self.profiles.get(user_id) or self.pending.get(user_id)
+
+    def _is_expired(self, profile: UserBehaviorProfile, now: float) -> bool:
+        return now - profile.last_seen >= self.ttl
+
+    def _spill(self, user_id: int, counter: str):
+        profile = self.profiles.pop(user_id)
+        self.pending[user_id] = profile
+        self.metrics[counter] += 1
+
+    def _insert(self, profile: UserBehaviorProfile):
+        self.profiles[profile.user_id] = profile
+        while len(self.profiles) > self.max_entries:
+            self._spill(next(iter(self.profiles)), "evictions")
+
+    async def get(self, user_id: int, create: bool = True) -> Optional[UserBehaviorProfile]:
+        """Perfil do usuário: memória, pendentes, banco ou novo (se create)"""
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            if not self._is_expired(profile, time.time()):
+                self.metrics["hits"] += 1
+                self.profiles.move_to_end(user_id)
+                profile.touch()
+                return profile
+            self._spill(user_id, "expirations")
+
+        self.metrics["misses"] += 1
+        profile = self.pending.pop(user_id, None)
+        if profile is not None:
+            self.metrics["revived"] += 1
+        elif self.index is not None and not self.index.might_contain(user_id, 0):
+            self.metrics["skipped_loads"] += 1
+        elif self.loader:
+            row = await self.loader(user_id)
+            # Outra tarefa pode ter carregado o mesmo perfil durante a consulta
+            if user_id in self.profiles:
+                self.profiles.move_to_end(user_id)
+                return self.profiles[user_id]
+            if row:
+                profile = UserBehaviorProfile.from_row(row)
+                self.metrics["reloads"] += 1
+
+        if profile is None:
+            if not create:
+                return None
+            profile = UserBehaviorProfile(user_id)
+            self.metrics["created"] += 1
+
+        profile.touch()
+        self._insert(profile)
+        return profile
+
+    def expire(self) -> int:
+        """Move para os pendentes os perfis sem acesso há mais de ttl"""
+        now = time.time()
+        expired = 0
+        # A ordem LRU é a ordem de último acesso: basta olhar o começo
+        while self.profiles:
+            user_id, profile = next(iter(self.profiles.items()))
+            if not self._is_expired(profile, now):
+                break
+            self._spill(user_id, "expirations")
+            expired += 1
+        self.last_sweep = time.monotonic()
+        return expired
+
+    async def flush(self) -> int:
+        """Grava os perfis pendentes no banco; retorna quantos foram gravados"""
+        if not self.pending:
+            return 0
+
+        batch = self.pending
+        self.pending = OrderedDict()
+
+        if self.saver is None:
+            self.metrics["dropped"] += len(batch)
+            return 0
+
+        if await self.saver([profile.to_row() for profile in batch.values()]):
+            self._index_saved(batch.keys())
+            self.metrics["spilled"] += len(batch)
+            return len(batch)
+
+        # Falha: devolve para a próxima tentativa sem sobrescrever perfis
+        # revividos entretanto, e sem deixar os pendentes crescerem sem limite
+        self.metrics["spill_failures"] += 1
+        for user_id, profile in batch.items():
+            if user_id not in self.profiles and user_id not in self.pending:
+                self.pending[user_id] = profile
+        while len(self.pending) > self.max_entries:
+            self.pending.popitem(last=False)
+            self.metrics["dropped"] += 1
+        return 0
+
+    def _index_saved(self, user_ids):
+        if self.index is not None:
+            for user_id in user_ids:
+                self.index.add(user_id, 0)
+        elif self._index_backlog is not None:
+            # Gravados durante a carga do índice: entram quando ela terminar
+            self._index_backlog.extend(user_ids)
+
+    async def load_index(self, id_loader: Callable[[int, int], Awaitable[List[int]]],
+                         chunk_size: int = 50000) -> bool:
+        """Monta o índice dos perfis gravados lendo os user_ids em blocos (keyset)"""
+        index = ScalableBloomFilter(settings.FRAUD_PROFILE_INDEX_CAPACITY, settings.FRAUD_PROFILE_INDEX_FPR)
+        self._index_backlog = []
+        after_user_id = 0
+        try:
+            while True:
+                user_ids = await id_loader(after_user_id, chunk_size)
+                if not user_ids:
+                    break
+                ids = np.asarray(user_ids, dtype=np.int64)
+                index.add_many(ids, np.zeros_like(ids))
+                after_user_id = user_ids[-1]
+        except Exception as e:
+            logger.error(f"❌ Erro ao montar índice de perfis gravados: {e}")
+            return False
+        finally:
+            backlog, self._index_backlog = self._index_backlog, None
+
+        for user_id in backlog:
+            index.add(user_id, 0)
+        self.index = index
+        logger.info(f"✅ Índice de perfis comportamentais pronto: {len(index):,} perfis gravados")
+        return True
+
+    async def maintain(self, sweep_interval: float = 60.0) -> int:
+        """Expira perfis (no máximo a cada sweep_interval) e grava os pendentes"""
+        if time.monotonic() - self.last_sweep >= sweep_interval:
+            self.expire()
+        return await self.flush()
+
+    def memory_bytes(self) -> int:
+        """Memória aproximada ocupada pelos perfis e pelos mapas"""
+        return (sys.getsizeof(self.profiles) + sys.getsizeof(self.pending)
+                + sum(profile.size() for profile in self.profiles.values())
+                + sum(profile.size() for profile in self.pending.values()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ocupação, memória estimada e contadores"""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        memory = self.memory_bytes()
+        resident = len(self.profiles) + len(self.pending)
+        return {
+            "profiles": len(self.profiles),
+            "max_profiles": self.max_entries,
+            "pending_spill": len(self.pending),
+            "ttl_seconds": self.ttl,
+            "memory_bytes": memory,
+            "avg_profile_bytes": round(memory / resident) if resident else 0,
+            "hit_rate_percent": round(self.metrics["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "index_ready": self.index is not None,
+            **self.metrics
+        }
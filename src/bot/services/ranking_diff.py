@@ -0,0 +1,163 @@
+"""
+Diff de Ranking
+Compara snapshots do ranking em O(n) e gera eventos de mudança tipados
+"""
+import json
+import logging
+import os
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCORE_MILESTONES = (1000, 2500, 5000, 7500, 10000, 15000, 20000)
+
+class RankingChangeType(str, Enum):
+    NEW_LEADER = "new_leader"
+    ENTERED_PODIUM = "entered_podium"
+    ENTERED_TOP = "entered_top"
+    BIG_JUMP = "big_jump"
+    MILESTONE = "milestone"
+
+@dataclass
+class RankingChange:
+    """Evento de mudança no ranking"""
+    type: RankingChangeType
+    user: Dict[str, Any]
+    position: int
+    invites: int
+    previous_position: Optional[int] = None
+    milestone: Optional[int] = None
+
+    @property
+    def positions_gained(self) -> int:
+        return self.previous_position - self.position if self.previous_position else 0
+
+class RankingSnapshot:
+    """
+    Foto do ranking indexada por user_id -> (posição, pontos).
+
+    `complete` indica que o snapshot contém todos os participantes (o ranking
+    tinha menos linhas que o limite consultado); caso contrário, quem está
+    fora dele tinha no máximo `cutoff_score` pontos.
+    """
+
+    def __init__(self, entries: Dict[int, Tuple[int, int]], complete: bool = True):
+        self.entries = entries
+        self.complete = complete
+        self.cutoff_score = min((score for _, score in entries.values()), default=0)
+
+    @classmethod
+    def from_ranking(cls, ranking: Sequence[Dict[str, Any]], limit: int) -> 'RankingSnapshot':
+        entries = {
+            user['user_id']: (position, user.get('invites_count', 0) or 0)
+            for position, user in enumerate(ranking, 1)
+        }
+        return cls(entries, complete=len(ranking) < limit)
+
+    def get(self, user_id: int) -> Optional[Tuple[int, int]]:
+        return self.entries.get(user_id)
+
+    def previous_score_bound(self, user_id: int) -> int:
+        """Pontos anteriores do usuário (ou o maior valor possível, se não estava no snapshot)"""
+        entry = self.entries.get(user_id)
+        if entry:
+            return entry[1]
+        return 0 if self.complete else self.cutoff_score
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "complete": self.complete,
+            "entries": [[user_id, position, score] for user_id, (position, score) in self.entries.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RankingSnapshot':
+        entries = {int(user_id): (int(position), int(score)) for user_id, position, score in data.get("entries", [])}
+        return cls(entries, complete=bool(data.get("complete", True)))
+
+def diff_rankings(previous: RankingSnapshot, current: Sequence[Dict[str, Any]], top_k: int = 10,
+                  podium_size: int = 3, big_jump: int = 3,
+                  milestones: Sequence[int] = SCORE_MILESTONES) -> List[RankingChange]:
+    """
+    Mudanças entre o snapshot anterior e o ranking atual.
+
+    Uma passada sobre o ranking atual com busca O(1) no índice anterior;
+    os marcos cruzados saem por busca binária na lista de marcos.
+    Mudanças de posição só são reportadas dentro do TOP top_k.
+    """
+    changes = []
+    milestones = sorted(milestones)
+
+    for position, user in enumerate(current, 1):
+        invites = user.get('invites_count', 0) or 0
+        entry = previous.get(user['user_id'])
+        previous_position = entry[0] if entry else None
+
+        if position <= top_k:
+            if previous_position is None or previous_position > top_k:
+                changes.append(RankingChange(RankingChangeType.ENTERED_TOP, user, position, invites, previous_position))
+            elif previous_position != position:
+                if position == 1:
+                    change_type = RankingChangeType.NEW_LEADER
+                elif position <= podium_size < previous_position:
+                    change_type = RankingChangeType.ENTERED_PODIUM
+                elif previous_position - position >= big_jump:
+                    change_type = RankingChangeType.BIG_JUMP
+                else:
+                    change_type = None
+                if change_type:
+                    changes.append(RankingChange(change_type, user, position, invites, previous_position))
+
+        previous_invites = previous.previous_score_bound(user['user_id'])
+        if invites > previous_invites:
+            for milestone in milestones[bisect_right(milestones, previous_invites):bisect_right(milestones, invites)]:
+                changes.append(RankingChange(RankingChangeType.MILESTONE, user, position, invites,
+                                             previous_position, milestone=milestone))
+
+    return changes
+
+class RankingSnapshotStore:
+    """Persiste os snapshots por competição em um arquivo JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[int, RankingSnapshot]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {int(competition_id): RankingSnapshot.from_dict(snapshot)
+                    for competition_id, snapshot in data.get("competitions", {}).items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"⚠️ Snapshot de ranking ilegível, ignorando: {e}")
+            return {}
+
+    def save(self, snapshots: Dict[int, RankingSnapshot]):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            data = {
+                "saved_at": datetime.now().isoformat(),
+                "competitions": {str(competition_id): snapshot.to_dict()
+                                 for competition_id, snapshot in snapshots.items()}
+            }
+            # Escrita atômica: um restart no meio da gravação não corrompe o arquivo
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"❌ Erro ao salvar snapshot de ranking: {e}")
@@ -2,218 +2,278 @@
 Serviço de Notificações de Ranking
 Monitora mudanças no ranking e envia notificações automáticas
 """
+import asyncio
 import logging
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE
-from typing import List, Dict, Optional, Tuple
+from typing import Any, List, Dict, Optional, Tuple
 from telegram import Bot
 from telegram.error import TelegramError
 
 from src.config.settings import settings
 from src.database.models import DatabaseManager
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
+from src.bot.services.milestone_ledger import GLOBAL_SCOPE, MilestoneLedger
+from src.bot.services.ranking_diff import (
+    RankingChange, RankingChangeType, RankingSnapshot, RankingSnapshotStore, diff_rankings
+)
 
 logger = logging.getLogger(__name__)
 
 class RankingNotifier:
-    def __init__(self, db_manager: DatabaseManager, bot: Bot):
+    COMPETITION_MILESTONES = (10, 25, 50, 75, 90)  # % da meta
+    
+    def __init__(self, db_manager: DatabaseManager, bot: Bot, competition_manager=None, *,
+                 scheduler: MessageScheduler, milestone_ledger: MilestoneLedger = None):
         self.db = db_manager
         self.bot = bot
-        self.last_ranking = {}  # Cache do último ranking por competição
+        self.scheduler = scheduler
+        self.competition_manager = competition_manager
+        self.milestone_ledger = milestone_ledger or MilestoneLedger(db_manager)
+        
+        # Snapshot anterior por competição (persistido para sobreviver a restarts)
+        self.snapshot_size = settings.RANKING_SNAPSHOT_SIZE
+        self.top_k = settings.RANKING_NOTIFY_TOP_K
+        self.snapshot_store = RankingSnapshotStore(settings.RANKING_SNAPSHOT_PATH)
+        self.snapshots: Dict[int, RankingSnapshot] = self.snapshot_store.load()
+        
+        # Debounce: cada convite só marca a competição como alterada; a
+        # avaliação roda no máximo uma vez por janela
+        self.debounce_seconds = settings.RANKING_NOTIFY_DEBOUNCE_SECONDS
+        self.pending_evaluations: Dict[int, asyncio.Task] = {}
+        self.metrics = {
+            "marks": 0,
+            "evaluations_run": 0,
+            "evaluations_skipped": 0,
+            "changes_detected": 0,
+            "messages_enqueued": 0,
+            "digests_sent": 0
+        }
+        
+    def _get_competition(self, competition_id: int):
+        """Competição pelo CompetitionManager quando disponível"""
+        if self.competition_manager:
+            return self.competition_manager.get_competition(competition_id)
+        return self.db.get_competition(competition_id)
+        
+    async def _get_totals(self, competition_id: int) -> Dict[str, int]:
+        """Totais da competição sem agregar o ranking"""
+        if self.competition_manager:
+            return await self.competition_manager.get_competition_totals_async(competition_id)
+        return self.db.get_competition_totals(competition_id)
+        
+    async def _get_ranking(self, competition_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """Ranking pelo leaderboard em memória quando disponível"""
+        if self.competition_manager:
+            return await self.competition_manager.get_competition_ranking_async(competition_id, limit=limit)
+        return self.db.get_competition_ranking(competition_id, limit=limit)
         
+    def mark_dirty(self, competition_id: int):
+        """Marca o ranking como alterado; a avaliação fica para o fim da janela"""
+        self.metrics["marks"] += 1
+        
+        if competition_id in self.pending_evaluations:
+            self.metrics["evaluations_skipped"] += 1
+            return
+        
+        self.pending_evaluations[competition_id] = asyncio.create_task(
+            self._evaluate_after_window(competition_id)
+        )
+    
+    async def _evaluate_after_window(self, competition_id: int):
+        await asyncio.sleep(self.debounce_seconds)
+        self.pending_evaluations.pop(competition_id, None)
+        await self.check_and_notify_ranking_changes(competition_id)
+    
+    async def stop(self):
+        """Avalia imediatamente as competições com janela pendente"""
+        pending = list(self.pending_evaluations.items())
+        self.pending_evaluations.clear()
+        
+        for competition_id, task in pending:
+            task.cancel()
+            await self.check_and_notify_ranking_changes(competition_id)
+    
+    def get_stats(self):
+        """Métricas do debounce de notificações de ranking"""
+        return {
+            "debounce_seconds": self.debounce_seconds,
+            "pending_evaluations": len(self.pending_evaluations),
+            **self.metrics
+        }
+    
     async def check_and_notify_ranking_changes(self, competition_id: int):
         """Verifica mudanças no ranking e envia notificações se necessário"""
         try:
+            self.metrics["evaluations_run"] += 1
+            
             # Obter ranking atual
-            current_ranking = self.db.get_competition_ranking(competition_id, limit=10)
+            current_ranking = await self._get_ranking(competition_id, limit=self.snapshot_size)
             
             if not current_ranking:
                 return
             
-            # Obter ranking anterior do cache
-            previous_ranking = self.last_ranking.get(competition_id, [])
+            current_snapshot = RankingSnapshot.from_ranking(current_ranking, self.snapshot_size)
+            previous_snapshot = self.snapshots.get(competition_id)
+            self.snapshots[competition_id] = current_snapshot
+            self.snapshot_store.save(self.snapshots)
             
-            # Se não há ranking anterior, apenas salvar o atual
-            if not previous_ranking:
-                self.last_ranking[competition_id] = current_ranking
+            # Sem snapshot anterior, apenas salvar o atual
+            if previous_snapshot is None:
                 return
             
-            # Detectar mudanças significativas
-            changes = self._detect_ranking_changes(previous_ranking, current_ranking)
+            changes = diff_rankings(previous_snapshot, current_ranking, top_k=self.top_k)
             
-            # Enviar notificações para cada mudança
-            for change in changes:
-                await self._send_ranking_notification(competition_id, change)
+            # Marcos passam pelo livro: já anunciados (aqui ou pelo CompetitionManager) são descartados
+            changes = [
+                change for change in changes
+                if change.type != RankingChangeType.MILESTONE
+                or self.milestone_ledger.claim(competition_id, change.user['user_id'], [change.milestone])
+            ]
+            self.metrics["changes_detected"] += len(changes)
             
-            # Atualizar cache
-            self.last_ranking[competition_id] = current_ranking
+            # Uma mudança usa a mensagem específica; várias viram um resumo único
+            if len(changes) == 1:
+                await self._send_ranking_notification(competition_id, changes[0])
+            elif changes:
+                await self._send_ranking_digest(competition_id, changes)
             
         except Exception as e:
             logger.error(f"Erro ao verificar mudanças no ranking: {e}")
     
-    def _detect_ranking_changes(self, previous: List[Dict], current: List[Dict]) -> List[Dict]:
-        """Detecta mudanças significativas no ranking"""
-        changes = []
-        
-        # Criar mapeamentos para facilitar comparação
-        prev_positions = {user['user_id']: i+1 for i, user in enumerate(previous)}
-        curr_positions = {user['user_id']: i+1 for i, user in enumerate(current)}
+    def _display_name(self, user: Dict) -> str:
+        username = user.get('username', '')
+        return f"@{username}" if username else user.get('first_name', 'Usuário')
+    
+    def _format_digest_line(self, change: RankingChange) -> str:
+        """Linha do resumo para uma mudança no ranking"""
+        name = self._display_name(change.user)
         
-        # Verificar mudanças para cada usuário no ranking atual
-        for i, user in enumerate(current):
-            user_id = user['user_id']
-            current_pos = i + 1
-            previous_pos = prev_positions.get(user_id)
-            
-            # Novo no TOP 10
-            if previous_pos is None:
-                changes.append({
-                    'type': 'new_in_top10',
-                    'user': user,
-                    'position': current_pos,
-                    'invites': user.get('invites_count', 0)
-                })
+        if change.type == RankingChangeType.NEW_LEADER:
+            return f"👑 **{name}** assumiu a liderança ({change.invites:,} pontos)"
+        if change.type == RankingChangeType.ENTERED_PODIUM:
+            medal = "🥇" if change.position == 1 else "🥈" if change.position == 2 else "🥉"
+            return f"{medal} **{name}** entrou no TOP 3: {change.previous_position}º → {change.position}º"
+        if change.type == RankingChangeType.ENTERED_TOP:
+            return f"⭐ **{name}** entrou no TOP {self.top_k} em {change.position}º ({change.invites:,} pontos)"
+        if change.type == RankingChangeType.BIG_JUMP:
+            return f"🚀 **{name}** subiu {change.positions_gained} posições: {change.previous_position}º → {change.position}º"
+        if change.type == RankingChangeType.MILESTONE:
+            return f"🎯 **{name}** alcançou {change.milestone:,} pontos"
+        return ""
+    
+    async def _send_ranking_digest(self, competition_id: int, changes: List[RankingChange]):
+        """Envia todas as mudanças da janela em uma única mensagem"""
+        try:
+            competition = self._get_competition(competition_id)
+            if not competition:
+                return
             
-            # Mudança de posição significativa
-            elif previous_pos != current_pos:
-                position_change = previous_pos - current_pos  # Positivo = subiu
-                
-                # Novo líder
-                if current_pos == 1 and previous_pos > 1:
-                    changes.append({
-                        'type': 'new_leader',
-                        'user': user,
-                        'previous_position': previous_pos,
-                        'invites': user.get('invites_count', 0)
-                    })
-                
-                # Entrada no pódio (TOP 3)
-                elif current_pos <= 3 and previous_pos > 3:
-                    changes.append({
-                        'type': 'entered_podium',
-                        'user': user,
-                        'position': current_pos,
-                        'previous_position': previous_pos,
-                        'invites': user.get('invites_count', 0)
-                    })
-                
-                # Grande salto (subiu 3+ posições)
-                elif position_change >= 3:
-                    changes.append({
-                        'type': 'big_jump',
-                        'user': user,
-                        'position': current_pos,
-                        'previous_position': previous_pos,
-                        'positions_gained': position_change,
-                        'invites': user.get('invites_count', 0)
-                    })
-        
-        # Verificar marcos de pontuação
-        for user in current:
-            invites = user.get('invites_count', 0)
-            user_id = user['user_id']
-            
-            # Encontrar usuário anterior para comparar pontos
-            prev_user = next((u for u in previous if u['user_id'] == user_id), None)
-            prev_invites = prev_user.get('invites_count', 0) if prev_user else 0
-            
-            # Verificar marcos importantes
-            milestones = [1000, 2500, 5000, 7500, 10000, 15000, 20000]
-            for milestone in milestones:
-                if prev_invites < milestone <= invites:
-                    changes.append({
-                        'type': 'milestone',
-                        'user': user,
-                        'milestone': milestone,
-                        'position': curr_positions.get(user_id, 11),
-                        'invites': invites
-                    })
-        
-        return changes
+            lines = [line for line in (self._format_digest_line(change) for change in changes) if line]
+            if not lines:
+                return
+            
+            message = "📊 **ATUALIZAÇÃO DO RANKING** 📊\n\n" + "\n".join(lines)
+            message += f"\n\n🔥 **Competição:** {competition.name}\n\nUse /meulink para subir no ranking! 🚀"
+            
+            if await self.scheduler.send_message(
+                chat_id=settings.CHAT_ID,
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING
+            ):
+                self.metrics["messages_enqueued"] += 1
+                self.metrics["digests_sent"] += 1
+            
+            logger.info(f"Resumo de ranking enviado: {len(lines)} mudanças")
+            
+        except Exception as e:
+            logger.error(f"Erro ao enviar resumo de ranking: {e}")
     
-    async def _send_ranking_notification(self, competition_id: int, change: Dict):
+    async def _send_ranking_notification(self, competition_id: int, change: RankingChange):
         """Envia notificação específica para uma mudança no ranking"""
         try:
             # Obter informações da competição
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
-            user = change['user']
+            user = change.user
             username = user.get('username', '')
             first_name = user.get('first_name', 'Usuário')
             display_name = f"@{username}" if username else first_name
             
             message = ""
             
-            if change['type'] == 'new_leader':
+            if change.type == RankingChangeType.NEW_LEADER:
                 message = f"""🏆 **NOVO LÍDER!** 🏆
 
 👑 **{display_name}** assumiu a liderança!
 
 📊 **Estatísticas:**
 • **Posição:** 1º lugar 🥇
-• **Pontos:** {change['invites']:,}
-• **Posição anterior:** {change['previous_position']}º
+• **Pontos:** {change.invites:,}
+• **Posição anterior:** {change.previous_position}º
 
 🔥 **Competição:** {competition.name}
 
 Parabéns pela conquista! Continue assim! 🚀"""
 
-            elif change['type'] == 'entered_podium':
-                medal = "🥇" if change['position'] == 1 else "🥈" if change['position'] == 2 else "🥉"
+            elif change.type == RankingChangeType.ENTERED_PODIUM:
+                medal = "🥇" if change.position == 1 else "🥈" if change.position == 2 else "🥉"
                 message = f"""🏅 **SUBIU PARA O PÓDIO!** 🏅
 
 {medal} **{display_name}** entrou no TOP 3!
 
 📊 **Estatísticas:**
-• **Nova posição:** {change['position']}º {medal}
-• **Posição anterior:** {change['previous_position']}º
-• **Pontos:** {change['invites']:,}
+• **Nova posição:** {change.position}º {medal}
+• **Posição anterior:** {change.previous_position}º
+• **Pontos:** {change.invites:,}
 
 🔥 **Competição:** {competition.name}
 
 Excelente performance! 🚀"""
 
-            elif change['type'] == 'new_in_top10':
-                message = f"""⭐ **NOVO NO TOP 10!** ⭐
+            elif change.type == RankingChangeType.ENTERED_TOP:
+                message = f"""⭐ **NOVO NO TOP {self.top_k}!** ⭐
 
 🎯 **{display_name}** entrou no ranking!
 
 📊 **Estatísticas:**
-• **Posição:** {change['position']}º
-• **Pontos:** {change['invites']:,}
+• **Posição:** {change.position}º
+• **Pontos:** {change.invites:,}
 
 🔥 **Competição:** {competition.name}
 
-Bem-vindo ao TOP 10! Continue subindo! 🚀"""
+Bem-vindo ao TOP {self.top_k}! Continue subindo! 🚀"""
 
-            elif change['type'] == 'big_jump':
+            elif change.type == RankingChangeType.BIG_JUMP:
                 message = f"""🚀 **GRANDE SALTO NO RANKING!** 🚀
 
-📈 **{display_name}** subiu {change['positions_gained']} posições!
+📈 **{display_name}** subiu {change.positions_gained} posições!
 
 📊 **Estatísticas:**
-• **Nova posição:** {change['position']}º
-• **Posição anterior:** {change['previous_position']}º
-• **Pontos:** {change['invites']:,}
+• **Nova posição:** {change.position}º
+• **Posição anterior:** {change.previous_position}º
+• **Pontos:** {change.invites:,}
 
 🔥 **Competição:** {competition.name}
 
 Que escalada incrível! 🔥"""
 
-            elif change['type'] == 'milestone':
+            elif change.type == RankingChangeType.MILESTONE:
                 milestone_emojis = {
                     1000: "🎯", 2500: "🔥", 5000: "⚡", 7500: "💎", 
                     10000: "👑", 15000: "🌟", 20000: "🏆"
                 }
-                emoji = milestone_emojis.get(change['milestone'], "🎉")
+                emoji = milestone_emojis.get(change.milestone, "🎉")
                 
                 message = f"""{emoji} **MARCO ATINGIDO!** {emoji}
 
-🎊 **{display_name}** alcançou {change['milestone']:,} pontos!
+🎊 **{display_name}** alcançou {change.milestone:,} pontos!
 
 📊 **Estatísticas:**
-• **Posição atual:** {change['position']}º
-• **Total de pontos:** {change['invites']:,}
+• **Posição atual:** {change.position}º
+• **Total de pontos:** {change.invites:,}
 
 🔥 **Competição:** {competition.name}
 
@@ -221,40 +281,45 @@ Conquista incrível! Continue assim! 🚀"""
 
             # Enviar mensagem no canal
             if message:
-                await self.bot.send_message(
+                if await self.scheduler.send_message(
                     chat_id=settings.CHAT_ID,
-                    VARCHAR=message,
-                    parse_mode='Markdown'
-                )
+                    text=message,
+                    parse_mode='Markdown',
+                    priority=MessagePriority.RANKING
+                ):
+                    self.metrics["messages_enqueued"] += 1
                 
-                logger.info(f"Notificação de ranking enviada: {change['type']} para {display_name}")
+                logger.info(f"Notificação de ranking enviada: {change.type.value} para {display_name}")
                 
         except TelegramError as e:
             logger.error(f"Erro ao enviar notificação de ranking: {e}")
         except Exception as e:
             logger.error(f"Erro inesperado ao enviar notificação: {e}")
     
-    async def notify_competition_milestone(self, competition_id: int, total_invites: int):
-        """Notifica marcos gerais da competição"""
+    async def notify_competition_milestone(self, competition_id: int, total_invites: int, previous_total: int = None):
+        """
+        Notifica marcos gerais da competição cruzados desde o último total
+        observado; cada marco é anunciado uma única vez
+        """
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
             # Marcos da competição (baseados na meta)
             meta = competition.target_invites
-            milestones = [
-                (meta * 0.1, "10%"), (meta * 0.25, "25%"), (meta * 0.5, "50%"),
-                (meta * 0.75, "75%"), (meta * 0.9, "90%")
-            ]
+            thresholds = {int(meta * percentage / 100): percentage for percentage in self.COMPETITION_MILESTONES}
             
-            # Verificar se atingiu algum marco
-            for milestone_value, percentage in milestones:
-                if total_invites >= milestone_value:
-                    # Verificar se já foi notificado (implementar cache se necessário)
-                    message = f"""📊 **MARCO DA COMPETIÇÃO ATINGIDO!** 📊
+            claimed = self.milestone_ledger.claim_crossed(
+                competition_id, GLOBAL_SCOPE, sorted(thresholds), total_invites, old=previous_total
+            )
+            if not claimed:
+                return
+            
+            percentage = thresholds[claimed[-1]]
+            message = f"""📊 **MARCO DA COMPETIÇÃO ATINGIDO!** 📊
 
-🎯 **{percentage} da meta alcançada!**
+🎯 **{percentage}% da meta alcançada!**
 
 📈 **Progresso:**
 • **Total atual:** {total_invites:,} convites
@@ -265,12 +330,12 @@ Conquista incrível! Continue assim! 🚀"""
 
 A comunidade está crescendo! Continue participando! 🚀"""
 
-                    await self.bot.send_message(
-                        chat_id=settings.CHAT_ID,
-                        VARCHAR=message,
-                        parse_mode='Markdown'
-                    )
-                    break
+            await self.scheduler.send_message(
+                chat_id=settings.CHAT_ID,
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.COMPETITION
+            )
                     
         except Exception as e:
             logger.error(f"Erro ao notificar marco da competição: {e}")
@@ -278,7 +343,7 @@ A comunidade está crescendo! Continue participando! 🚀"""
     async def notify_special_achievements(self, competition_id: int, user_data: Dict):
         """Notifica conquistas especiais dos usuários"""
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
@@ -304,7 +369,7 @@ A comunidade está crescendo! Continue participando! 🚀"""
             round_milestones = [100, 500, 1000, 2000, 3000, 5000, 10000]
             for milestone in round_milestones:
                 if invites == milestone:
-                    if self._is_first_to_reach_milestone(competition_id, milestone):
+                    if await self._is_first_to_reach_milestone(competition_id, milestone):
                         achievements.append({
                             'type': 'first_milestone',
                             'title': 'PRIMEIRO A ATINGIR!',
@@ -337,10 +402,10 @@ A comunidade está crescendo! Continue participando! 🚀"""
         except Exception:
             return False
     
-    def _is_first_to_reach_milestone(self, competition_id: int, milestone: int) -> bool:
+    async def _is_first_to_reach_milestone(self, competition_id: int, milestone: int) -> bool:
         """Verifica se é o primeiro a atingir um marco específico"""
         try:
-            ranking = self.db.get_competition_ranking(competition_id, limit=100)
+            ranking = await self._get_ranking(competition_id, limit=100)
             users_global_global_at_milestone = [u for u in ranking if u.get('invites_count', 0) >= milestone]
             return len(users_global_global_at_milestone) == 1
         except Exception:
@@ -373,10 +438,11 @@ A comunidade está crescendo! Continue participando! 🚀"""
 
 🎉 **Conquista desbloqueada!** Continue assim! 🚀"""
 
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.CHAT_ID,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING
             )
             
         except Exception as e:
@@ -385,7 +451,7 @@ A comunidade está crescendo! Continue participando! 🚀"""
     async def notify_competition_events(self, competition_id: int, event_type: str, data: Dict = None):
         """Notifica eventos especiais da competição"""
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
@@ -433,10 +499,11 @@ Ainda há tempo para subir no ranking! 🚀"""
 Qualquer convite pode mudar o pódio! 🎯"""
 
             if message:
-                await self.bot.send_message(
+                await self.scheduler.send_message(
                     chat_id=settings.CHAT_ID,
-                    VARCHAR=message,
-                    parse_mode='Markdown'
+                    text=message,
+                    parse_mode='Markdown',
+                    priority=MessagePriority.COMPETITION
                 )
                 
         except Exception as e:
@@ -445,14 +512,15 @@ Qualquer convite pode mudar o pódio! 🎯"""
     async def notify_daily_summary(self, competition_id: int):
         """Envia resumo diário da competição"""
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
             # Obter estatísticas do dia
-            ranking = self.db.get_competition_ranking(competition_id, limit=5)
-            total_participants = len(self.db.get_competition_ranking(competition_id, limit=1000))
-            total_invites = sum(user.get('invites_count', 0) for user in ranking) if ranking else 0
+            ranking = await self._get_ranking(competition_id, limit=5)
+            totals = await self._get_totals(competition_id)
+            total_participants = totals['total_participants']
+            total_invites = totals['total_invites']
             
             # TOP 3 do dia
             top3_text = ""
@@ -480,10 +548,12 @@ Qualquer convite pode mudar o pódio! 🎯"""
 🔥 **Continue participando!** 
 Use /meulink para gerar seu link! 🚀"""
 
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.CHAT_ID,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.RANKING,
+                coalesce_key='daily_summary'
             )
             
         except Exception as e:
@@ -492,13 +562,13 @@ Use /meulink para gerar seu link! 🚀"""
 
     def reset_ranking_cache(self, competition_id: int):
         """Reseta o cache do ranking para uma competição"""
-        if competition_id in self.last_ranking:
-            del self.last_ranking[competition_id]
+        if self.snapshots.pop(competition_id, None) is not None:
+            self.snapshot_store.save(self.snapshots)
     
     async def check_competition_events(self, competition_id: int):
         """Verifica e notifica eventos especiais da competição"""
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
@@ -518,8 +588,7 @@ Use /meulink para gerar seu link! 🚀"""
             
             # Meio da competição (50%)
             if 0.48 <= progress_percentage <= 0.52:
-                ranking = self.db.get_competition_ranking(competition_id, limit=100)
-                total_invites = sum(user.get('invites_count', 0) for user in ranking) if ranking else 0
+                total_invites = (await self._get_totals(competition_id))['total_invites']
                 progress = (total_invites / competition.target_invites) * 100
                 
                 await self.notify_competition_events(competition_id, 'halfway_point', {
@@ -528,7 +597,7 @@ Use /meulink para gerar seu link! 🚀"""
             
             # Reta final (últimas 24h)
             elif time_left.total_seconds() <= 86400:  # 24 horas
-                ranking = self.db.get_competition_ranking(competition_id, limit=1)
+                ranking = await self._get_ranking(competition_id, limit=1)
                 leader_name = "Nenhum líder"
                 if ranking:
                     leader = ranking[0]
@@ -539,7 +608,7 @@ Use /meulink para gerar seu link! 🚀"""
                 })
             
             # Verificar disputa acirrada no TOP 3
-            ranking = self.db.get_competition_ranking(competition_id, limit=3)
+            ranking = await self._get_ranking(competition_id, limit=3)
             if len(ranking) >= 3:
                 first_points = ranking[0].get('invites_count', 0)
                 third_points = ranking[2].get('invites_count', 0)
@@ -558,7 +627,7 @@ Use /meulink para gerar seu link! 🚀"""
     async def send_motivation_message(self, competition_id: int):
         """Envia mensagem motivacional aleatória"""
         try:
-            competition = self.db.get_competition(competition_id)
+            competition = self._get_competition(competition_id)
             if not competition:
                 return
             
@@ -574,10 +643,11 @@ Use /meulink para gerar seu link! 🚀"""
             message = random.choice(motivational_messages)
             message += f"\n\n🏆 **{competition.name}**\nUse /meulink para participar!"
             
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.CHAT_ID,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.MOTIVATIONAL
             )
             
         except Exception as e:
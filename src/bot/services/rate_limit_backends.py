@@ -0,0 +1,224 @@
+"""
+Backends de Rate Limit
+Janela deslizante em memória (LRU por chave) e no Redis (script Lua atômico);
+sem dependências do resto do bot para poder ser testado isoladamente
+"""
+import math
+import time
+from typing import Dict, Optional, Any, Tuple
+from dataclasses import dataclass
+from enum import Enum
+from collections import OrderedDict
+
+class RateLimitType(Enum):
+    """Tipos de rate limiting"""
+    INVITE_ATTEMPTS = "invite_attempts"
+    LINK_CREATION = "link_creation"
+    RANKING_REQUESTS = "ranking_requests"
+    ADMIN_COMMANDS = "admin_commands"
+    API_CALLS = "api_calls"
+    FRAUD_ATTEMPTS = "fraud_attempts"
+
+@dataclass
+class RateLimit:
+    """Configuração de rate limit"""
+    limit_type: RateLimitType
+    max_requests: int
+    window_seconds: int
+    burst_allowance: int  # Rajadas permitidas
+    cooldown_seconds: int  # Tempo de cooldown após limite
+
+@dataclass
+class RateLimitDecision:
+    """Resultado de um passo da janela deslizante"""
+    is_limited: bool
+    count: float             # estimativa de requisições na janela
+    cooldown_until: float    # epoch; 0 = sem cooldown
+    window_start: float      # epoch do início da janela atual
+
+class _WindowState:
+    """Contador de janela deslizante: O(1) de memória por chave"""
+    __slots__ = ('window', 'current', 'previous', 'cooldown_until', 'expires_at')
+
+    def __init__(self):
+        self.window = -1
+        self.current = 0
+        self.previous = 0
+        self.cooldown_until = 0.0
+        self.expires_at = 0.0
+
+def _state_ttl(rate_limit: RateLimit) -> float:
+    """Tempo sem acesso após o qual o estado da chave não influencia mais nada"""
+    return max(2 * rate_limit.window_seconds, rate_limit.cooldown_seconds)
+
+def _sliding_window_step(state: _WindowState, now: float, rate_limit: RateLimit,
+                         increment: bool) -> RateLimitDecision:
+    """
+    Contador de janela deslizante: a contagem estimada é a janela atual mais
+    a anterior ponderada pela fração ainda coberta. Mesma lógica do script Lua.
+    """
+    window = rate_limit.window_seconds
+    if state.cooldown_until > now:
+        return RateLimitDecision(True, rate_limit.max_requests, state.cooldown_until, state.window * window)
+
+    index = math.floor(now / window)
+    if state.window != index:
+        state.previous = state.current if state.window == index - 1 else 0
+        state.current = 0
+        state.window = index
+
+    elapsed = now - index * window
+    estimate = state.previous * (window - elapsed) / window + state.current
+
+    limited = estimate >= rate_limit.max_requests
+    if limited:
+        state.cooldown_until = now + rate_limit.cooldown_seconds
+    elif increment:
+        state.current += 1
+        estimate += 1
+
+    state.expires_at = now + _state_ttl(rate_limit)
+    return RateLimitDecision(limited, estimate, state.cooldown_until if limited else 0.0, index * window)
+
+class InMemoryRateLimitBackend:
+    """
+    Estado por (usuário, tipo) em um OrderedDict em ordem de uso: chaves
+    ociosas expiram e, acima de max_keys, as menos usadas são descartadas.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.states: "OrderedDict[Tuple[int, str], _WindowState]" = OrderedDict()
+        self.evictions = 0
+
+    async def hit(self, user_id: int, rate_limit: RateLimit, now: float, increment: bool) -> RateLimitDecision:
+        key = (user_id, rate_limit.limit_type.value)
+        state = self.states.get(key)
+        if state is None or state.expires_at <= now:
+            state = _WindowState()
+            self.states[key] = state
+        self.states.move_to_end(key)
+
+        decision = _sliding_window_step(state, now, rate_limit, increment)
+        self._evict(now)
+        return decision
+
+    def _evict(self, now: float):
+        # Chave mais antiga primeiro: expiradas saem de graça, o resto só acima do limite
+        while self.states:
+            key, state = next(iter(self.states.items()))
+            if state.expires_at > now and len(self.states) <= self.max_keys:
+                break
+            del self.states[key]
+            self.evictions += 1
+
+    async def reset(self, user_id: int, limit_type: RateLimitType):
+        self.states.pop((user_id, limit_type.value), None)
+
+    async def cleanup(self, now: float) -> int:
+        expired = [key for key, state in self.states.items() if state.expires_at <= now]
+        for key in expired:
+            del self.states[key]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def active_keys(self, limit_type: RateLimitType = None, now: float = None) -> Optional[int]:
+        if limit_type is None:
+            return len(self.states)
+        now = now or time.time()
+        return sum(1 for (_, lt), state in self.states.items() if lt == limit_type.value and state.expires_at > now)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'keys': len(self.states),
+            'max_keys': self.max_keys,
+            'evictions': self.evictions
+        }
+
+# Mesmo algoritmo de _sliding_window_step, executado atomicamente no Redis
+SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local max_requests = tonumber(ARGV[3])
+local cooldown = tonumber(ARGV[4])
+local increment = tonumber(ARGV[5])
+local ttl_ms = tonumber(ARGV[6])
+
+local function num(value)
+    return string.format('%.17g', value)
+end
+
+local state = redis.call('HMGET', key, 'win', 'cur', 'prev', 'cd')
+local win = tonumber(state[1]) or -1
+local cur = tonumber(state[2]) or 0
+local prev = tonumber(state[3]) or 0
+local cooldown_until = tonumber(state[4]) or 0
+
+if cooldown_until > now then
+    return {1, num(max_requests), num(cooldown_until), num(win * window)}
+end
+
+local index = math.floor(now / window)
+if win ~= index then
+    if win == index - 1 then prev = cur else prev = 0 end
+    cur = 0
+    win = index
+end
+
+local elapsed = now - index * window
+local estimate = prev * (window - elapsed) / window + cur
+local limited = 0
+if estimate >= max_requests then
+    limited = 1
+    cooldown_until = now + cooldown
+else
+    cooldown_until = 0
+    if increment == 1 then
+        cur = cur + 1
+        estimate = estimate + 1
+    end
+end
+
+redis.call('HSET', key, 'win', win, 'cur', cur, 'prev', prev, 'cd', num(cooldown_until))
+redis.call('PEXPIRE', key, ttl_ms)
+return {limited, num(estimate), num(cooldown_until), num(index * window)}
+"""
+
+class RedisRateLimitBackend:
+    """
+    Estado compartilhado entre processos: um hash por chave atualizado por
+    script Lua (atômico) e expirado pelo próprio Redis quando ocioso.
+    """
+
+    def __init__(self, client=None, url: str = None, prefix: str = "ratelimit"):
+        if client is None:
+            import redis.asyncio as redis_asyncio
+            client = redis_asyncio.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(SLIDING_WINDOW_LUA)
+
+    def _key(self, user_id: int, limit_type: RateLimitType) -> str:
+        return f"{self.prefix}:{limit_type.value}:{user_id}"
+
+    async def hit(self, user_id: int, rate_limit: RateLimit, now: float, increment: bool) -> RateLimitDecision:
+        limited, count, cooldown_until, window_start = await self.script(
+            keys=[self._key(user_id, rate_limit.limit_type)],
+            args=[now, rate_limit.window_seconds, rate_limit.max_requests, rate_limit.cooldown_seconds,
+                  1 if increment else 0, int(_state_ttl(rate_limit) * 1000)]
+        )
+        return RateLimitDecision(bool(int(limited)), float(count), float(cooldown_until), float(window_start))
+
+    async def reset(self, user_id: int, limit_type: RateLimitType):
+        await self.client.delete(self._key(user_id, limit_type))
+
+    async def cleanup(self, now: float) -> int:
+        return 0  # o Redis expira as chaves ociosas sozinho
+
+    def active_keys(self, limit_type: RateLimitType = None, now: float = None) -> Optional[int]:
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'backend': 'redis', 'prefix': self.prefix}
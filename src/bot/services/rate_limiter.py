@@ -4,35 +4,22 @@ Previne spam e abuso limitando ações por usuário em janelas de tempo
 """
 import asyncio
 import logging
-from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
+import math
+import time
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
-from enum import Enum
 import json
-from collections import defaultdict, deque
+from collections import defaultdict
+from src.config.settings import settings
 from src.database.postgresql_global_unique import postgresql_global_unique
 from src.bot.services.audit_logger import audit_logger, ActionType, LogLevel
+from src.bot.services.rate_limit_backends import (
+    RateLimitType, RateLimit, RateLimitDecision, InMemoryRateLimitBackend, RedisRateLimitBackend
+)
 
 logger = logging.getLogger(__name__)
 
-class RateLimitType(Enum):
-    """Tipos de rate limiting"""
-    INVITE_ATTEMPTS = "invite_attempts"
-    LINK_CREATION = "link_creation"
-    RANKING_REQUESTS = "ranking_requests"
-    ADMIN_COMMANDS = "admin_commands"
-    API_CALLS = "api_calls"
-    FRAUD_ATTEMPTS = "fraud_attempts"
-
-@dataclass
-class RateLimit:
-    """Configuração de rate limit"""
-    limit_type: RateLimitType
-    max_requests: int
-    window_seconds: int
-    burst_allowance: int  # Rajadas permitidas
-    cooldown_seconds: int  # Tempo de cooldown após limite
-
 @dataclass
 class RateLimitStatus:
     """Status atual do rate limit para um usuário"""
@@ -40,20 +27,30 @@ class RateLimitStatus:
     limit_type: RateLimitType
     current_count: int
     max_requests: int
-    window_start: TIMESTAMP WITH TIME ZONE
-    window_end: TIMESTAMP WITH TIME ZONE
+    window_start: datetime
+    window_end: datetime
     is_limited: bool
-    cooldown_until: Optional[TIMESTAMP WITH TIME ZONE]
+    cooldown_until: Optional[datetime]
     remaining_requests: int
 
+def create_rate_limit_backend():
+    """Backend configurado em RATE_LIMIT_BACKEND (memory | redis)"""
+    if settings.RATE_LIMIT_BACKEND == 'redis':
+        try:
+            return RedisRateLimitBackend(url=settings.REDIS_URL)
+        except ImportError:
+            logger.warning("⚠️ Pacote redis não instalado, usando rate limit em memória")
+    return InMemoryRateLimitBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
 class RateLimiter:
     """
     Sistema de rate limiting avançado
     Protege contra spam e abuso com múltiplas estratégias
     """
     
-    def __init__(self):
+    def __init__(self, backend=None):
         self.db = postgresql_global_unique
+        self.backend = backend or create_rate_limit_backend()
         
         # Configurações de rate limit por tipo
         self.rate_limits = {
@@ -101,10 +98,6 @@ class RateLimiter:
             )
         }
         
-        # Cache em memória para performance
-        self.user_counters: Dict[Tuple[int, RateLimitType], deque] = defaultdict(deque)
-        self.user_cooldowns: Dict[Tuple[int, RateLimitType], TIMESTAMP WITH TIME ZONE] = {}
-        
         # Estatísticas
         self.stats = {
             'total_requests': 0,
@@ -119,46 +112,14 @@ class RateLimiter:
         Verifica se usuário está dentro do rate limit
         MÉTODO PRINCIPAL para verificação de limites
         """
+        rate_limit = self.rate_limits[limit_type]
+        now = datetime.now()
         try:
-            rate_limit = self.rate_limits[limit_type]
-            now = TIMESTAMP WITH TIME ZONE.now()
-            cache_key = (user_id, limit_type)
-            
-            # Verificar cooldown ativo
-            if cache_key in self.user_cooldowns:
-                cooldown_until = self.user_cooldowns[cache_key]
-                if now < cooldown_until:
-                    await self._log_rate_limit_violation(user_id, limit_type, "cooldown_active")
-                    return RateLimitStatus(
-                        user_id=user_id,
-                        limit_type=limit_type,
-                        current_count=rate_limit.max_requests,
-                        max_requests=rate_limit.max_requests,
-                        window_start=now - timedelta(seconds=rate_limit.window_seconds),
-                        window_end=now,
-                        is_limited=True,
-                        cooldown_until=cooldown_until,
-                        remaining_requests=0
-                    )
-                else:
-                    # Cooldown expirou
-                    del self.user_cooldowns[cache_key]
-            
-            # Limpar timestamps antigos da janela
-            window_start = now - timedelta(seconds=rate_limit.window_seconds)
-            user_queue = self.user_counters[cache_key]
-            
-            while user_queue and user_queue[0] < window_start:
-                user_queue.popleft()
+            decision = await self.backend.hit(user_id, rate_limit, now.timestamp(), increment)
+            window_start = datetime.fromtimestamp(decision.window_start)
             
-            current_count = len(user_queue)
-            
-            # Verificar se excede o limite
-            if current_count >= rate_limit.max_requests:
-                # Aplicar cooldown
-                cooldown_until = now + timedelta(seconds=rate_limit.cooldown_seconds)
-                self.user_cooldowns[cache_key] = cooldown_until
-                
+            if decision.is_limited:
+                cooldown_until = datetime.fromtimestamp(decision.cooldown_until)
                 await self._log_rate_limit_violation(user_id, limit_type, "limit_exceeded")
                 
                 # Atualizar estatísticas
@@ -168,7 +129,7 @@ class RateLimiter:
                 return RateLimitStatus(
                     user_id=user_id,
                     limit_type=limit_type,
-                    current_count=current_count,
+                    current_count=rate_limit.max_requests,
                     max_requests=rate_limit.max_requests,
                     window_start=window_start,
                     window_end=now,
@@ -177,17 +138,12 @@ class RateLimiter:
                     remaining_requests=0
                 )
             
-            # Dentro do limite - incrementar se solicitado
+            current_count = math.ceil(decision.count)
             if increment:
-                user_queue.append(now)
-                current_count += 1
-                
                 # Atualizar estatísticas
                 self.stats['total_requests'] += 1
                 self.stats['by_type'][limit_type.value]['requests'] += 1
             
-            remaining = max(0, rate_limit.max_requests - current_count)
-            
             return RateLimitStatus(
                 user_id=user_id,
                 limit_type=limit_type,
@@ -197,7 +153,7 @@ class RateLimiter:
                 window_end=now,
                 is_limited=False,
                 cooldown_until=None,
-                remaining_requests=remaining
+                remaining_requests=max(0, rate_limit.max_requests - current_count)
             )
             
         except Exception as e:
@@ -227,14 +183,8 @@ class RateLimiter:
     async def reset_rate_limit(self, user_id: int, limit_type: RateLimitType) -> bool:
         """Reset manual do rate limit (admin)"""
         try:
-            cache_key = (user_id, limit_type)
-            
-            # Limpar cache
-            if cache_key in self.user_counters:
-                self.user_counters[cache_key].clear()
-            
-            if cache_key in self.user_cooldowns:
-                del self.user_cooldowns[cache_key]
+            # Limpar estado da janela e cooldown
+            await self.backend.reset(user_id, limit_type)
             
             # Log da ação
             await audit_logger.log_action(
@@ -296,20 +246,10 @@ class RateLimiter:
     async def get_global_rate_limit_stats(self) -> Dict[str, Any]:
         """Estatísticas globais de rate limiting"""
         try:
-            # Contar cooldowns ativos
-            now = TIMESTAMP WITH TIME ZONE.now()
-            active_cooldowns = sum(
-                1 for cooldown_time in self.user_cooldowns.values()
-                if cooldown_time > now
-            )
-            
             # Estatísticas por tipo
             type_stats = {}
             for limit_type in RateLimitType:
-                active_users_global_global = sum(
-                    1 for (user_id, lt), queue in self.user_counters.items()
-                    if lt == limit_type and len(queue) > 0
-                )
+                active_users_global_global = self.backend.active_keys(limit_type)
                 
                 type_stats[limit_type.value] = {
                     'active_users_global_global': active_users_global_global,
@@ -326,14 +266,10 @@ class RateLimiter:
                 'global_stats': {
                     'total_requests': self.stats['total_requests'],
                     'blocked_requests': self.stats['blocked_requests'],
-                    'active_cooldowns': active_cooldowns,
                     'block_rate': (self.stats['blocked_requests'] / max(self.stats['total_requests'], 1)) * 100
                 },
                 'by_type': type_stats,
-                'cache_stats': {
-                    'active_user_counters': len(self.user_counters),
-                    'active_cooldowns': len(self.user_cooldowns)
-                }
+                'backend': self.backend.get_stats()
             }
             
         except Exception as e:
@@ -341,43 +277,9 @@ class RateLimiter:
             return {}
     
     async def cleanup_expired_data(self) -> Dict[str, int]:
-        """Limpa dados expirados do cache"""
+        """Remove estados ociosos do backend (o Redis expira sozinho)"""
         try:
-            now = TIMESTAMP WITH TIME ZONE.now()
-            cleanup_stats = {
-                'expired_counters': 0,
-                'expired_cooldowns': 0
-            }
-            
-            # Limpar cooldowns expirados
-            expired_cooldowns = [
-                key for key, cooldown_time in self.user_cooldowns.items()
-                if cooldown_time <= now
-            ]
-            
-            for key in expired_cooldowns:
-                del self.user_cooldowns[key]
-                cleanup_stats['expired_cooldowns'] += 1
-            
-            # Limpar contadores antigos
-            expired_counters = []
-            for cache_key, queue in self.user_counters.items():
-                user_id, limit_type = cache_key
-                rate_limit = self.rate_limits[limit_type]
-                window_start = now - timedelta(seconds=rate_limit.window_seconds)
-                
-                # Limpar timestamps antigos
-                while queue and queue[0] < window_start:
-                    queue.popleft()
-                
-                # Se queue vazio, marcar para remoção
-                if not queue:
-                    expired_counters.append(cache_key)
-            
-            for key in expired_counters:
-                del self.user_counters[key]
-                cleanup_stats['expired_counters'] += 1
-            
+            cleanup_stats = {'expired_keys': await self.backend.cleanup(time.time())}
             logger.debug(f"✅ Limpeza de rate limit: {cleanup_stats}")
             return cleanup_stats
             
@@ -434,17 +336,10 @@ class RateLimiter:
     
     def get_memory_usage(self) -> Dict[str, Any]:
         """Informações sobre uso de memória"""
-        total_queue_items = sum(len(queue) for queue in self.user_counters.values())
-        
+        keys = self.backend.active_keys() or 0
         return {
-            'user_counters': len(self.user_counters),
-            'total_queue_items': total_queue_items,
-            'active_cooldowns': len(self.user_cooldowns),
-            'memory_estimate_kb': (
-                len(self.user_counters) * 64 +  # Overhead dos dicts
-                total_queue_items * 32 +         # Timestamps
-                len(self.user_cooldowns) * 64    # Cooldowns
-            ) / 1024
+            **self.backend.get_stats(),
+            'memory_estimate_kb': keys * 200 / 1024  # entrada do OrderedDict + estado com __slots__
         }
 
 # Instância global
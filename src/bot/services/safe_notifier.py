@@ -6,14 +6,16 @@ import logging
 from telegram import Bot
 from telegram.error import TelegramError
 from src.config.settings import settings
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
 
 logger = logging.getLogger(__name__)
 
 class SafeNotifier:
     """Notificador que não falha se o canal não estiver acessível"""
     
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, scheduler: MessageScheduler):
         self.bot = bot
+        self.scheduler = scheduler
         self.channel_available = None
         
     async def check_channel(self):
@@ -33,12 +35,18 @@ class SafeNotifier:
         """Envia mensagem para o canal se disponível"""
         try:
             if await self.check_channel():
-                await self.bot.send_message(
+                sent = await self.scheduler.send_message(
                     chat_id=settings.CHAT_ID,
-                    VARCHAR=VARCHAR,
+                    text=VARCHAR,
                     parse_mode=parse_mode,
-                    disable_web_page_preview=disable_web_page_preview
+                    disable_web_page_preview=disable_web_page_preview,
+                    priority=MessagePriority.COMPETITION,
+                    wait=True
                 )
+                if not sent:
+                    logger.error("❌ Erro ao enviar mensagem para o canal")
+                    self.channel_available = False
+                    return False
                 logger.info("✅ Mensagem enviada para o canal")
                 return True
             else:
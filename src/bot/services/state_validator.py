@@ -8,6 +8,8 @@ import logging
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
 from typing import Optional, List, Dict, Any
 from src.database.models import DatabaseManager, Competition, CompetitionStatus
+from src.bot.services.active_competition_cache import active_competition_cache
+from src.bot.services.link_registry import link_registry
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +57,9 @@ class StateValidator:
             if orphaned_count > 0:
                 report["fixes_applied"].append(f"Removidos {orphaned_count} registros órfãos")
             
+            if expired_comps or len(active_comps) > 1:
+                active_competition_cache.invalidate("state_validator")
+            
             logger.info(f"Validação de estado concluída: {report}")
             return report
             
@@ -222,6 +227,8 @@ class StateValidator:
                 report["links_reset"] = cursor.rowcount
                 
                 conn.commit()
+            active_competition_cache.invalidate("force_reset")
+            link_registry.invalidate("force_reset")
             
             logger.warning(f"Reset forçado executado: {report}")
             return report
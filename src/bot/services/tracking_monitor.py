@@ -10,13 +10,17 @@ from telegram import Bot
 
 from src.config.settings import settings
 from src.database.models import DatabaseManager
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
+from src.bot.services.link_registry import link_registry
+from src.bot.services.active_competition_cache import active_competition_cache
 
 logger = logging.getLogger(__name__)
 
 class TrackingMonitor:
-    def __init__(self, db_manager: DatabaseManager, bot: Bot):
+    def __init__(self, db_manager: DatabaseManager, bot: Bot, scheduler: MessageScheduler):
         self.db = db_manager
         self.bot = bot
+        self.scheduler = scheduler
         
     def validate_invite_tracking(self, user_id: int, invite_link: str) -> Dict[str, bool]:
         """Valida se o tracking de convite está funcionando corretamente"""
@@ -29,19 +33,15 @@ class TrackingMonitor:
         }
         
         try:
+            # 1. Verificar se o link existe e está ativo (registro em memória)
+            link = link_registry.resolve(invite_link, self.db.get_invite_link_by_url)
+            validation_results['link_exists'] = link is not None and link.is_active
+            
+            if not validation_results['link_exists']:
+                logger.warning(f"Link não encontrado ou inativo: {invite_link}")
+                return validation_results
+            
             with self.db.get_connection() as conn:
-                # 1. Verificar se o link existe e está ativo
-                link_data = session.execute(text(text("""
-                    SELECT * FROM invite_links_global_global_global 
-                    WHERE invite_link = ? AND is_active = 1
-                """, (invite_link,)).fetchone()
-                
-                validation_results['link_exists'] = link_data is not None
-                
-                if not link_data:
-                    logger.warning(f"Link não encontrado ou inativo: {invite_link}")
-                    return validation_results
-                
                 # 2. Verificar se o usuário existe
                 user_data = session.execute(text(text("""
                     SELECT * FROM users_global_global_global WHERE user_id = ?
@@ -53,12 +53,8 @@ class TrackingMonitor:
                     logger.warning(f"Usuário não encontrado: {user_id}")
                     return validation_results
                 
-                # 3. Verificar se há competição ativa
-                active_comp = session.execute(text(text("""
-                    SELECT * FROM competitions_global_global_global 
-                    WHERE status = 'active' 
-                    ORDER BY created_at DESC LIMIT 1
-                """).fetchone()
+                # 3. Verificar se há competição ativa (snapshot em memória)
+                active_comp = active_competition_cache.get(self.db.get_active_competition)
                 
                 validation_results['competition_active'] = active_comp is not None
                 
@@ -70,7 +66,7 @@ class TrackingMonitor:
                 participant = session.execute(text(text("""
                     SELECT * FROM competition_participants_global_global_global 
                     WHERE competition_id = ? AND user_id = ?
-                """, (active_comp['id'], user_id)).fetchone()
+                """, (active_comp.id, user_id)).fetchone()
                 
                 validation_results['participant_exists'] = participant is not None
                 
@@ -79,7 +75,9 @@ class TrackingMonitor:
                     # Comparar contadores
                     user_total = user_data['total_invites']
                     comp_invites = participant['invites_count']
-                    link_uses = link_data['uses']
+                    link_uses = session.execute(text(text("""
+                        SELECT uses FROM invite_links_global_global_global WHERE id = ?
+                    """, (link.link_id,)).fetchone()['uses']
                     
                     # Os contadores devem ser consistentes
                     # (pode haver pequenas diferenças devido a múltiplos links)
@@ -293,10 +291,12 @@ class TrackingMonitor:
             message += "\n🔧 **Ação recomendada:** Verificar logs e executar correções automáticas."
             
             # Enviar para o canal (ou chat de administradores)
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.CHAT_ID,  # ou um chat específico para alertas
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.ADMIN_ALERT,
+                coalesce_key='health_alert'
             )
             
             logger.info("Alerta de saúde enviado com sucesso")
@@ -349,6 +349,8 @@ class TrackingMonitor:
                     AND is_active = 1
                 """)
                 fixes_applied['orphan_links_cleaned'] = orphan_links.rowcount
+                if orphan_links.rowcount:
+                    link_registry.invalidate("orphan_links")
                 
                 # 3. Adicionar participantes faltantes (usuários com links mas sem participação)
                 if active_comp:
@@ -9,13 +9,15 @@ from typing import Dict, List, Optional, Tuple
 from telegram import Bot
 
 from src.config.settings import settings
+from src.bot.services.message_scheduler import MessagePriority, MessageScheduler
 
 logger = logging.getLogger(__name__)
 
 class UniversalTrackingMonitor:
-    def __init__(self, db_manager, bot: Bot):
+    def __init__(self, db_manager, bot: Bot, scheduler: MessageScheduler):
         self.db = db_manager
         self.bot = bot
+        self.scheduler = scheduler
         self.db_type = self._detect_db_type()
         
     def _detect_db_type(self) -> str:
@@ -342,10 +344,12 @@ class UniversalTrackingMonitor:
             message += "\n🔧 **Ação recomendada:** Verificar logs e executar correções automáticas."
             
             # Enviar para o canal
-            await self.bot.send_message(
+            await self.scheduler.send_message(
                 chat_id=settings.CHAT_ID,
-                VARCHAR=message,
-                parse_mode='Markdown'
+                text=message,
+                parse_mode='Markdown',
+                priority=MessagePriority.ADMIN_ALERT,
+                coalesce_key='health_alert'
             )
             
             logger.info("Alerta de saúde enviado com sucesso")
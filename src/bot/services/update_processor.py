@@ -0,0 +1,143 @@
+"""
+Processador Concorrente de Updates
+Processa updates em paralelo mantendo a ordem por usuário e por convidador
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.bot.services.link_registry import link_registry
+
+logger = logging.getLogger(__name__)
+
+def update_ordering_key(update: Update) -> Optional[str]:
+    """
+    Chave de ordenação do update: entradas via link são ordenadas pelo
+    convidador; o resto pelo usuário (ou chat, se não houver usuário).
+
+    O criador do link é sempre o bot, então o convidador vem do dono
+    registrado no link_registry; link desconhecido cai na chave do usuário.
+    """
+    chat_member = update.chat_member
+    if chat_member and chat_member.invite_link:
+        info = link_registry.peek(chat_member.invite_link.invite_link)
+        if info is not None:
+            return f"inviter:{info.owner_id}"
+
+    if update.effective_user:
+        return f"user:{update.effective_user.id}"
+
+    if update.effective_chat:
+        return f"chat:{update.effective_chat.id}"
+
+    return None
+
+def update_handler_label(update: Update) -> str:
+    """Rótulo usado nas métricas de latência (comando ou tipo de update)"""
+    message = update.message
+    if message and message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0].lower()
+    if update.chat_member:
+        return 'chat_member'
+    if update.my_chat_member:
+        return 'my_chat_member'
+    if update.callback_query:
+        return 'callback_query'
+    if message:
+        return 'message'
+    return 'other'
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Até max_concurrent_updates updates em paralelo; updates com a mesma
+    chave (update_ordering_key) rodam um de cada vez, na ordem de chegada.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.tails: Dict[str, asyncio.Future] = {}
+        self.waiting = 0
+        self.in_flight = 0
+        self.peak_waiting = 0
+        self.handler_metrics: Dict[str, Dict[str, float]] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_ordering_key(update) if isinstance(update, Update) else None
+
+        # Registrar na fila da chave antes de qualquer await preserva a ordem de chegada
+        previous = self.tails.get(key) if key else None
+        done = None
+        if key:
+            done = asyncio.get_running_loop().create_future()
+            self.tails[key] = done
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        started = False
+        try:
+            if previous is not None:
+                # shield: cancelar quem espera não pode cancelar o antecessor
+                await asyncio.shield(previous)
+            started = True
+            await super().process_update(update, coroutine)
+        finally:
+            if not started:
+                self.waiting -= 1
+                coroutine.close()
+            if done is not None:
+                if previous is not None and not previous.done():
+                    # Cancelado na espera: o sucessor só libera quando o antecessor terminar
+                    previous.add_done_callback(lambda _: done.done() or done.set_result(None))
+                elif not done.done():
+                    done.set_result(None)
+                if self.tails.get(key) is done:
+                    del self.tails[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.waiting -= 1
+        self.in_flight += 1
+        label = update_handler_label(update) if isinstance(update, Update) else 'other'
+        started = time.monotonic()
+        failed = False
+        try:
+            await coroutine
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.in_flight -= 1
+            elapsed_ms = (time.monotonic() - started) * 1000
+            stat = self.handler_metrics.setdefault(label, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stat["count"] += 1
+            stat["errors"] += int(failed)
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidade da fila e latência por handler"""
+        return {
+            "max_concurrent_updates": self.max_concurrent_updates,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "peak_waiting": self.peak_waiting,
+            "ordered_keys": len(self.tails),
+            "handlers": {
+                label: {
+                    "count": int(stat["count"]),
+                    "errors": int(stat["errors"]),
+                    "avg_ms": round(stat["total_ms"] / stat["count"], 2) if stat["count"] else 0.0,
+                    "max_ms": round(stat["max_ms"], 2)
+                }
+                for label, stat in self.handler_metrics.items()
+            }
+        }
@@ -0,0 +1,166 @@
+"""
+Servidor de Webhook (aiohttp)
+Recebe updates do Telegram por HTTP como alternativa ao long polling
+"""
+import asyncio
+import hmac
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiohttp import web
+from telegram import Update
+
+from src.config.settings import settings
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """
+    Ingestão de updates via webhook.
+
+    - Valida o secret token do Telegram (comparação em tempo constante)
+    - Aceita um update ou uma lista de updates por requisição
+    - Responde imediatamente; o processamento roda em tarefas limitadas
+      por um semáforo (max_concurrency; 0 deixa o limite para quem processa)
+    - Acima de max_pending updates em andamento responde 503 para o
+      Telegram reenviar mais tarde
+    """
+
+    def __init__(self, bot, process_update: Callable[[Update], Awaitable[Any]],
+                 secret_token: str = None, listen: str = None, port: int = None,
+                 path: str = None, max_concurrency: int = None, max_pending: int = None):
+        self.bot = bot
+        self.process_update = process_update
+        self.secret_token = secret_token if secret_token is not None else settings.WEBHOOK_SECRET_TOKEN
+        self.listen = listen or settings.WEBHOOK_LISTEN
+        self.port = port or settings.WEB_PORT
+        self.path = path or settings.WEBHOOK_PATH
+        self.max_pending = max_pending or settings.WEBHOOK_MAX_PENDING
+        if max_concurrency is None:
+            max_concurrency = settings.WEBHOOK_MAX_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self._handle_updates)
+        self.app.router.add_get(f"{self.path}/stats", self._handle_stats)
+        self.runner: Optional[web.AppRunner] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+        # Métricas
+        self.metrics = {
+            "requests": 0,
+            "updates_received": 0,
+            "updates_processed": 0,
+            "updates_failed": 0,
+            "rejected_auth": 0,
+            "rejected_overload": 0,
+            "decode_errors": 0,
+            "total_processing_ms": 0.0,
+            "max_processing_ms": 0.0
+        }
+
+    async def start(self):
+        """Sobe o servidor HTTP"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.listen, self.port)
+        await site.start()
+
+        logger.info(f"✅ Webhook escutando em {self.listen}:{self.port}{self.path}")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Para de aceitar requisições e aguarda os updates em andamento"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+
+        logger.info("✅ Webhook parado")
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        received = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(received.encode(), self.secret_token.encode())
+
+    async def _handle_updates(self, request: web.Request) -> web.Response:
+        self.metrics["requests"] += 1
+
+        if not self._authorized(request):
+            self.metrics["rejected_auth"] += 1
+            return web.Response(status=401)
+
+        try:
+            payload = _json_loads(await request.read())
+        except ValueError:
+            self.metrics["decode_errors"] += 1
+            return web.Response(status=400)
+
+        raw_updates: List[Dict[str, Any]] = payload if isinstance(payload, list) else [payload]
+
+        if len(self.tasks) + len(raw_updates) > self.max_pending:
+            self.metrics["rejected_overload"] += 1
+            return web.Response(status=503)
+
+        for data in raw_updates:
+            try:
+                update = Update.de_json(data, self.bot)
+            except Exception as e:
+                self.metrics["decode_errors"] += 1
+                logger.error(f"Update inválido recebido no webhook: {e}")
+                continue
+
+            self.metrics["updates_received"] += 1
+            task = asyncio.create_task(self._process(update))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        return web.Response()
+
+    async def _process(self, update: Update):
+        if self.semaphore is None:
+            await self._run_update(update)
+            return
+        async with self.semaphore:
+            await self._run_update(update)
+
+    async def _run_update(self, update: Update):
+        started = time.monotonic()
+        try:
+            await self.process_update(update)
+            self.metrics["updates_processed"] += 1
+        except Exception as e:
+            self.metrics["updates_failed"] += 1
+            logger.error(f"Erro ao processar update {update.update_id}: {e}")
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self.metrics["total_processing_ms"] += elapsed_ms
+            self.metrics["max_processing_ms"] = max(self.metrics["max_processing_ms"], elapsed_ms)
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.Response(status=401)
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna métricas de ingestão"""
+        finished = self.metrics["updates_processed"] + self.metrics["updates_failed"]
+        return {
+            "in_flight": len(self.tasks),
+            **self.metrics,
+            "avg_processing_ms": round(self.metrics["total_processing_ms"] / finished, 2) if finished else 0.0
+        }
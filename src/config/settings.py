@@ -42,9 +42,98 @@ class Settings(BaseSettings):
     DEBUG_MODE: bool = False
     DB_POOL_SIZE: int = 20
     DB_POOL_TIMEOUT: int = 30
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    DB_ASYNC_ENABLED: bool = True  # pool asyncpg para o lote de créditos de convite
     LOG_CLEANUP_INTERVAL: int = 24
     LOG_RETENTION_DAYS: int = 7
     
+    # Join Event Pipeline
+    JOIN_PIPELINE_QUEUE_SIZE: int = 10000
+    JOIN_PIPELINE_SHARDS: int = 8
+    JOIN_PIPELINE_EXECUTOR_WORKERS: int = 8
+    JOIN_PIPELINE_SUBMIT_TIMEOUT: float = 5.0
+    
+    # Invite Credit Batching
+    INVITE_CREDIT_BATCHING: bool = True
+    INVITE_CREDIT_FLUSH_INTERVAL_MS: int = 200
+    INVITE_CREDIT_MAX_BATCH_EVENTS: int = 500
+    INVITE_CREDIT_MAX_RETRIES: int = 5
+    
+    # Points Sync
+    POINTS_SYNC_INCREMENTAL: bool = True
+    POINTS_RECONCILE_INTERVAL: int = 600
+    POINTS_RECONCILE_OVERLAP_SECONDS: int = 300
+    POINTS_SYNC_MAINTAIN_POSITIONS: bool = False
+    LINK_USAGE_RECONCILE_ENABLED: bool = False  # eleva usos dos links aos membros rastreados antes da reconciliação de pontos
+    
+    # Agendador de mensagens de saída (limites de flood do Telegram)
+    OUTBOUND_GLOBAL_RATE: float = 25.0
+    OUTBOUND_PRIVATE_CHAT_RATE: float = 1.0
+    OUTBOUND_GROUP_CHAT_RATE_PER_MINUTE: float = 20.0
+    OUTBOUND_MAX_QUEUE: int = 5000
+    OUTBOUND_MAX_RETRIES: int = 3
+    OUTBOUND_MAX_IN_FLIGHT: int = 8
+    
+    # Processamento concorrente de updates (ordem mantida por usuário/convidador)
+    UPDATE_MAX_CONCURRENCY: int = 16
+    
+    # Webhook ("polling" ou "webhook"; o webhook escuta em WEB_PORT)
+    BOT_UPDATE_MODE: str = "polling"
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_LISTEN: str = "0.0.0.0"
+    WEBHOOK_SECRET_TOKEN: str = ""
+    WEBHOOK_MAX_CONCURRENCY: int = 64  # só quando o webhook processa sem o processador da aplicação
+    WEBHOOK_MAX_PENDING: int = 10000
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    
+    # Cache em memória (TTL + LRU)
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_DEFAULT_TTL: float = 300.0
+    SYSTEM_HEALTH_CACHE_TTL: float = 30.0  # contagens do /status_admin
+    ACTIVE_COMPETITION_CACHE_TTL: float = 60.0
+    
+    # Revogação de links expirados (também consome o bucket global do agendador)
+    LINK_REVOKE_CONCURRENCY: int = 8
+    LINK_REVOKE_RATE: float = 15.0
+    LINK_REVOKE_CHUNK_SIZE: int = 200
+    LINK_REVOKE_MAX_RETRIES: int = 3
+    
+    # Detecção de fraude (perfis em memória; o excedente vai para o banco)
+    FRAUD_PROFILE_MAX_ENTRIES: int = 20000
+    FRAUD_PROFILE_TTL: float = 86400.0  # mesma janela do histórico usado na análise
+    FRAUD_PROFILE_FLUSH_INTERVAL: float = 30.0  # gravação periódica dos perfis que saíram da memória
+    FRAUD_PROFILE_INDEX_CAPACITY: int = 100000  # índice (Bloom) dos perfis gravados; cresce sozinho
+    FRAUD_PROFILE_INDEX_FPR: float = 0.01
+    FRAUD_MAX_ALERTS: int = 100
+    FRAUD_BATCH_CHUNK_SIZE: int = 5000  # convidados por rodada de consultas na validação em lote
+    
+    # Detecção de rajadas de entradas (janelas deslizantes em memória)
+    BURST_WINDOW_SECONDS: int = 60
+    BURST_INVITER_THRESHOLD: int = 10
+    BURST_LINK_THRESHOLD: int = 10
+    BURST_GLOBAL_THRESHOLD: int = 20
+    BURST_ALERT_COOLDOWN: float = 300.0
+    BURST_MAX_KEYS: int = 100000
+    BURST_MEMBER_RETENTION: float = 86400.0
+    
+    # Pré-filtro de convites únicos (Bloom em memória; "talvez" é confirmado no banco)
+    UNIQUE_INVITE_FILTER_ENABLED: bool = True
+    UNIQUE_INVITE_FILTER_CAPACITY: int = 1000000  # pares da primeira camada; cresce sozinho
+    UNIQUE_INVITE_FILTER_FPR: float = 0.001
+    UNIQUE_INVITE_FILTER_LOAD_CHUNK: int = 50000
+    UNIQUE_INVITE_FILTER_SNAPSHOT_EVERY: int = 1000  # inclusões entre snapshots
+    UNIQUE_INVITE_FILTER_SNAPSHOT_PATH: str = "data_backups/unique_invite_filter.bin"
+    UNIQUE_INVITE_FILTER_RETRY_SECONDS: int = 60  # backoff após falha na carga (dobra, até 1h)
+    
+    # Rate limiting por usuário ("memory" ou "redis" para compartilhar entre processos)
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    REDIS_URL: str = "redis://localhost:6379/0"
+    
     # Admin Settings
     ADMIN_IDS: str = ""
     
@@ -54,6 +143,10 @@ class Settings(BaseSettings):
     NOTIFY_COMPETITION_END: bool = True
     NOTIFY_NEW_LEADER: bool = True
     NOTIFY_TIME_WARNINGS: bool = True
+    RANKING_NOTIFY_DEBOUNCE_SECONDS: float = 30.0
+    RANKING_NOTIFY_TOP_K: int = 10
+    RANKING_SNAPSHOT_SIZE: int = 100
+    RANKING_SNAPSHOT_PATH: str = "data_backups/ranking_snapshot.json"
     
     class Config:
         env_file = ".env"
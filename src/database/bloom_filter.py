@@ -0,0 +1,197 @@
+"""
+Filtro de Bloom Escalável
+Pré-filtro de pertinência para pares (convidado, convidador): "não está" é definitivo,
+"talvez esteja" precisa ser confirmado no banco
+"""
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+_SNAPSHOT_MAGIC = b"BLOOM1\n"
+
+def _mix64(x: int) -> int:
+    """splitmix64 (finalizador)"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+def _mix64_array(x: np.ndarray) -> np.ndarray:
+    """splitmix64 vetorizado (aritmética uint64 com overflow)"""
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def pair_hashes(first: int, second: int) -> Tuple[int, int]:
+    """Dois hashes independentes de 64 bits para o par (esquema Kirsch-Mitzenmacher)"""
+    h1 = _mix64((first & _MASK64) ^ _mix64(second & _MASK64))
+    h2 = _mix64(h1 ^ 0x5851F42D4C957F2D) | 1
+    return h1, h2
+
+def pair_hashes_array(first: np.ndarray, second: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    first = first.astype(np.int64).view(np.uint64)
+    second = second.astype(np.int64).view(np.uint64)
+    h1 = _mix64_array(first ^ _mix64_array(second))
+    with np.errstate(over='ignore'):
+        h2 = _mix64_array(h1 ^ np.uint64(0x5851F42D4C957F2D)) | np.uint64(1)
+    return h1, h2
+
+def write_snapshot(path: str, data: bytes):
+    """Grava o snapshot via arquivo temporário + os.replace"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class _BloomLayer:
+    """Filtro de Bloom de tamanho fixo (bits em bytearray)"""
+
+    __slots__ = ('capacity', 'fpr', 'num_bits', 'num_hashes', 'bits', 'count')
+
+    def __init__(self, capacity: int, fpr: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = capacity
+        self.fpr = fpr
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fpr) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, h1: int, h2: int):
+        return (((h1 + i * h2) & _MASK64) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, h1: int, h2: int):
+        for position in self._positions(h1, h2):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def contains(self, h1: int, h2: int) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(h1, h2))
+
+    def add_many(self, h1: np.ndarray, h2: np.ndarray):
+        view = np.frombuffer(self.bits, dtype=np.uint8)
+        for i in range(self.num_hashes):
+            with np.errstate(over='ignore'):
+                positions = (h1 + np.uint64(i) * h2) % np.uint64(self.num_bits)
+            np.bitwise_or.at(view, (positions >> np.uint64(3)).astype(np.int64),
+                             (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self.count += len(h1)
+
+    def fill_ratio(self) -> float:
+        set_bits = int(np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8)).sum())
+        return set_bits / self.num_bits
+
+class ScalableBloomFilter:
+    """
+    Filtro de Bloom que cresce em camadas.
+
+    Cada camada nova tem o dobro da capacidade e metade da taxa de falso
+    positivo da anterior, então a taxa total fica abaixo de `fpr` mesmo
+    sem saber de antemão quantos itens virão. Não há remoção: um item
+    apagado do banco só vira um falso positivo (que o banco resolve).
+    """
+
+    def __init__(self, capacity: int, fpr: float):
+        self.initial_capacity = capacity
+        self.fpr = fpr
+        self.layers: List[_BloomLayer] = []
+        self._add_layer()
+
+    def _add_layer(self):
+        index = len(self.layers)
+        self.layers.append(_BloomLayer(self.initial_capacity * (2 ** index), self.fpr * (0.5 ** (index + 1))))
+
+    def _layer_for_insert(self) -> _BloomLayer:
+        layer = self.layers[-1]
+        if layer.count >= layer.capacity:
+            self._add_layer()
+            layer = self.layers[-1]
+        return layer
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def add(self, first: int, second: int):
+        h1, h2 = pair_hashes(first, second)
+        if any(layer.contains(h1, h2) for layer in self.layers):
+            return
+        self._layer_for_insert().add(h1, h2)
+
+    def add_many(self, first: np.ndarray, second: np.ndarray):
+        """Inserção em lote (carga inicial a partir do banco)"""
+        h1, h2 = pair_hashes_array(first, second)
+        start = 0
+        while start < len(h1):
+            layer = self._layer_for_insert()
+            room = layer.capacity - layer.count
+            layer.add_many(h1[start:start + room], h2[start:start + room])
+            start += room
+
+    def might_contain(self, first: int, second: int) -> bool:
+        h1, h2 = pair_hashes(first, second)
+        return any(layer.contains(h1, h2) for layer in self.layers)
+
+    def memory_bytes(self) -> int:
+        return sum(len(layer.bits) for layer in self.layers)
+
+    def estimated_fpr(self) -> float:
+        """Taxa de falso positivo estimada pela ocupação de bits de cada camada"""
+        miss = 1.0
+        for layer in self.layers:
+            miss *= 1.0 - layer.fill_ratio() ** layer.num_hashes
+        return 1.0 - miss
+
+    def snapshot_bytes(self, metadata: Dict[str, Any]) -> bytes:
+        """Cabeçalho JSON + bits de cada camada (cópia, pode ser gravada fora do event loop)"""
+        header = {
+            "saved_at": datetime.now().isoformat(),
+            "capacity": self.initial_capacity,
+            "fpr": self.fpr,
+            "layers": [{"count": layer.count, "bytes": len(layer.bits)} for layer in self.layers],
+            **metadata
+        }
+        return b"".join([_SNAPSHOT_MAGIC, json.dumps(header).encode(), b"\n"] + [bytes(layer.bits) for layer in self.layers])
+
+    def save(self, path: str, metadata: Dict[str, Any]):
+        """Grava o filtro de forma atômica"""
+        write_snapshot(path, self.snapshot_bytes(metadata))
+
+    @classmethod
+    def load(cls, path: str, capacity: int, fpr: float) -> Optional[Tuple['ScalableBloomFilter', Dict[str, Any]]]:
+        """Filtro e cabeçalho do snapshot; None se ausente, ilegível ou com outros parâmetros"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                if f.readline() != _SNAPSHOT_MAGIC:
+                    raise ValueError("formato desconhecido")
+                header = json.loads(f.readline())
+                if header["capacity"] != capacity or header["fpr"] != fpr:
+                    logger.info("Snapshot do filtro com outros parâmetros, será reconstruído")
+                    return None
+
+                bloom = cls(capacity, fpr)
+                bloom.layers = []
+                for index, info in enumerate(header["layers"]):
+                    bits = bytearray(f.read(info["bytes"]))
+                    layer = _BloomLayer(capacity * (2 ** index), fpr * (0.5 ** (index + 1)), bits, info["count"])
+                    if len(bits) != info["bytes"] or len(bits) != (layer.num_bits + 7) // 8:
+                        raise ValueError("camada truncada")
+                    bloom.layers.append(layer)
+                return bloom, header
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"⚠️ Snapshot do filtro ilegível, ignorando: {e}")
+            return None
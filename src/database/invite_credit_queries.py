@@ -0,0 +1,99 @@
+"""
+Consultas do Lote de Créditos de Convite
+Mesmas instruções para o gerenciador síncrono e o assíncrono (VALUES com parâmetros nomeados)
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+InviteCredit = Tuple[int, int, str, int]  # (competition_id, user_id, invite_link, delta)
+
+def aggregate_invite_credits(credits: List[InviteCredit]) -> Tuple[Dict[str, int], Dict[int, int], Dict[Tuple[int, int], int]]:
+    """Soma os deltas por link, por usuário e por (competição, usuário)"""
+    link_deltas: Dict[str, int] = {}
+    user_deltas: Dict[int, int] = {}
+    participant_deltas: Dict[Tuple[int, int], int] = {}
+    for competition_id, user_id, invite_link, delta in credits:
+        link_deltas[invite_link] = link_deltas.get(invite_link, 0) + delta
+        user_deltas[user_id] = user_deltas.get(user_id, 0) + delta
+        key = (competition_id, user_id)
+        participant_deltas[key] = participant_deltas.get(key, 0) + delta
+    return link_deltas, user_deltas, participant_deltas
+
+def users_upsert(user_deltas: Dict[int, int]) -> Tuple[str, Dict[str, Any]]:
+    """Upsert de users_global_global somando total_invites"""
+    params: Dict[str, Any] = {}
+    rows = []
+    for i, (user_id, delta) in enumerate(user_deltas.items()):
+        rows.append(f"(CAST(:u{i} AS BIGINT), CAST(:ud{i} AS BIGINT))")
+        params[f"u{i}"] = user_id
+        params[f"ud{i}"] = delta
+    return f"""
+        INSERT INTO users_global_global AS u (id, total_invites, created_at, updated_at)
+        SELECT v.user_id, v.delta, NOW(), NOW()
+        FROM (VALUES {', '.join(rows)}) AS v(user_id, delta)
+        ON CONFLICT (id) DO UPDATE
+        SET total_invites = u.total_invites + EXCLUDED.total_invites, updated_at = NOW()
+    """, params
+
+def participants_upsert(participant_deltas: Dict[Tuple[int, int], int]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Upsert de competition_participants_global_global somando invites_count.
+    Retorna (competition_id, user_id, inserted) por linha gravada.
+    """
+    params: Dict[str, Any] = {}
+    rows = []
+    for i, ((competition_id, user_id), delta) in enumerate(participant_deltas.items()):
+        rows.append(f"(CAST(:c{i} AS BIGINT), CAST(:u{i} AS BIGINT), CAST(:d{i} AS BIGINT))")
+        params[f"c{i}"] = competition_id
+        params[f"u{i}"] = user_id
+        params[f"d{i}"] = delta
+    return f"""
+        INSERT INTO competition_participants_global_global AS cp
+            (competition_id, user_id, invites_count, last_invite_at)
+        SELECT v.competition_id, v.user_id, v.delta, NOW()
+        FROM (VALUES {', '.join(rows)}) AS v(competition_id, user_id, delta)
+        ON CONFLICT (competition_id, user_id) DO UPDATE
+        SET invites_count = cp.invites_count + EXCLUDED.invites_count, last_invite_at = NOW()
+        RETURNING cp.competition_id, cp.user_id, (xmax = 0) AS inserted
+    """, params
+
+def competition_totals_update(participant_deltas: Dict[Tuple[int, int], int],
+                              written: Iterable[Any]) -> Tuple[str, Dict[str, Any]]:
+    """Totais da competição: convites do lote e participantes criados pelo upsert"""
+    competition_totals: Dict[int, List[int]] = {}
+    for row in written:
+        totals = competition_totals.setdefault(row.competition_id, [0, 0])
+        totals[0] += participant_deltas[(row.competition_id, row.user_id)]
+        totals[1] += 1 if row.inserted else 0
+    params: Dict[str, Any] = {}
+    rows = []
+    for i, (competition_id, (invites, participants)) in enumerate(competition_totals.items()):
+        rows.append(f"(CAST(:c{i} AS BIGINT), CAST(:i{i} AS BIGINT), CAST(:p{i} AS BIGINT))")
+        params[f"c{i}"] = competition_id
+        params[f"i{i}"] = invites
+        params[f"p{i}"] = participants
+    return f"""
+        UPDATE competitions_global_global c
+        SET total_invites = c.total_invites + v.invites,
+            total_participants = c.total_participants + v.participants
+        FROM (VALUES {', '.join(rows)}) AS v(competition_id, invites, participants)
+        WHERE c.id = v.competition_id
+    """, params
+
+def links_update(link_deltas: Dict[str, int]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Soma os usos nos links (sem filtro de is_active: o link pode ter sido
+    revogado depois da entrada). Retorna invite_link por linha atualizada.
+    """
+    params: Dict[str, Any] = {}
+    rows = []
+    for i, (invite_link, delta) in enumerate(link_deltas.items()):
+        rows.append(f"(:l{i}, CAST(:ld{i} AS BIGINT))")
+        params[f"l{i}"] = invite_link
+        params[f"ld{i}"] = delta
+    return f"""
+        UPDATE invite_links_global_global il
+        SET uses = il.uses + v.delta, updated_at = NOW()
+        FROM (VALUES {', '.join(rows)}) AS v(invite_link, delta)
+        WHERE il.invite_link = v.invite_link
+        RETURNING il.invite_link
+    """, params
@@ -5,10 +5,13 @@ Sistema de Banco de Dados - Telegram Invite Bot
 from sqlalchemy import create_engine, VARCHAR
 import logging
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
+from datetime import datetime
 from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from src.database.ranking_queries import build_competition_ranking_query, ranking_query_params
+
 logger = logging.getLogger(__name__)
 
 class CompetitionStatus(Enum):
@@ -152,6 +155,17 @@ class DatabaseManager:
                 )
             """)
             
+            # Livro de marcos já anunciados (0 em scope_user_id = marco da competição)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS milestone_ledger_global_global (
+                    competition_id BIGINT NOT NULL,
+                    scope_user_id BIGINT NOT NULL,
+                    milestone BIGINT NOT NULL,
+                    reached_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (competition_id, scope_user_id, milestone)
+                )
+            """)
+            
             # Índices para performance
             session.execute(text(text("CREATE INDEX IF NOT EXISTS idx_users_global_global_user_id ON users_global_global (user_id)")
             session.execute(text(text("CREATE INDEX IF NOT EXISTS idx_invite_links_global_global_user_id ON invite_links_global_global (user_id)")
@@ -268,23 +282,17 @@ class DatabaseManager:
             """, (invites_count, competition_id, user_id))
             return cursor.rowcount > 0
     
-    def get_competition_ranking(self, competition_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Busca o ranking da competição"""
+    def get_competition_ranking(self, competition_id: int, limit: int = 10,
+                                after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Busca uma página do ranking com os nomes já unidos (uma única consulta).
+        after: (invites_count, user_id) da última linha da página anterior
+        """
         with self.get_connection() as conn:
-            rows = session.execute(text(text("""
-                SELECT 
-                    cp.user_id,
-                    cp.invites_count,
-                    u.username,
-                    u.first_name,
-                    u.last_name,
-                    ROW_NUMBER() OVER (ORDER BY cp.invites_count DESC) as position
-                FROM competition_participants_global_global_global cp
-                JOIN users_global_global_global u ON cp.user_id = u.user_id
-                WHERE cp.competition_id = ?
-                ORDER BY cp.invites_count DESC
-                LIMIT ?
-            """, (competition_id, limit)).fetchall()
+            rows = conn.execute(
+                build_competition_ranking_query('user_id', after),
+                ranking_query_params(competition_id, limit, after)
+            ).fetchall()
             
             return [dict(row) for row in rows]
     
@@ -406,3 +414,377 @@ class DatabaseManager:
             logger.error(f"Erro ao buscar participantes da competição {competition_id}: {e}")
             return []
 
+    def get_competition_scores(self, competition_id: int) -> List[Dict[str, Any]]:
+        """Busca pontuação e nome de todos os participantes (carga do leaderboard)"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT cp.user_id, cp.invites_count, cp.last_invite_at, u.username, u.first_name
+                FROM competition_participants_global_global cp
+                LEFT JOIN users_global_global u ON cp.user_id = u.user_id
+                WHERE cp.competition_id = ?
+                ORDER BY cp.invites_count DESC, cp.joined_at ASC
+            """, (competition_id,)).fetchall()
+            
+            return [dict(row) for row in rows]
+
+    def get_reached_milestones(self, competition_id: int) -> List[Tuple[int, int]]:
+        """Marcos já registrados da competição: [(escopo, marco)]"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT scope_user_id, milestone
+                FROM milestone_ledger_global_global
+                WHERE competition_id = ?
+            """, (competition_id,)).fetchall()
+            
+            return [(row[0], row[1]) for row in rows]
+
+    def claim_milestones(self, competition_id: int, scope_user_id: int, milestones: List[int]) -> Optional[List[int]]:
+        """Registra os marcos; retorna apenas os inseridos agora (None em caso de erro)"""
+        try:
+            with self.get_connection() as conn:
+                claimed = []
+                for milestone in milestones:
+                    cursor = conn.execute("""
+                        INSERT OR IGNORE INTO milestone_ledger_global_global (competition_id, scope_user_id, milestone)
+                        VALUES (?, ?, ?)
+                    """, (competition_id, scope_user_id, milestone))
+                    if cursor.rowcount:
+                        claimed.append(milestone)
+                conn.commit()
+                return claimed
+        except Exception as e:
+            logger.error(f"Erro ao registrar marcos da competição {competition_id}: {e}")
+            return None
+
+    def get_competition_totals(self, competition_id: int) -> Dict[str, int]:
+        """Totais mantidos na própria competição (leitura por chave primária)"""
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT total_participants, total_invites
+                FROM competitions_global_global
+                WHERE id = ?
+            """, (competition_id,)).fetchone()
+            
+            if not row:
+                return {'total_participants': 0, 'total_invites': 0}
+            return {'total_participants': row[0] or 0, 'total_invites': row[1] or 0}
+
+    def reconcile_competition_totals(self, competition_id: int) -> Optional[int]:
+        """Recalcula os totais da competição a partir dos participantes; retorna 1 se corrigiu"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE competitions_global_global
+                    SET total_participants = (
+                            SELECT COUNT(*) FROM competition_participants_global_global WHERE competition_id = :competition_id
+                        ),
+                        total_invites = (
+                            SELECT COALESCE(SUM(invites_count), 0) FROM competition_participants_global_global WHERE competition_id = :competition_id
+                        )
+                    WHERE id = :competition_id
+                      AND (total_participants IS NOT (
+                               SELECT COUNT(*) FROM competition_participants_global_global WHERE competition_id = :competition_id
+                           )
+                           OR total_invites IS NOT (
+                               SELECT COALESCE(SUM(invites_count), 0) FROM competition_participants_global_global WHERE competition_id = :competition_id
+                           ))
+                """, {"competition_id": competition_id})
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Erro ao reconciliar totais da competição {competition_id}: {e}")
+            return None
+
+    def increment_participant_invites(self, competition_id: int, user_id: int, delta: int = 1) -> Optional[int]:
+        """Aplica um delta em invites_count sem recalcular a soma dos links; retorna o novo total"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE competition_participants_global_global
+                    SET invites_count = invites_count + ?, last_invite_at = CURRENT_TIMESTAMP
+                    WHERE competition_id = ? AND user_id = ?
+                """, (delta, competition_id, user_id))
+                if not cursor.rowcount:
+                    return None
+
+                conn.execute("""
+                    UPDATE competitions_global_global
+                    SET total_invites = total_invites + ?
+                    WHERE id = ?
+                """, (delta, competition_id))
+                row = conn.execute("""
+                    SELECT invites_count FROM competition_participants_global_global
+                    WHERE competition_id = ? AND user_id = ?
+                """, (competition_id, user_id)).fetchone()
+                conn.commit()
+                return row[0]
+        except Exception as e:
+            logger.error(f"Erro ao incrementar convites do usuário {user_id}: {e}")
+            return None
+
+    def reconcile_participant_points(self, competition_id: int, since: Optional[str] = None,
+                                     overlap_seconds: int = 300) -> Optional[Tuple[int, str]]:
+        """
+        Recalcula invites_count = SUM(uses) apenas para usuários com links
+        alterados desde `since` (todos se None). Retorna (linhas corrigidas,
+        próximo watermark no formato do CURRENT_TIMESTAMP) ou None em caso de erro.
+        """
+        changed_filter = ""
+        params: Tuple = (competition_id, competition_id, competition_id, competition_id)
+        if since is not None:
+            changed_filter = """
+                  AND user_id IN (
+                      SELECT user_id FROM invite_links_global_global
+                      WHERE competition_id = ? AND updated_at > ?
+                  )"""
+            params += (competition_id, since)
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute(f"""
+                    UPDATE competition_participants_global_global
+                    SET invites_count = (
+                            SELECT COALESCE(SUM(il.uses), 0) FROM invite_links_global_global il
+                            WHERE il.competition_id = ? AND il.user_id = competition_participants_global_global.user_id
+                        ),
+                        last_invite_at = COALESCE((
+                            SELECT MAX(il.created_at) FROM invite_links_global_global il
+                            WHERE il.competition_id = ? AND il.user_id = competition_participants_global_global.user_id
+                              AND il.uses > 0
+                        ), last_invite_at)
+                    WHERE competition_id = ?
+                      AND invites_count IS NOT (
+                            SELECT COALESCE(SUM(il.uses), 0) FROM invite_links_global_global il
+                            WHERE il.competition_id = ? AND il.user_id = competition_participants_global_global.user_id
+                        ){changed_filter}
+                """, params)
+                watermark = conn.execute("SELECT datetime('now', ?)", (f"-{overlap_seconds} seconds",)).fetchone()[0]
+                conn.commit()
+                return cursor.rowcount, watermark
+        except Exception as e:
+            logger.error(f"Erro ao reconciliar pontos da competição {competition_id}: {e}")
+            return None
+
+    def recompute_ranking_positions(self, competition_id: int) -> Optional[int]:
+        """Recalcula todas as posições com RANK() em um único UPDATE ... FROM"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE competition_participants_global_global
+                    SET position = ranked.new_position
+                    FROM (
+                        SELECT id, RANK() OVER (ORDER BY invites_count DESC) AS new_position
+                        FROM competition_participants_global_global
+                        WHERE competition_id = ?
+                    ) AS ranked
+                    WHERE competition_participants_global_global.id = ranked.id
+                      AND competition_participants_global_global.position IS NOT ranked.new_position
+                """, (competition_id,))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Erro ao recalcular posições da competição {competition_id}: {e}")
+            return None
+
+    def shift_ranking_positions(self, competition_id: int, user_id: int, old_score: int, new_score: int) -> Optional[int]:
+        """
+        Ajuste incremental após o usuário passar de old_score para new_score:
+        apenas quem tem pontuação em [old_score, new_score) desce uma posição.
+        """
+        if new_score <= old_score:
+            return 0
+
+        try:
+            with self.get_connection() as conn:
+                shifted = conn.execute("""
+                    UPDATE competition_participants_global_global
+                    SET position = position + 1
+                    WHERE competition_id = ? AND user_id <> ?
+                      AND invites_count >= ? AND invites_count < ?
+                """, (competition_id, user_id, old_score, new_score))
+                own = conn.execute("""
+                    UPDATE competition_participants_global_global
+                    SET position = (
+                        SELECT COUNT(*) + 1 FROM competition_participants_global_global
+                        WHERE competition_id = ? AND invites_count > ?
+                    )
+                    WHERE competition_id = ? AND user_id = ?
+                """, (competition_id, new_score, competition_id, user_id))
+                conn.commit()
+                return shifted.rowcount + own.rowcount
+        except Exception as e:
+            logger.error(f"Erro no ajuste de posições da competição {competition_id}: {e}")
+            return None
+
+    def apply_invite_credits_batch(self, credits: List[Tuple[int, int, str, int]]) -> bool:
+        """
+        Aplica em uma única transação um lote de créditos de convite
+        (competition_id, user_id, invite_link, delta) já agregados.
+        Participantes e usuários ausentes são criados; link inexistente desfaz o lote.
+        """
+        if not credits:
+            return True
+
+        link_deltas: Dict[str, int] = {}
+        user_deltas: Dict[int, int] = {}
+        participant_deltas: Dict[Tuple[int, int], int] = {}
+        for competition_id, user_id, invite_link, delta in credits:
+            link_deltas[invite_link] = link_deltas.get(invite_link, 0) + delta
+            user_deltas[user_id] = user_deltas.get(user_id, 0) + delta
+            key = (competition_id, user_id)
+            participant_deltas[key] = participant_deltas.get(key, 0) + delta
+
+        try:
+            with self.get_connection() as conn:
+                competition_totals: Dict[int, List[int]] = {}
+                for (competition_id, user_id), delta in participant_deltas.items():
+                    inserted = conn.execute("""
+                        INSERT OR IGNORE INTO competition_participants_global_global (competition_id, user_id)
+                        VALUES (?, ?)
+                    """, (competition_id, user_id)).rowcount
+                    conn.execute("""
+                        UPDATE competition_participants_global_global
+                        SET invites_count = invites_count + ?, last_invite_at = CURRENT_TIMESTAMP
+                        WHERE competition_id = ? AND user_id = ?
+                    """, (delta, competition_id, user_id))
+                    totals = competition_totals.setdefault(competition_id, [0, 0])
+                    totals[0] += delta
+                    totals[1] += inserted
+
+                conn.executemany("""
+                    UPDATE competitions_global_global
+                    SET total_invites = total_invites + ?, total_participants = total_participants + ?
+                    WHERE id = ?
+                """, [(invites, participants, competition_id)
+                      for competition_id, (invites, participants) in competition_totals.items()])
+
+                for user_id, delta in user_deltas.items():
+                    updated = conn.execute("""
+                        UPDATE users_global_global
+                        SET total_invites = total_invites + ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE user_id = ?
+                    """, (delta, user_id)).rowcount
+                    if not updated:
+                        conn.execute("""
+                            INSERT INTO users_global_global (user_id, total_invites) VALUES (?, ?)
+                        """, (user_id, delta))
+
+                for invite_link, delta in link_deltas.items():
+                    updated = conn.execute("""
+                        UPDATE invite_links_global_global
+                        SET uses = uses + ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE invite_link = ?
+                    """, (delta, invite_link)).rowcount
+                    if not updated:
+                        raise ValueError(f"link inexistente: {invite_link}")
+
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"❌ Erro ao aplicar lote de {len(credits)} créditos de convite: {e}")
+            return False
+
+    def get_registry_invite_links(self, competition_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Links ativos (da competição, se informada) para pré-carregar o registro de links"""
+        query = """
+            SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+            FROM invite_links_global_global
+            WHERE is_active = 1
+        """
+        params: Tuple = ()
+        if competition_id is not None:
+            query += " AND competition_id = ?"
+            params = (competition_id,)
+        with self.get_connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    def get_invite_link_by_url(self, invite_link: str) -> Optional[Dict[str, Any]]:
+        """Resolve a URL do link (fallback do registro de links)"""
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+                FROM invite_links_global_global
+                WHERE invite_link = ?
+            """, (invite_link,)).fetchone()
+            return dict(row) if row else None
+
+    def get_expired_invite_links(self, now: datetime, after_id: int = 0, limit: int = 200) -> List[Dict[str, Any]]:
+        """Próximo bloco (keyset por id) de links ativos já expirados"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT id, invite_link
+                FROM invite_links_global_global
+                WHERE is_active = 1 AND expire_date < ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (now, after_id, limit)).fetchall()
+            return [dict(row) for row in rows]
+
+    def deactivate_invite_link(self, link_id: int) -> bool:
+        """Marca um link como inativo"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("""
+                    UPDATE invite_links_global_global
+                    SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (link_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Erro ao desativar link {link_id}: {e}")
+            return False
+
+    def increment_invite_link_uses(self, invite_link: str, delta: int = 1) -> Optional[int]:
+        """Soma delta aos usos do link e ao total do dono; retorna os usos atualizados"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("""
+                    SELECT user_id, uses FROM invite_links_global_global
+                    WHERE invite_link = ? AND is_active = 1
+                """, (invite_link,)).fetchone()
+                if not row:
+                    return None
+
+                conn.execute("""
+                    UPDATE invite_links_global_global
+                    SET uses = uses + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE invite_link = ? AND is_active = 1
+                """, (delta, invite_link))
+                conn.execute("""
+                    UPDATE users_global_global
+                    SET total_invites = total_invites + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                """, (delta, row['user_id']))
+                conn.commit()
+                return (row['uses'] or 0) + delta
+        except Exception as e:
+            logger.error(f"Erro ao atualizar uso do link: {e}")
+            return None
+
+    def reconcile_invite_link_uses(self) -> Optional[int]:
+        """
+        Eleva os usos de cada link ativo à quantidade de membros rastreados por ele
+        na competição atual do link; retorna quantos links foram corrigidos
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("""
+                    UPDATE invite_links_global_global
+                    SET uses = (
+                            SELECT COUNT(*) FROM invited_users_global_global iu
+                            WHERE iu.invite_link = invite_links_global_global.invite_link
+                              AND iu.competition_id = invite_links_global_global.competition_id
+                        ),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE is_active = 1
+                      AND uses < (
+                            SELECT COUNT(*) FROM invited_users_global_global iu
+                            WHERE iu.invite_link = invite_links_global_global.invite_link
+                              AND iu.competition_id = invite_links_global_global.competition_id
+                        )
+                """)
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Erro ao reconciliar uso dos links: {e}")
+            return None
@@ -0,0 +1,373 @@
+"""
+PostgreSQL Assíncrono para o Bot de Ranking de Convites
+Pool asyncpg (create_async_engine) com os métodos usados por handlers e
+serviços no event loop: competição ativa, participantes, usuários, links,
+ranking/totais, marcos e o lote de créditos do InviteCreditWriter.
+"""
+import logging
+import time
+from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.config.settings import settings
+from src.database import invite_credit_queries
+from src.database.postgresql_models import (
+    Base, Competition, CompetitionParticipant, InviteLink, InvitedUser, User, get_database_url
+)
+from src.database.ranking_queries import build_competition_ranking_query, ranking_query_params
+
+logger = logging.getLogger(__name__)
+
+class AsyncPostgreSQLManager:
+    """
+    Gerenciador assíncrono com as mesmas instruções SQL do PostgreSQLManager
+    para os métodos que implementa; o I/O é feito pelo asyncpg no próprio
+    event loop, sem saltos para o pool de threads.
+    """
+
+    def __init__(self, database_url: str = None):
+        url = make_url(database_url or get_database_url()).set(drivername='postgresql+asyncpg')
+
+        self.engine = create_async_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={'prepared_statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE}
+        )
+        self.Session = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+
+        # Métricas por método
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    async def initialize(self):
+        """Cria as tabelas (se necessário) e valida a conexão"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        logger.info(f"✅ PostgreSQL assíncrono inicializado (pool: {settings.DB_POOL_SIZE}+{settings.DB_MAX_OVERFLOW})")
+
+    async def close(self):
+        """Fecha todas as conexões do pool"""
+        await self.engine.dispose()
+
+    @asynccontextmanager
+    async def _timed(self, method: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            stat = self.metrics.setdefault(method, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stat["calls"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+
+    async def create_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> Optional[User]:
+        """Busca o usuário ou cria se não existir"""
+        async with self._timed('create_user'):
+            try:
+                async with self.Session() as session, session.begin():
+                    existing_user = (await session.execute(select(User).filter_by(id=user_id))).scalars().first()
+                    if existing_user:
+                        return existing_user
+                    new_user = User(id=user_id, username=username, first_name=first_name, last_name=last_name)
+                    session.add(new_user)
+                return new_user
+            except SQLAlchemyError:
+                return None
+
+    async def get_user(self, user_id: int):
+        """Busca um usuário pelo ID (mesmo formato do PostgreSQLManager.get_user)"""
+        async with self._timed('get_user'):
+            try:
+                async with self.Session() as session:
+                    user = (await session.execute(select(User).filter_by(id=user_id))).scalars().first()
+            except SQLAlchemyError:
+                return None
+        if not user:
+            return None
+        from src.database.models import User as SQLiteUser
+        return SQLiteUser(
+            id=user.id,
+            user_id=user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            total_invites=0,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+    async def get_active_competition(self) -> Optional[Competition]:
+        async with self._timed('get_active_competition'):
+            async with self.Session() as session:
+                return (await session.execute(select(Competition).filter_by(status='active'))).scalars().first()
+
+    async def add_participant(self, competition_id: int, user_id: int) -> bool:
+        """Registra o participante e soma o total da competição na mesma transação"""
+        async with self._timed('add_participant'):
+            try:
+                async with self.Session() as session, session.begin():
+                    existing = (await session.execute(
+                        select(CompetitionParticipant.id).filter_by(competition_id=competition_id, user_id=user_id)
+                    )).first()
+                    if existing:
+                        return True
+                    session.add(CompetitionParticipant(competition_id=competition_id, user_id=user_id))
+                    await session.execute(
+                        update(Competition)
+                        .where(Competition.id == competition_id)
+                        .values(total_participants=Competition.total_participants + 1)
+                    )
+                return True
+            except SQLAlchemyError:
+                return False
+
+    async def get_user_invite_link(self, user_id: int, competition_id: int) -> Optional[InviteLink]:
+        async with self._timed('get_user_invite_link'):
+            async with self.Session() as session:
+                return (await session.execute(
+                    select(InviteLink).filter_by(user_id=user_id, competition_id=competition_id)
+                )).scalars().first()
+
+    async def create_invite_link(self, user_id: int, competition_id: int, invite_link: str, name: str,
+                                 max_uses: int = -1, expire_date: Optional[datetime] = None,
+                                 points_awarded: int = 1) -> Optional[InviteLink]:
+        async with self._timed('create_invite_link'):
+            try:
+                async with self.Session() as session, session.begin():
+                    new_link = InviteLink(
+                        user_id=user_id,
+                        competition_id=competition_id,
+                        invite_link=invite_link,
+                        name=name,
+                        max_uses=max_uses,
+                        expire_date=expire_date,
+                        points_awarded=points_awarded
+                    )
+                    session.add(new_link)
+                return new_link
+            except SQLAlchemyError:
+                return None
+
+    async def add_invited_user(self, invited_by_user_id: int, invited_user_id: int, competition_id: int,
+                               invite_link_id: int) -> bool:
+        async with self._timed('add_invited_user'):
+            try:
+                async with self.Session() as session, session.begin():
+                    session.add(InvitedUser(
+                        invited_by_user_id=invited_by_user_id,
+                        invited_user_id=invited_user_id,
+                        competition_id=competition_id,
+                        invite_link_id=invite_link_id
+                    ))
+                return True
+            except SQLAlchemyError:
+                return False
+
+    async def get_user_stats(self, user_id: int, competition_id: int) -> Dict[str, Any]:
+        async with self._timed('get_user_stats'):
+            async with self.Session() as session:
+                invites_count = (await session.execute(
+                    select(CompetitionParticipant.invites_count)
+                    .filter_by(competition_id=competition_id, user_id=user_id)
+                )).scalar()
+                if invites_count is None:
+                    return {"invites_count": 0, "position": 0}
+
+                better_participants = (await session.execute(
+                    select(func.count()).select_from(CompetitionParticipant).where(
+                        CompetitionParticipant.competition_id == competition_id,
+                        CompetitionParticipant.invites_count > invites_count
+                    )
+                )).scalar()
+                return {"invites_count": invites_count, "position": better_participants + 1}
+
+    async def increment_participant_invites(self, competition_id: int, user_id: int, delta: int = 1) -> Optional[int]:
+        """Aplica um delta em invites_count sem recalcular a soma dos links; retorna o novo total"""
+        async with self._timed('increment_participant_invites'):
+            try:
+                async with self.Session() as session, session.begin():
+                    new_count = (await session.execute(text("""
+                        UPDATE competition_participants_global_global
+                        SET invites_count = invites_count + :delta, last_invite_at = NOW()
+                        WHERE competition_id = :competition_id AND user_id = :user_id
+                        RETURNING invites_count
+                    """), {"delta": delta, "competition_id": competition_id, "user_id": user_id})).scalar()
+                    if new_count is not None:
+                        await session.execute(text("""
+                            UPDATE competitions_global_global
+                            SET total_invites = total_invites + :delta
+                            WHERE id = :competition_id
+                        """), {"delta": delta, "competition_id": competition_id})
+                return new_count
+            except SQLAlchemyError:
+                return None
+
+    async def get_competition_scores(self, competition_id: int) -> List[Dict[str, Any]]:
+        """Busca pontuação e nome de todos os participantes (carga do leaderboard)"""
+        async with self._timed('get_competition_scores'):
+            try:
+                async with self.Session() as session:
+                    rows = (await session.execute(text("""
+                        SELECT cp.user_id, cp.invites_count, cp.last_invite_at, u.username, u.first_name
+                        FROM competition_participants_global_global cp
+                        LEFT JOIN users_global_global u ON u.id = cp.user_id
+                        WHERE cp.competition_id = :competition_id
+                        ORDER BY cp.invites_count DESC, cp.id ASC
+                    """), {"competition_id": competition_id})).mappings().all()
+                return [dict(row) for row in rows]
+            except SQLAlchemyError:
+                return []
+
+    async def get_competition_ranking(self, competition_id: int, limit: int = 10,
+                                      after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """Mesma consulta paginada de PostgreSQLManager.get_competition_ranking"""
+        async with self._timed('get_competition_ranking'):
+            try:
+                async with self.Session() as session:
+                    rows = (await session.execute(
+                        text(build_competition_ranking_query('id', after)),
+                        ranking_query_params(competition_id, limit, after)
+                    )).mappings().all()
+                return [dict(row) for row in rows]
+            except SQLAlchemyError:
+                return []
+
+    async def get_competition_totals(self, competition_id: int) -> Dict[str, int]:
+        """Totais mantidos na própria competição (leitura por chave primária)"""
+        async with self._timed('get_competition_totals'):
+            try:
+                async with self.Session() as session:
+                    row = (await session.execute(text("""
+                        SELECT total_participants, total_invites
+                        FROM competitions_global_global
+                        WHERE id = :competition_id
+                    """), {"competition_id": competition_id})).first()
+            except SQLAlchemyError:
+                row = None
+        if not row:
+            return {'total_participants': 0, 'total_invites': 0}
+        return {'total_participants': row[0] or 0, 'total_invites': row[1] or 0}
+
+    async def get_reached_milestones(self, competition_id: int) -> List[Tuple[int, int]]:
+        """Marcos já registrados da competição: [(escopo, marco)]"""
+        async with self._timed('get_reached_milestones'):
+            try:
+                async with self.Session() as session:
+                    rows = (await session.execute(text("""
+                        SELECT scope_user_id, milestone
+                        FROM milestone_ledger_global_global
+                        WHERE competition_id = :competition_id
+                    """), {"competition_id": competition_id})).all()
+                return [(row[0], row[1]) for row in rows]
+            except SQLAlchemyError:
+                return []
+
+    async def claim_milestones(self, competition_id: int, scope_user_id: int, milestones: List[int]) -> Optional[List[int]]:
+        """Registra os marcos; retorna apenas os inseridos agora (None em caso de erro)"""
+        async with self._timed('claim_milestones'):
+            try:
+                async with self.Session() as session, session.begin():
+                    rows = (await session.execute(text("""
+                        INSERT INTO milestone_ledger_global_global (competition_id, scope_user_id, milestone, reached_at)
+                        SELECT :competition_id, :scope_user_id, m, NOW()
+                        FROM unnest(CAST(:milestones AS BIGINT[])) AS m
+                        ON CONFLICT DO NOTHING
+                        RETURNING milestone
+                    """), {"competition_id": competition_id, "scope_user_id": scope_user_id,
+                           "milestones": list(milestones)})).all()
+                return [row[0] for row in rows]
+            except SQLAlchemyError:
+                return None
+
+    async def get_registry_invite_links(self, competition_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Links ativos (da competição, se informada) para pré-carregar o registro de links"""
+        query = """
+            SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+            FROM invite_links_global_global
+            WHERE is_active = TRUE
+        """
+        params = {}
+        if competition_id is not None:
+            query += " AND competition_id = :competition_id"
+            params["competition_id"] = competition_id
+
+        async with self._timed('get_registry_invite_links'):
+            try:
+                async with self.Session() as session:
+                    rows = (await session.execute(text(query), params)).mappings().all()
+                return [dict(row) for row in rows]
+            except SQLAlchemyError:
+                return []
+
+    async def get_invite_link_by_url(self, invite_link: str) -> Optional[Dict[str, Any]]:
+        """Resolve a URL do link (fallback do registro de links)"""
+        async with self._timed('get_invite_link_by_url'):
+            try:
+                async with self.Session() as session:
+                    row = (await session.execute(text("""
+                        SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+                        FROM invite_links_global_global
+                        WHERE invite_link = :invite_link
+                        LIMIT 1
+                    """), {"invite_link": invite_link})).mappings().first()
+                return dict(row) if row else None
+            except SQLAlchemyError:
+                return None
+
+    async def apply_invite_credits_batch(self, credits: List[Tuple[int, int, str, int]]) -> bool:
+        """Mesma semântica de PostgreSQLManager.apply_invite_credits_batch (uma transação por lote)"""
+        if not credits:
+            return True
+
+        link_deltas, user_deltas, participant_deltas = invite_credit_queries.aggregate_invite_credits(credits)
+
+        async with self._timed('apply_invite_credits_batch'):
+            try:
+                async with self.Session() as session, session.begin():
+                    sql, params = invite_credit_queries.users_upsert(user_deltas)
+                    await session.execute(text(sql), params)
+
+                    sql, params = invite_credit_queries.participants_upsert(participant_deltas)
+                    written = (await session.execute(text(sql), params)).fetchall()
+                    if len(written) != len(participant_deltas):
+                        raise SQLAlchemyError(f"{len(participant_deltas) - len(written)} participantes não gravados")
+
+                    sql, params = invite_credit_queries.competition_totals_update(participant_deltas, written)
+                    await session.execute(text(sql), params)
+
+                    sql, params = invite_credit_queries.links_update(link_deltas)
+                    updated_links = (await session.execute(text(sql), params)).fetchall()
+                    missing_links = set(link_deltas) - {row.invite_link for row in updated_links}
+                    if missing_links:
+                        logger.warning(f"⚠️ {len(missing_links)} links inexistentes, usos não contabilizados: {sorted(missing_links)[:5]}")
+                return True
+            except SQLAlchemyError as e:
+                logger.error(f"❌ Erro ao aplicar lote de {len(credits)} créditos de convite: {e}")
+                return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado do pool e latência por método"""
+        pool = self.engine.pool
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "methods": {
+                method: {
+                    "calls": int(stat["calls"]),
+                    "avg_ms": round(stat["total_ms"] / stat["calls"], 2) if stat["calls"] else 0.0,
+                    "max_ms": round(stat["max_ms"], 2)
+                }
+                for method, stat in self.metrics.items()
+            }
+        }
@@ -5,10 +5,15 @@ Correção crítica: Cada usuário só pode ser convidado UMA VEZ por inviter (g
 """
 import asyncio
 import logging
+import time
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
 from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass
-from sqlalchemy import VARCHAR
+
+import numpy as np
+from sqlalchemy import VARCHAR, text
+from src.config.settings import settings
+from src.database.bloom_filter import ScalableBloomFilter, write_snapshot
 from src.database.postgresql_optimized import postgresql_optimized, FraudDetectionResult
 
 logger = logging.getLogger(__name__)
@@ -21,6 +26,27 @@ class PostgreSQLGlobalUnique:
     
     def __init__(self):
         self.db = postgresql_optimized
+        
+        # Pré-filtro em memória dos pares (convidado, convidador) já registrados:
+        # "não está no filtro" dispensa o SELECT; "talvez" vai ao banco
+        self.invite_filter: Optional[ScalableBloomFilter] = None
+        self._filter_lock = asyncio.Lock()
+        self._filter_task: Optional[asyncio.Task] = None
+        self._filter_retry_at = 0.0
+        self._filter_failures = 0
+        self._filter_saving = False
+        self._filter_max_id = 0
+        self._filter_unsaved = 0
+        self.filter_metrics = {
+            "lookups": 0,
+            "skipped_lookups": 0,
+            "db_lookups": 0,
+            "false_positives": 0,
+            "stale_negatives": 0,
+            "snapshot_loads": 0,
+            "snapshot_saves": 0,
+            "load_failures": 0
+        }
     
     async def create_global_unique_schema(self):
         """
@@ -239,11 +265,164 @@ class PostgreSQLGlobalUnique:
             await session.execute(text(text(text(indexes_sql))
             logger.info("✅ Índices globais criados")
     
+    def start_invite_filter(self) -> Optional[asyncio.Task]:
+        """
+        Dispara a carga do pré-filtro em segundo plano (chamado na inicialização do bot).
+        Enquanto não fica pronto, as validações consultam o banco normalmente; depois de
+        uma falha, nova tentativa só após o backoff.
+        """
+        if not settings.UNIQUE_INVITE_FILTER_ENABLED or self.invite_filter is not None:
+            return None
+        if self._filter_task is not None and not self._filter_task.done():
+            return self._filter_task
+        if time.monotonic() < self._filter_retry_at:
+            return None
+        self._filter_task = asyncio.create_task(self.load_invite_filter())
+        return self._filter_task
+    
+    async def load_invite_filter(self) -> bool:
+        """
+        Monta o pré-filtro de convites únicos: parte do snapshot (se houver) e lê
+        do banco só as linhas com id maior que o último incluído; sem snapshot,
+        lê a tabela inteira em blocos
+        """
+        if not settings.UNIQUE_INVITE_FILTER_ENABLED:
+            return False
+        
+        capacity = settings.UNIQUE_INVITE_FILTER_CAPACITY
+        fpr = settings.UNIQUE_INVITE_FILTER_FPR
+        path = settings.UNIQUE_INVITE_FILTER_SNAPSHOT_PATH
+        
+        async with self._filter_lock:
+            if self.invite_filter is not None:
+                return True
+            try:
+                bloom, max_id = ScalableBloomFilter(capacity, fpr), 0
+                snapshot = await asyncio.get_running_loop().run_in_executor(
+                    None, ScalableBloomFilter.load, path, capacity, fpr
+                )
+                if snapshot:
+                    bloom, header = snapshot
+                    max_id = int(header.get("max_id", 0))
+                    self.filter_metrics["snapshot_loads"] += 1
+                
+                chunk_size = settings.UNIQUE_INVITE_FILTER_LOAD_CHUNK
+                added = 0
+                async with self.db.async_session_factory() as session:
+                    while True:
+                        result = await session.execute(text("""
+                            SELECT id, invited_user_id, inviter_user_id
+                            FROM global_global_global_unique_invited_users_global_global
+                            WHERE id > :after_id
+                            ORDER BY id
+                            LIMIT :limit
+                        """), {'after_id': max_id, 'limit': chunk_size})
+                        rows = result.fetchall()
+                        if not rows:
+                            break
+                        
+                        bloom.add_many(np.fromiter((row.invited_user_id for row in rows), dtype=np.int64, count=len(rows)),
+                                       np.fromiter((row.inviter_user_id for row in rows), dtype=np.int64, count=len(rows)))
+                        max_id = rows[-1].id
+                        added += len(rows)
+                
+                self.invite_filter = bloom
+                self._filter_max_id = max_id
+                self._filter_unsaved = 0
+                self._filter_failures = 0
+                if added or not snapshot:
+                    await self.save_invite_filter()
+                
+                logger.info(f"✅ Pré-filtro de convites únicos pronto: {len(bloom):,} pares "
+                            f"({added:,} lidos do banco{', a partir do snapshot' if snapshot else ''})")
+                return True
+                
+            except Exception as e:
+                self._filter_failures += 1
+                backoff = min(settings.UNIQUE_INVITE_FILTER_RETRY_SECONDS * 2 ** (self._filter_failures - 1), 3600)
+                self._filter_retry_at = time.monotonic() + backoff
+                self.filter_metrics["load_failures"] += 1
+                logger.error(f"❌ Erro ao montar pré-filtro de convites únicos (nova tentativa em {backoff:.0f}s): {e}")
+                return False
+    
+    async def save_invite_filter(self):
+        """Grava o snapshot do pré-filtro (com o último id incluído) fora do event loop"""
+        if self.invite_filter is None or self._filter_saving:
+            return
+        self._filter_saving = True
+        try:
+            # Cópia dos bits no loop (consistente); só a escrita vai para a thread
+            data = self.invite_filter.snapshot_bytes({"max_id": self._filter_max_id})
+            self._filter_unsaved = 0
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_snapshot, settings.UNIQUE_INVITE_FILTER_SNAPSHOT_PATH, data
+            )
+            self.filter_metrics["snapshot_saves"] += 1
+        except OSError as e:
+            logger.warning(f"⚠️ Não foi possível gravar o snapshot do pré-filtro: {e}")
+        finally:
+            self._filter_saving = False
+    
+    def _filter_says_new(self, invited_user_id: int, inviter_user_id: int) -> bool:
+        """True se o pré-filtro garante que o par nunca foi registrado (dispensa o SELECT)"""
+        if not settings.UNIQUE_INVITE_FILTER_ENABLED:
+            return False
+        if self.invite_filter is None:
+            # Ainda carregando (ou em backoff): não bloqueia a entrada, vai ao banco
+            self.start_invite_filter()
+            return False
+        
+        self.filter_metrics["lookups"] += 1
+        if self.invite_filter.might_contain(invited_user_id, inviter_user_id):
+            self.filter_metrics["db_lookups"] += 1
+            return False
+        self.filter_metrics["skipped_lookups"] += 1
+        return True
+    
+    def _remember_invite(self, invited_user_id: int, inviter_user_id: int, global_unique_id: Optional[int] = None):
+        """Inclui no pré-filtro um par recém-registrado; grava snapshot a cada N inclusões"""
+        if self.invite_filter is None:
+            return
+        self.invite_filter.add(invited_user_id, inviter_user_id)
+        # Linhas de outros processos abaixo desse id ficam de fora do filtro; o
+        # ON CONFLICT da inserção cobre esse caso (ver stale_negatives)
+        if global_unique_id:
+            self._filter_max_id = max(self._filter_max_id, global_unique_id)
+        self._filter_unsaved += 1
+        if self._filter_unsaved >= settings.UNIQUE_INVITE_FILTER_SNAPSHOT_EVERY and not self._filter_saving:
+            asyncio.create_task(self.save_invite_filter())
+    
+    def get_invite_filter_stats(self) -> Dict[str, Any]:
+        """Tamanho do pré-filtro e taxa de falso positivo (observada e estimada)"""
+        metrics = dict(self.filter_metrics)
+        # Entre os pares ausentes do banco, fração que o filtro mandou consultar
+        absent = metrics["false_positives"] + metrics["skipped_lookups"]
+        stats = {
+            "enabled": settings.UNIQUE_INVITE_FILTER_ENABLED,
+            "ready": self.invite_filter is not None,
+            "observed_fpr": round(metrics["false_positives"] / absent, 6) if absent else 0.0,
+            "target_fpr": settings.UNIQUE_INVITE_FILTER_FPR,
+            **metrics
+        }
+        if self.invite_filter is not None:
+            stats.update({
+                "items": len(self.invite_filter),
+                "layers": len(self.invite_filter.layers),
+                "memory_bytes": self.invite_filter.memory_bytes(),
+                "estimated_fpr": round(self.invite_filter.estimated_fpr(), 6),
+                "snapshot_max_id": self._filter_max_id
+            })
+        return stats
+    
     async def validate_global_unique_invite(self, invited_user_id: int, inviter_user_id: int, 
-                                          competition_id: int, invite_link_id: int) -> FraudDetectionResult:
+                                          competition_id: int, invite_link_id: int,
+                                          use_filter: bool = True) -> FraudDetectionResult:
         """
         Validação GLOBAL - Cada usuário só pode ser convidado UMA VEZ por inviter (para sempre)
         MÉTODO PRINCIPAL com proteção absoluta contra fraudes
+        
+        O pré-filtro em memória é consultado antes: se garante que o par é novo,
+        o SELECT é dispensado e a inserção (ON CONFLICT) confirma no banco.
         """
         try:
             logger.info(f"🔍 Validação GLOBAL: usuário {invited_user_id} por {inviter_user_id}")
@@ -263,11 +442,15 @@ class PostgreSQLGlobalUnique:
                     AND inviter_user_id = :inviter_user_id
                 """)
                 
-                result = await session.execute(text(global_check_query, {
-                    'invited_user_id': invited_user_id,
-                    'inviter_user_id': inviter_user_id
-                })
-                existing_global = result.fetchone()
+                existing_global = None
+                if not (use_filter and self._filter_says_new(invited_user_id, inviter_user_id)):
+                    result = await session.execute(text(global_check_query, {
+                        'invited_user_id': invited_user_id,
+                        'inviter_user_id': inviter_user_id
+                    })
+                    existing_global = result.fetchone()
+                    if existing_global is None and use_filter and self.invite_filter is not None:
+                        self.filter_metrics["false_positives"] += 1
                 
                 if existing_global:
                     # USUÁRIO JÁ FOI CONVIDADO - FRAUDE DETECTADA
@@ -326,6 +509,7 @@ class PostgreSQLGlobalUnique:
                      first_join_timestamp, is_globally_valid)
                     VALUES (:invited_user_id, :inviter_user_id, :competition_id, :invite_link_id,
                             NOW(), TRUE)
+                    ON CONFLICT (invited_user_id, inviter_user_id) DO NOTHING
                     RETURNING id
                 """)
                 
@@ -338,6 +522,18 @@ class PostgreSQLGlobalUnique:
                 
                 global_unique_id = result.scalar()
                 
+                if global_unique_id is None:
+                    # Par já registrado (pré-filtro desatualizado ou inserção concorrente):
+                    # refaz pelo caminho com SELECT para tratar como tentativa repetida
+                    await session.rollback()
+                    if not use_filter:
+                        raise RuntimeError("conflito ao registrar convite global")
+                    self.filter_metrics["stale_negatives"] += 1
+                    self._remember_invite(invited_user_id, inviter_user_id)
+                    return await self.validate_global_unique_invite(
+                        invited_user_id, inviter_user_id, competition_id, invite_link_id, use_filter=False
+                    )
+                
                 # Log da tentativa válida
                 await self._log_invite_attempt(
                     session, invited_user_id, inviter_user_id, 
@@ -346,6 +542,7 @@ class PostgreSQLGlobalUnique:
                 )
                 
                 await session.commit()
+                self._remember_invite(invited_user_id, inviter_user_id, global_unique_id)
                 
                 logger.info(f"✅ CONVITE GLOBAL VÁLIDO: {invited_user_id} por {inviter_user_id} (ID: {global_unique_id})")
                 
@@ -453,7 +650,8 @@ class PostgreSQLGlobalUnique:
                     'protection_effectiveness': {
                         'fraud_prevention_rate': (data.relationships_with_fraud / max(data.total_unique_relationships, 1)) * 100,
                         'system_integrity': 'MÁXIMA' if (data.fraud_attempts_count or 0) == 0 else 'ALTA'
-                    }
+                    },
+                    'invite_filter': self.get_invite_filter_stats()
                 }
                 
         except Exception as e:
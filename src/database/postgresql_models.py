@@ -2,18 +2,25 @@ from src.database.postgresql_global_unique import postgresql_global_unique
 """
 Modelos PostgreSQL para o Bot de Ranking de Convites
 """
-from sqlalchemy import create_engine, Column, BIGINT, String, TIMESTAMP WITH TIME ZONE, Boolean, BigInteger, ForeignKey, UniqueConstraint
+from sqlalchemy import create_engine, Column, BIGINT, String, TIMESTAMP WITH TIME ZONE, Boolean, BigInteger, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
-from typing import List, Optional, Dict, Any
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
 import os
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Importar settings para configuração do banco
 from src.config.settings import settings
+from src.database import invite_credit_queries
+from src.database.ranking_queries import build_competition_ranking_query, ranking_query_params
 
 Base = declarative_base()
 
@@ -23,6 +30,7 @@ class User(Base):
     username = Column(String, nullable=True)
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
+    total_invites = Column(BIGINT, default=0)
     created_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now)
     updated_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now, onupdate=TIMESTAMP WITH TIME ZONE.now)
 
@@ -45,8 +53,12 @@ class CompetitionParticipant(Base):
     competition_id = Column(BIGINT, ForeignKey('competitions_global_global.id'), nullable=False)
     user_id = Column(BigInteger, ForeignKey('users_global_global.id'), nullable=False)
     invites_count = Column(BIGINT, default=0)
+    position = Column(BIGINT, nullable=True)
     last_invite_at = Column(TIMESTAMP WITH TIME ZONE, nullable=True)
-    __table_args__ = (UniqueConstraint('competition_id', 'user_id', name='_competition_user_uc'),)
+    __table_args__ = (
+        UniqueConstraint('competition_id', 'user_id', name='_competition_user_uc'),
+        Index('idx_participants_competition_invites', 'competition_id', 'invites_count', 'user_id'),
+    )
 
 class InviteLink(Base):
     __tablename__ = 'invite_links_global_global'
@@ -62,6 +74,7 @@ class InviteLink(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now)
     updated_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now, onupdate=TIMESTAMP WITH TIME ZONE.now)
+    __table_args__ = (Index('idx_invite_links_competition_updated', 'competition_id', 'updated_at'),)
 
 class InvitedUser(Base):
     __tablename__ = 'invited_users_global_global'
@@ -72,15 +85,31 @@ class InvitedUser(Base):
     invite_link_id = Column(BIGINT, ForeignKey('invite_links_global_global.id'), nullable=False)
     invited_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now)
 
+class MilestoneLedgerEntry(Base):
+    __tablename__ = 'milestone_ledger_global_global'
+    competition_id = Column(BIGINT, ForeignKey('competitions_global_global.id'), primary_key=True)
+    scope_user_id = Column(BigInteger, primary_key=True)  # 0 = marco da competição
+    milestone = Column(BIGINT, primary_key=True)
+    reached_at = Column(TIMESTAMP WITH TIME ZONE, default=TIMESTAMP WITH TIME ZONE.now)
+
+def get_database_url() -> str:
+    """Usar DATABASE_URL se disponível, senão usar configuração padrão"""
+    database_url = getattr(settings, 'DATABASE_URL', None)
+    if not database_url:
+        database_url = f"postgresql://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
+    return database_url
+
 class PostgreSQLManager:
     def __init__(self):
         try:
-            # Usar DATABASE_URL se disponível, senão usar configuração padrão
-            database_url = getattr(settings, 'DATABASE_URL', None)
-            if not database_url:
-                database_url = f"postgresql://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
-            
-            self.engine = create_engine(database_url)
+            self.engine = create_engine(
+                get_database_url(),
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+                pool_recycle=settings.DB_POOL_RECYCLE,
+                pool_pre_ping=True
+            )
             self.Session = sessionmaker(bind=self.engine)
             Base.metadata.create_all(self.engine)
         except Exception as e:
@@ -170,6 +199,10 @@ class PostgreSQLManager:
                 user_id=user_id
             )
             session.add(new_participant)
+            # Agregado da competição na mesma transação
+            session.query(Competition).filter_by(id=competition_id).update(
+                {Competition.total_participants: Competition.total_participants + 1}, synchronize_session=False
+            )
             session.commit()
             return True
         except SQLAlchemyError:
@@ -183,8 +216,13 @@ class PostgreSQLManager:
         try:
             participant = session.query(CompetitionParticipant).filter_by(competition_id=competition_id, user_id=user_id).first()
             if participant:
+                delta = invites_count - (participant.invites_count or 0)
                 participant.invites_count = invites_count
                 participant.last_invite_at = TIMESTAMP WITH TIME ZONE.now()
+                if delta:
+                    session.query(Competition).filter_by(id=competition_id).update(
+                        {Competition.total_invites: Competition.total_invites + delta}, synchronize_session=False
+                    )
                 session.commit()
                 return True
             return False
@@ -260,3 +298,407 @@ class PostgreSQLManager:
         finally:
             session.close()
 
+    def apply_invite_credits_batch(self, credits: List[Tuple[int, int, str, int]]) -> bool:
+        """
+        Aplica em uma única transação um lote de créditos de convite
+        (competition_id, user_id, invite_link, delta) já agregados.
+        Usuários e participantes entram por upsert; um link que não existe
+        mais só perde a contagem de usos, sem derrubar os créditos do lote.
+        """
+        if not credits:
+            return True
+
+        link_deltas, user_deltas, participant_deltas = invite_credit_queries.aggregate_invite_credits(credits)
+
+        session = self.Session()
+        try:
+            sql, params = invite_credit_queries.users_upsert(user_deltas)
+            session.execute(text(sql), params)
+
+            sql, params = invite_credit_queries.participants_upsert(participant_deltas)
+            written = session.execute(text(sql), params).fetchall()
+            if len(written) != len(participant_deltas):
+                raise SQLAlchemyError(f"{len(participant_deltas) - len(written)} participantes não gravados")
+
+            sql, params = invite_credit_queries.competition_totals_update(participant_deltas, written)
+            session.execute(text(sql), params)
+
+            sql, params = invite_credit_queries.links_update(link_deltas)
+            updated_links = session.execute(text(sql), params).fetchall()
+            missing_links = set(link_deltas) - {row.invite_link for row in updated_links}
+            if missing_links:
+                # Link apagado depois da entrada: o crédito do participante vale, só os usos se perdem
+                logger.warning(f"⚠️ {len(missing_links)} links inexistentes, usos não contabilizados: {sorted(missing_links)[:5]}")
+
+            session.commit()
+            return True
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"❌ Erro ao aplicar lote de {len(credits)} créditos de convite: {e}")
+            return False
+        finally:
+            session.close()
+
+    def increment_participant_invites(self, competition_id: int, user_id: int, delta: int = 1) -> Optional[int]:
+        """Aplica um delta em invites_count sem recalcular a soma dos links; retorna o novo total"""
+        session = self.Session()
+        try:
+            new_count = session.execute(text("""
+                UPDATE competition_participants_global_global
+                SET invites_count = invites_count + :delta, last_invite_at = NOW()
+                WHERE competition_id = :competition_id AND user_id = :user_id
+                RETURNING invites_count
+            """), {"delta": delta, "competition_id": competition_id, "user_id": user_id}).scalar()
+            if new_count is not None:
+                session.execute(text("""
+                    UPDATE competitions_global_global
+                    SET total_invites = total_invites + :delta
+                    WHERE id = :competition_id
+                """), {"delta": delta, "competition_id": competition_id})
+            session.commit()
+            return new_count
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def reconcile_participant_points(self, competition_id: int, since: Optional[datetime] = None,
+                                     overlap_seconds: int = 300) -> Optional[Tuple[int, datetime]]:
+        """
+        Recalcula invites_count = SUM(uses) apenas para usuários com links
+        alterados desde `since` (todos se None). Retorna (linhas corrigidas,
+        próximo watermark) ou None em caso de erro.
+        """
+        session = self.Session()
+        try:
+            changed_filter = "AND updated_at > :since" if since is not None else ""
+            result = session.execute(text(f"""
+                UPDATE competition_participants_global_global cp
+                SET invites_count = agg.total_uses,
+                    last_invite_at = COALESCE(agg.last_invite, cp.last_invite_at)
+                FROM (
+                    SELECT il.user_id,
+                           COALESCE(SUM(il.uses), 0) AS total_uses,
+                           MAX(il.created_at) FILTER (WHERE il.uses > 0) AS last_invite
+                    FROM invite_links_global_global il
+                    WHERE il.competition_id = :competition_id
+                      AND il.user_id IN (
+                          SELECT DISTINCT user_id FROM invite_links_global_global
+                          WHERE competition_id = :competition_id {changed_filter}
+                      )
+                    GROUP BY il.user_id
+                ) agg
+                WHERE cp.competition_id = :competition_id
+                  AND cp.user_id = agg.user_id
+                  AND cp.invites_count IS DISTINCT FROM agg.total_uses
+            """), {"competition_id": competition_id, "since": since})
+
+            # NOW() é o início da transação; a sobreposição cobre transações concorrentes
+            watermark = session.execute(
+                text("SELECT NOW() - make_interval(secs => :overlap)"),
+                {"overlap": overlap_seconds}
+            ).scalar()
+
+            session.commit()
+            return result.rowcount, watermark
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def recompute_ranking_positions(self, competition_id: int) -> Optional[int]:
+        """Recalcula todas as posições com RANK() em um único UPDATE ... FROM"""
+        session = self.Session()
+        try:
+            result = session.execute(text("""
+                UPDATE competition_participants_global_global cp
+                SET position = ranked.new_position
+                FROM (
+                    SELECT id, RANK() OVER (ORDER BY invites_count DESC) AS new_position
+                    FROM competition_participants_global_global
+                    WHERE competition_id = :competition_id
+                ) ranked
+                WHERE cp.id = ranked.id
+                  AND cp.position IS DISTINCT FROM ranked.new_position
+            """), {"competition_id": competition_id})
+            session.commit()
+            return result.rowcount
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def shift_ranking_positions(self, competition_id: int, user_id: int, old_score: int, new_score: int) -> Optional[int]:
+        """
+        Ajuste incremental após o usuário passar de old_score para new_score:
+        apenas quem tem pontuação em [old_score, new_score) desce uma posição.
+        """
+        if new_score <= old_score:
+            return 0
+
+        session = self.Session()
+        try:
+            shifted = session.execute(text("""
+                UPDATE competition_participants_global_global
+                SET position = position + 1
+                WHERE competition_id = :competition_id
+                  AND user_id <> :user_id
+                  AND invites_count >= :old_score
+                  AND invites_count < :new_score
+            """), {"competition_id": competition_id, "user_id": user_id,
+                   "old_score": old_score, "new_score": new_score})
+
+            own = session.execute(text("""
+                UPDATE competition_participants_global_global
+                SET position = (
+                    SELECT COUNT(*) + 1 FROM competition_participants_global_global
+                    WHERE competition_id = :competition_id AND invites_count > :new_score
+                )
+                WHERE competition_id = :competition_id AND user_id = :user_id
+            """), {"competition_id": competition_id, "user_id": user_id, "new_score": new_score})
+
+            session.commit()
+            return shifted.rowcount + own.rowcount
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def get_competition_scores(self, competition_id: int) -> List[Dict[str, Any]]:
+        """Busca pontuação e nome de todos os participantes (carga do leaderboard)"""
+        session = self.Session()
+        try:
+            rows = session.execute(text("""
+                SELECT cp.user_id, cp.invites_count, cp.last_invite_at, u.username, u.first_name
+                FROM competition_participants_global_global cp
+                LEFT JOIN users_global_global u ON u.id = cp.user_id
+                WHERE cp.competition_id = :competition_id
+                ORDER BY cp.invites_count DESC, cp.id ASC
+            """), {"competition_id": competition_id}).mappings().all()
+            return [dict(row) for row in rows]
+        except SQLAlchemyError:
+            return []
+        finally:
+            session.close()
+
+    def get_competition_ranking(self, competition_id: int, limit: int = 10,
+                                after: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Busca uma página do ranking com os nomes já unidos (uma única consulta).
+        after: (invites_count, user_id) da última linha da página anterior
+        """
+        session = self.Session()
+        try:
+            rows = session.execute(
+                text(build_competition_ranking_query('id', after)),
+                ranking_query_params(competition_id, limit, after)
+            ).mappings().all()
+            return [dict(row) for row in rows]
+        except SQLAlchemyError:
+            return []
+        finally:
+            session.close()
+
+    def get_reached_milestones(self, competition_id: int) -> List[Tuple[int, int]]:
+        """Marcos já registrados da competição: [(escopo, marco)]"""
+        session = self.Session()
+        try:
+            rows = session.execute(text("""
+                SELECT scope_user_id, milestone
+                FROM milestone_ledger_global_global
+                WHERE competition_id = :competition_id
+            """), {"competition_id": competition_id}).all()
+            return [(row[0], row[1]) for row in rows]
+        except SQLAlchemyError:
+            return []
+        finally:
+            session.close()
+
+    def claim_milestones(self, competition_id: int, scope_user_id: int, milestones: List[int]) -> Optional[List[int]]:
+        """Registra os marcos; retorna apenas os inseridos agora (None em caso de erro)"""
+        session = self.Session()
+        try:
+            rows = session.execute(text("""
+                INSERT INTO milestone_ledger_global_global (competition_id, scope_user_id, milestone, reached_at)
+                SELECT :competition_id, :scope_user_id, m, NOW()
+                FROM unnest(CAST(:milestones AS BIGINT[])) AS m
+                ON CONFLICT DO NOTHING
+                RETURNING milestone
+            """), {"competition_id": competition_id, "scope_user_id": scope_user_id,
+                   "milestones": list(milestones)}).all()
+            session.commit()
+            return [row[0] for row in rows]
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def get_competition_totals(self, competition_id: int) -> Dict[str, int]:
+        """Totais mantidos na própria competição (leitura por chave primária)"""
+        session = self.Session()
+        try:
+            row = session.execute(text("""
+                SELECT total_participants, total_invites
+                FROM competitions_global_global
+                WHERE id = :competition_id
+            """), {"competition_id": competition_id}).first()
+            if not row:
+                return {'total_participants': 0, 'total_invites': 0}
+            return {'total_participants': row[0] or 0, 'total_invites': row[1] or 0}
+        except SQLAlchemyError:
+            return {'total_participants': 0, 'total_invites': 0}
+        finally:
+            session.close()
+
+    def reconcile_competition_totals(self, competition_id: int) -> Optional[int]:
+        """Recalcula os totais da competição a partir dos participantes; retorna 1 se corrigiu"""
+        session = self.Session()
+        try:
+            result = session.execute(text("""
+                UPDATE competitions_global_global c
+                SET total_participants = agg.participants, total_invites = agg.invites
+                FROM (
+                    SELECT COUNT(*) AS participants, COALESCE(SUM(invites_count), 0) AS invites
+                    FROM competition_participants_global_global
+                    WHERE competition_id = :competition_id
+                ) agg
+                WHERE c.id = :competition_id
+                  AND (c.total_participants IS DISTINCT FROM agg.participants
+                       OR c.total_invites IS DISTINCT FROM agg.invites)
+            """), {"competition_id": competition_id})
+            session.commit()
+            return result.rowcount
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def get_registry_invite_links(self, competition_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Links ativos (da competição, se informada) para pré-carregar o registro de links"""
+        session = self.Session()
+        try:
+            query = """
+                SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+                FROM invite_links_global_global
+                WHERE is_active = TRUE
+            """
+            params = {}
+            if competition_id is not None:
+                query += " AND competition_id = :competition_id"
+                params["competition_id"] = competition_id
+            rows = session.execute(text(query), params).mappings().all()
+            return [dict(row) for row in rows]
+        except SQLAlchemyError:
+            return []
+        finally:
+            session.close()
+
+    def get_invite_link_by_url(self, invite_link: str) -> Optional[Dict[str, Any]]:
+        """Resolve a URL do link (fallback do registro de links)"""
+        session = self.Session()
+        try:
+            row = session.execute(text("""
+                SELECT id, user_id, invite_link, competition_id, is_active, max_uses
+                FROM invite_links_global_global
+                WHERE invite_link = :invite_link
+                LIMIT 1
+            """), {"invite_link": invite_link}).mappings().first()
+            return dict(row) if row else None
+        except SQLAlchemyError:
+            return None
+        finally:
+            session.close()
+
+    def get_expired_invite_links(self, now: datetime, after_id: int = 0, limit: int = 200) -> List[Dict[str, Any]]:
+        """Próximo bloco (keyset por id) de links ativos já expirados"""
+        session = self.Session()
+        try:
+            rows = session.execute(text("""
+                SELECT id, invite_link
+                FROM invite_links_global_global
+                WHERE is_active = TRUE AND expire_date < :now AND id > :after_id
+                ORDER BY id
+                LIMIT :limit
+            """), {"now": now, "after_id": after_id, "limit": limit}).mappings().all()
+            return [dict(row) for row in rows]
+        except SQLAlchemyError:
+            return []
+        finally:
+            session.close()
+
+    def deactivate_invite_link(self, link_id: int) -> bool:
+        """Marca um link como inativo"""
+        session = self.Session()
+        try:
+            session.execute(text("""
+                UPDATE invite_links_global_global
+                SET is_active = FALSE, updated_at = NOW()
+                WHERE id = :link_id
+            """), {"link_id": link_id})
+            session.commit()
+            return True
+        except SQLAlchemyError:
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def increment_invite_link_uses(self, invite_link: str, delta: int = 1) -> Optional[int]:
+        """Soma delta aos usos do link e ao total do dono; retorna os usos atualizados"""
+        session = self.Session()
+        try:
+            row = session.execute(text("""
+                WITH link AS (
+                    UPDATE invite_links_global_global
+                    SET uses = uses + :delta, updated_at = NOW()
+                    WHERE invite_link = :invite_link AND is_active = TRUE
+                    RETURNING user_id, uses
+                ), owner AS (
+                    UPDATE users_global_global u
+                    SET total_invites = u.total_invites + :delta, updated_at = NOW()
+                    FROM link
+                    WHERE u.id = link.user_id
+                )
+                SELECT uses FROM link
+            """), {"invite_link": invite_link, "delta": delta}).first()
+            session.commit()
+            return row[0] if row else None
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def reconcile_invite_link_uses(self) -> Optional[int]:
+        """
+        Eleva os usos de cada link ativo à quantidade de membros rastreados por ele
+        na competição atual do link; retorna quantos links foram corrigidos
+        """
+        session = self.Session()
+        try:
+            result = session.execute(text("""
+                UPDATE invite_links_global_global il
+                SET uses = agg.members, updated_at = NOW()
+                FROM (
+                    SELECT invite_link_id, competition_id, COUNT(*) AS members
+                    FROM invited_users_global_global
+                    GROUP BY invite_link_id, competition_id
+                ) agg
+                WHERE il.id = agg.invite_link_id
+                  AND il.competition_id = agg.competition_id
+                  AND il.is_active = TRUE
+                  AND il.uses < agg.members
+            """))
+            session.commit()
+            return result.rowcount
+        except SQLAlchemyError:
+            session.rollback()
+            return None
+        finally:
+            session.close()
@@ -6,12 +6,13 @@ Arquitetura de alta performance com proteção contra manipulação de convites
 import asyncio
 import logging
 from TIMESTAMP WITH TIME ZONE import TIMESTAMP WITH TIME ZONE, timedelta
+from datetime import datetime
 from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass
 from contextlib import asynccontextmanager
 import asyncpg
 import json
-from sqlalchemy import create_engine, VARCHAR
+from sqlalchemy import create_engine, VARCHAR, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.pool import QueuePool
@@ -285,6 +286,19 @@ class PostgreSQLOptimized:
             
             FOREIGN KEY (user_id) REFERENCES users_global_global_optimized (id)
         );
+        
+        -- Perfis comportamentais que saíram da memória do serviço anti-fraude
+        CREATE TABLE IF NOT EXISTS user_behavior_profiles_global_global (
+            user_id BIGINT PRIMARY KEY,
+            join_frequency REAL NOT NULL DEFAULT 0,
+            leave_frequency REAL NOT NULL DEFAULT 0,
+            invite_pattern_score REAL NOT NULL DEFAULT 0,
+            risk_score REAL NOT NULL DEFAULT 0,
+            time_between_actions JSONB NOT NULL DEFAULT '[]',
+            suspicious_indicators JSONB NOT NULL DEFAULT '[]',
+            last_seen TIMESTAMP WITH TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
         """
         
         async with self.async_engine.begin() as conn:
@@ -525,6 +539,147 @@ class PostgreSQLOptimized:
                 metadata={'error': str(e)}
             )
     
+    async def prefetch_fraud_context(self, invited_user_ids: List[int], competition_id: int,
+                                     history_hours: int = 1) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Dados do detect_fraud e do histórico para um lote de convidados,
+        em uma consulta por tipo (sem cache Redis por usuário)
+        """
+        params = {'user_ids': list(invited_user_ids), 'competition_id': competition_id, 'hours': history_hours}
+        
+        async with self.async_session_factory() as session:
+            existing = await session.execute(text("""
+                SELECT id, invited_user_id, inviter_user_id, join_count, leave_count, fraud_flags
+                FROM global_global_unique_invited_users_global_global
+                WHERE competition_id = :competition_id
+                AND invited_user_id = ANY(:user_ids)
+            """), params)
+            
+            recent = await session.execute(text("""
+                SELECT invited_user_id, COUNT(*) AS recent_invites
+                FROM global_global_unique_invited_users_global_global
+                WHERE invited_user_id = ANY(:user_ids)
+                AND first_join_timestamp > NOW() - INTERVAL '1 hour'
+                GROUP BY invited_user_id
+            """), params)
+            
+            blacklisted = await session.execute(text("""
+                SELECT user_id, blacklist_reason, fraud_score
+                FROM users_global_global_optimized
+                WHERE user_id = ANY(:user_ids)
+                AND is_blacklisted = TRUE
+            """), params)
+            
+            # Mesmo recorte do histórico por usuário (últimas 50 ações), ordenado por usuário
+            actions = await session.execute(text("""
+                SELECT user_id, action_type, EXTRACT(EPOCH FROM timestamp) AS ts
+                FROM (
+                    SELECT user_id, action_type, timestamp,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC) AS rn
+                    FROM user_actions_log_global_global_global
+                    WHERE user_id = ANY(:user_ids)
+                    AND timestamp > NOW() - make_interval(hours => :hours)
+                ) recent_actions
+                WHERE rn <= 50
+                ORDER BY user_id, timestamp DESC
+            """), params)
+            
+            return {
+                'existing': [dict(row) for row in existing.mappings().all()],
+                'recent_invites': [dict(row) for row in recent.mappings().all()],
+                'blacklisted': [dict(row) for row in blacklisted.mappings().all()],
+                'actions': [dict(row) for row in actions.mappings().all()]
+            }
+    
+    async def prefetch_fraud_audit_context(self, invited_user_ids: List[int], competition_id: int,
+                                           history_hours: int = 1,
+                                           until: Optional[datetime] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Dados para reauditar convites já gravados: cada entrada é avaliada no
+        instante em que aconteceu (janelas terminando no first_join_timestamp da
+        própria linha, que fica fora das contagens)
+        """
+        params = {'user_ids': list(invited_user_ids), 'competition_id': competition_id,
+                  'hours': history_hours, 'until': until}
+        
+        async with self.async_session_factory() as session:
+            joins = await session.execute(text("""
+                SELECT r.invited_user_id, r.inviter_user_id,
+                       EXTRACT(EPOCH FROM r.first_join_timestamp) AS ts,
+                       (SELECT COUNT(*)
+                        FROM global_global_unique_invited_users_global_global o
+                        WHERE o.invited_user_id = r.invited_user_id
+                        AND o.id <> r.id
+                        AND o.first_join_timestamp > r.first_join_timestamp - INTERVAL '1 hour'
+                        AND o.first_join_timestamp <= r.first_join_timestamp) AS recent_invites
+                FROM global_global_unique_invited_users_global_global r
+                WHERE r.competition_id = :competition_id
+                AND r.invited_user_id = ANY(:user_ids)
+                AND (CAST(:until AS TIMESTAMPTZ) IS NULL OR r.first_join_timestamp <= :until)
+            """), params)
+            join_rows = [dict(row) for row in joins.mappings().all()]
+            
+            blacklisted = await session.execute(text("""
+                SELECT user_id, blacklist_reason, fraud_score
+                FROM users_global_global_optimized
+                WHERE user_id = ANY(:user_ids)
+                AND is_blacklisted = TRUE
+            """), params)
+            
+            # Ações do período auditado (mais a janela anterior à primeira entrada)
+            timestamps = [float(row['ts']) for row in join_rows]
+            params['since_ts'] = (min(timestamps) if timestamps else 0) - history_hours * 3600
+            params['until_ts'] = max(timestamps) if timestamps else (until.timestamp() if until else None)
+            actions = await session.execute(text("""
+                SELECT user_id, action_type, EXTRACT(EPOCH FROM timestamp) AS ts
+                FROM user_actions_log_global_global_global
+                WHERE user_id = ANY(:user_ids)
+                AND timestamp > to_timestamp(:since_ts)
+                AND (CAST(:until_ts AS DOUBLE PRECISION) IS NULL OR timestamp <= to_timestamp(:until_ts))
+                ORDER BY user_id, timestamp DESC
+            """), params)
+            
+            return {
+                'existing': [],
+                'recent_invites': [],
+                'blacklisted': [dict(row) for row in blacklisted.mappings().all()],
+                'actions': [dict(row) for row in actions.mappings().all()],
+                'audit_joins': join_rows
+            }
+    
+    async def get_bot_scoring_data(self, competition_id: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Convidados da competição com username, tentativas de entrada e entradas/saídas (epoch)"""
+        params = {'competition_id': competition_id}
+        
+        async with self.async_session_factory() as session:
+            users = await session.execute(text("""
+                SELECT DISTINCT ON (g.invited_user_id)
+                       g.invited_user_id AS user_id, u.username, g.inviter_user_id
+                FROM global_global_unique_invited_users_global_global g
+                LEFT JOIN users_global_global_optimized u ON u.user_id = g.invited_user_id
+                WHERE g.competition_id = :competition_id
+                ORDER BY g.invited_user_id, g.first_join_timestamp
+            """), params)
+            
+            attempts = await session.execute(text("""
+                SELECT invited_user_id AS user_id, EXTRACT(EPOCH FROM attempt_timestamp) AS ts
+                FROM invite_attempts_log
+                WHERE competition_id = :competition_id
+            """), params)
+            
+            actions = await session.execute(text("""
+                SELECT a.user_id, a.action_type, EXTRACT(EPOCH FROM a.timestamp) AS ts
+                FROM user_actions_log_global_global_global a
+                WHERE a.competition_id = :competition_id
+                AND a.action_type IN ('join', 'leave')
+            """), params)
+            
+            return {
+                'users': [dict(row) for row in users.mappings().all()],
+                'attempts': [dict(row) for row in attempts.mappings().all()],
+                'actions': [dict(row) for row in actions.mappings().all()]
+            }
+    
     async def _log_fraud_attempt(self, user_id: int, detection_type: str, result: FraudDetectionResult):
         """Log de tentativa de fraude"""
         try:
@@ -750,6 +905,73 @@ class PostgreSQLOptimized:
             logger.error(f"Erro na limpeza: {e}")
             return 0
     
+    async def save_behavior_profiles(self, profiles: List[Dict[str, Any]]) -> bool:
+        """Grava (upsert) em lote perfis comportamentais removidos da memória"""
+        if not profiles:
+            return True
+        try:
+            async with self.async_session_factory() as session:
+                await session.execute(text("""
+                    INSERT INTO user_behavior_profiles_global_global
+                    (user_id, join_frequency, leave_frequency, invite_pattern_score, risk_score,
+                     time_between_actions, suspicious_indicators, last_seen, updated_at)
+                    VALUES (:user_id, :join_frequency, :leave_frequency, :invite_pattern_score, :risk_score,
+                            CAST(:time_between_actions AS JSONB), CAST(:suspicious_indicators AS JSONB),
+                            to_timestamp(:last_seen), NOW())
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        join_frequency = EXCLUDED.join_frequency,
+                        leave_frequency = EXCLUDED.leave_frequency,
+                        invite_pattern_score = EXCLUDED.invite_pattern_score,
+                        risk_score = EXCLUDED.risk_score,
+                        time_between_actions = EXCLUDED.time_between_actions,
+                        suspicious_indicators = EXCLUDED.suspicious_indicators,
+                        last_seen = EXCLUDED.last_seen,
+                        updated_at = NOW()
+                """), [
+                    {
+                        **profile,
+                        'time_between_actions': json.dumps(profile['time_between_actions']),
+                        'suspicious_indicators': json.dumps(profile['suspicious_indicators'])
+                    }
+                    for profile in profiles
+                ])
+                await session.commit()
+                return True
+                
+        except Exception as e:
+            logger.error(f"Erro ao gravar perfis comportamentais: {e}")
+            return False
+    
+    async def load_behavior_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Perfil comportamental gravado do usuário (last_seen em epoch)"""
+        try:
+            async with self.async_session_factory() as session:
+                result = await session.execute(text("""
+                    SELECT user_id, join_frequency, leave_frequency, invite_pattern_score, risk_score,
+                           time_between_actions, suspicious_indicators,
+                           EXTRACT(EPOCH FROM last_seen) AS last_seen
+                    FROM user_behavior_profiles_global_global
+                    WHERE user_id = :user_id
+                """), {'user_id': user_id})
+                row = result.mappings().first()
+                return dict(row) if row else None
+                
+        except Exception as e:
+            logger.error(f"Erro ao carregar perfil comportamental: {e}")
+            return None
+    
+    async def load_behavior_profile_ids(self, after_user_id: int, limit: int) -> List[int]:
+        """user_ids com perfil gravado, em ordem, a partir de after_user_id (keyset)"""
+        async with self.async_session_factory() as session:
+            result = await session.execute(text("""
+                SELECT user_id
+                FROM user_behavior_profiles_global_global
+                WHERE user_id > :after_user_id
+                ORDER BY user_id
+                LIMIT :limit
+            """), {'after_user_id': after_user_id, 'limit': limit})
+            return [row.user_id for row in result]
+    
     async def close(self):
         """Fecha conexões"""
         if self.async_engine:
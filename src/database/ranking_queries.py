@@ -0,0 +1,70 @@
+"""
+Consultas de Ranking Compartilhadas
+Top-N com nomes já unidos e paginação por keyset (invites_count DESC, user_id ASC)
+"""
+from typing import Any, Dict, Optional, Tuple
+
+def build_competition_ranking_query(users_key: str, after: Optional[Tuple[int, int]] = None) -> str:
+    """
+    Monta a consulta do ranking em uma única ida ao banco.
+
+    users_key: coluna de users_global_global que guarda o ID do Telegram
+    after: (invites_count, user_id) da última linha da página anterior
+
+    A posição segue a semântica RANK (1 + participantes com mais convites),
+    inclusive nas páginas seguintes à primeira.
+    """
+    keyset = ""
+    if after is not None:
+        keyset = """
+              AND (cp.invites_count < :after_invites
+                   OR (cp.invites_count = :after_invites AND cp.user_id > :after_user_id))"""
+
+    page = f"""
+            SELECT cp.user_id, cp.invites_count, cp.last_invite_at,
+                   u.username, u.first_name, u.last_name,
+                   COALESCE(NULLIF(u.first_name, ''), NULLIF(u.username, ''),
+                            'Usuário ' || CAST(cp.user_id AS TEXT)) AS user_name
+            FROM competition_participants_global_global cp
+            LEFT JOIN users_global_global u ON u.{users_key} = cp.user_id
+            WHERE cp.competition_id = :competition_id{keyset}
+            ORDER BY cp.invites_count DESC, cp.user_id ASC
+            LIMIT :limit"""
+
+    if after is None:
+        return f"""
+        SELECT page.*, RANK() OVER (ORDER BY page.invites_count DESC) AS position
+        FROM ({page}) page
+        ORDER BY page.invites_count DESC, page.user_id ASC
+        """
+
+    # Páginas seguintes: empatados com o cursor herdam a posição dele; os demais
+    # somam quem ficou antes da página (>= cursor) à posição dentro da página
+    return f"""
+        SELECT page.user_id, page.invites_count, page.last_invite_at,
+               page.username, page.first_name, page.last_name, page.user_name,
+               CASE WHEN page.invites_count = :after_invites THEN before.higher + 1
+                    ELSE before.higher_or_tied
+                         + RANK() OVER (ORDER BY page.invites_count DESC)
+                         - SUM(CASE WHEN page.invites_count = :after_invites THEN 1 ELSE 0 END) OVER ()
+               END AS position
+        FROM ({page}) page
+        CROSS JOIN (
+            SELECT COALESCE(SUM(CASE WHEN invites_count > :after_invites THEN 1 ELSE 0 END), 0) AS higher,
+                   COALESCE(SUM(CASE WHEN invites_count >= :after_invites THEN 1 ELSE 0 END), 0) AS higher_or_tied
+            FROM competition_participants_global_global
+            WHERE competition_id = :competition_id AND invites_count >= :after_invites
+        ) before
+        ORDER BY page.invites_count DESC, page.user_id ASC
+        """
+
+def ranking_query_params(competition_id: int, limit: int, after: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Parâmetros nomeados da consulta de ranking"""
+    params = {"competition_id": competition_id, "limit": limit}
+    if after is not None:
+        params["after_invites"], params["after_user_id"] = after
+    return params
+
+def ranking_cursor(row: Dict[str, Any]) -> Tuple[int, int]:
+    """Cursor de keyset a partir da última linha de uma página"""
+    return row['invites_count'], row['user_id']
@@ -0,0 +1,108 @@
+"""
+Backends de rate limit: a mesma sequência de chamadas deve dar as mesmas
+decisões no InMemoryRateLimitBackend e no script Lua do RedisRateLimitBackend
+(Redis simulado com fakeredis; requer fakeredis[lua])
+"""
+import random
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from src.bot.services.rate_limit_backends import (
+    InMemoryRateLimitBackend, RateLimit, RateLimitType, RedisRateLimitBackend, _state_ttl
+)
+
+START = 1_700_000_000.0
+
+LIMITS = [
+    RateLimit(RateLimitType.INVITE_ATTEMPTS, max_requests=5, window_seconds=10, burst_allowance=0, cooldown_seconds=15),
+    RateLimit(RateLimitType.RANKING_REQUESTS, max_requests=3, window_seconds=4, burst_allowance=0, cooldown_seconds=2),
+]
+
+@pytest.fixture
+def backends():
+    client = fakeredis.aioredis.FakeRedis()
+    return InMemoryRateLimitBackend(max_keys=1000), RedisRateLimitBackend(client=client, prefix="test")
+
+def assert_same(memory, redis, context):
+    assert memory.is_limited == redis.is_limited, context
+    assert memory.count == pytest.approx(redis.count), context
+    assert memory.cooldown_until == pytest.approx(redis.cooldown_until), context
+    assert memory.window_start == pytest.approx(redis.window_start), context
+
+@pytest.mark.asyncio
+async def test_same_decisions_for_random_sequence(backends):
+    memory, redis = backends
+    rng = random.Random(42)
+    now = START
+
+    for step in range(2000):
+        now += rng.choice([0.0, 0.1, 0.5, 1.0, 3.0, 7.5])
+        user_id = rng.randint(1, 4)
+        rate_limit = rng.choice(LIMITS)
+        increment = rng.random() < 0.8
+
+        expected = await memory.hit(user_id, rate_limit, now, increment)
+        actual = await redis.hit(user_id, rate_limit, now, increment)
+        assert_same(expected, actual, (step, user_id, rate_limit.limit_type, now, increment))
+
+@pytest.mark.asyncio
+async def test_cooldown_and_window_rollover(backends):
+    memory, redis = backends
+    rate_limit = LIMITS[0]
+    # Estoura o limite, espera o cooldown e atravessa duas janelas
+    times = [START + 0.1 * i for i in range(8)] + [START + 16, START + 16.5, START + 25, START + 41]
+
+    for now in times:
+        expected = await memory.hit(7, rate_limit, now, True)
+        actual = await redis.hit(7, rate_limit, now, True)
+        assert_same(expected, actual, now)
+
+@pytest.mark.asyncio
+async def test_idle_keys_are_evicted_in_both_backends(backends):
+    memory, redis = backends
+    rate_limit = LIMITS[1]
+    ttl = _state_ttl(rate_limit)
+
+    for user_id in range(1, 6):
+        for _ in range(4):
+            await memory.hit(user_id, rate_limit, START, True)
+            await redis.hit(user_id, rate_limit, START, True)
+
+    # Redis: a chave expira sozinha após o TTL do estado
+    key = redis._key(1, rate_limit.limit_type)
+    assert 0 < await redis.client.pttl(key) <= int(ttl * 1000)
+
+    # Memória: as chaves ociosas saem no próximo acesso depois do TTL
+    later = START + ttl + 1
+    assert memory.active_keys(rate_limit.limit_type, now=later) == 0
+    expected = await memory.hit(1, rate_limit, later, True)
+    assert len(memory.states) == 1
+    assert memory.evictions == 4
+
+    # Sem o estado antigo, as duas respostas continuam iguais
+    await redis.client.delete(key)
+    actual = await redis.hit(1, rate_limit, later, True)
+    assert_same(expected, actual, later)
+
+@pytest.mark.asyncio
+async def test_lru_eviction_over_max_keys_matches_expired_redis_key():
+    client = fakeredis.aioredis.FakeRedis()
+    memory = InMemoryRateLimitBackend(max_keys=2)
+    redis = RedisRateLimitBackend(client=client, prefix="test")
+    rate_limit = LIMITS[1]
+
+    for user_id in (1, 2, 3):
+        await memory.hit(user_id, rate_limit, START, True)
+        await redis.hit(user_id, rate_limit, START, True)
+
+    # O usuário 1 saiu por LRU: volta do zero, como uma chave expirada no Redis
+    assert (1, rate_limit.limit_type.value) not in memory.states
+    assert memory.evictions == 1
+    await client.delete(redis._key(1, rate_limit.limit_type))
+
+    expected = await memory.hit(1, rate_limit, START + 1, True)
+    actual = await redis.hit(1, rate_limit, START + 1, True)
+    assert_same(expected, actual, "lru")